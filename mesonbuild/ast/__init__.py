@@ -4,6 +4,10 @@
 # This class contains the basic functionality needed to run any interpreter
 # or an interpreter-based tool.
 
+from __future__ import annotations
+import importlib
+import typing as T
+
 __all__ = [
     'AstConditionLevel',
     'AstInterpreter',
@@ -16,8 +20,26 @@ __all__ = [
     'BUILD_TARGET_FUNCTIONS',
 ]
 
-from .interpreter import AstInterpreter
-from .introspection import IntrospectionInterpreter, BUILD_TARGET_FUNCTIONS
 from .visitor import AstVisitor
 from .postprocess import AstConditionLevel, AstIDGenerator, AstIndentationGenerator
 from .printer import AstPrinter, AstJSONPrinter
+
+if T.TYPE_CHECKING:
+    from .interpreter import AstInterpreter
+    from .introspection import IntrospectionInterpreter, BUILD_TARGET_FUNCTIONS
+
+# The interpreters pull in most of Meson (build, interpreter, compilers, ...),
+# only import them when they are used, so that tools which just walk or print
+# an AST (like `meson format`) stay cheap to start.
+_LAZY = {
+    'AstInterpreter': '.interpreter',
+    'IntrospectionInterpreter': '.introspection',
+    'BUILD_TARGET_FUNCTIONS': '.introspection',
+}
+
+def __getattr__(name: str) -> T.Any:
+    try:
+        module = _LAZY[name]
+    except KeyError:
+        raise AttributeError(f'module {__name__!r} has no attribute {name!r}') from None
+    return getattr(importlib.import_module(module, __name__), name)
@@ -526,7 +526,8 @@ class Backend:
             env: T.Optional[mesonlib.EnvironmentVariables] = None,
             tag: T.Optional[str] = None,
             verbose: bool = False,
-            installdir_map: T.Optional[T.Dict[str, str]] = None) -> 'ExecutableSerialisation':
+            installdir_map: T.Optional[T.Dict[str, str]] = None,
+            jobserver: bool = False) -> 'ExecutableSerialisation':
 
         # XXX: cmd_args either need to be lowered to strings, or need to be checked for non-string arguments, right?
         exe, *raw_cmd_args = cmd
@@ -587,7 +588,8 @@ class Backend:
         workdir = workdir or self.environment.get_build_dir()
         return ExecutableSerialisation(exe_cmd + cmd_args, env,
                                        exe_wrapper, workdir,
-                                       extra_paths, capture, feed, tag, verbose, installdir_map)
+                                       extra_paths, capture, feed, tag, verbose, installdir_map,
+                                       jobserver)
 
     def as_meson_exe_cmdline(self, exe: T.Union[str, mesonlib.File, build.BuildTarget, build.CustomTarget, programs.ExternalProgram],
                              cmd_args: T.Sequence[T.Union[str, mesonlib.File, build.BuildTarget, build.CustomTarget, programs.ExternalProgram]],
@@ -597,14 +599,16 @@ class Backend:
                              feed: T.Optional[str] = None,
                              force_serialize: bool = False,
                              env: T.Optional[mesonlib.EnvironmentVariables] = None,
-                             verbose: bool = False) -> T.Tuple[T.List[str], str]:
+                             verbose: bool = False,
+                             jobserver: bool = False) -> T.Tuple[T.List[str], str]:
         '''
         Serialize an executable for running with a generator or a custom target
         '''
         cmd: T.List[T.Union[str, mesonlib.File, build.BuildTarget, build.CustomTarget, programs.ExternalProgram]] = []
         cmd.append(exe)
         cmd.extend(cmd_args)
-        es = self.get_executable_serialisation(cmd, workdir, extra_bdeps, capture, feed, env, verbose=verbose)
+        es = self.get_executable_serialisation(cmd, workdir, extra_bdeps, capture, feed, env, verbose=verbose,
+                                               jobserver=jobserver)
         reasons: T.List[str] = []
         if es.extra_paths:
             reasons.append('to set PATH')
@@ -637,6 +641,8 @@ class Backend:
             reasons.append('to capture output')
         if feed:
             reasons.append('to feed input')
+        if jobserver:
+            reasons.append('to pass the jobserver')
 
         if can_use_env and reasons == ['to set env'] and shutil.which('env'):
             envlist = []
@@ -645,13 +651,15 @@ class Backend:
             return ['env'] + envlist + es.cmd_args, ', '.join(reasons)
 
         if not force_serialize:
-            if not capture and not feed:
+            if not capture and not feed and not jobserver:
                 return es.cmd_args, ''
             args: T.List[str] = []
             if capture:
                 args += ['--capture', capture]
             if feed:
                 args += ['--feed', feed]
+            if jobserver:
+                args += ['--jobserver']
 
             return (
                 self.environment.get_build_command() + ['--internal', 'exe'] + args + ['--'] + es.cmd_args,
@@ -678,6 +686,8 @@ class Backend:
         hasher.update(bytes(str(es.workdir), encoding='utf-8'))
         hasher.update(bytes(str(capture), encoding='utf-8'))
         hasher.update(bytes(str(feed), encoding='utf-8'))
+        if jobserver:
+            hasher.update(b'jobserver')
         digest = hasher.hexdigest()
         scratch_file = f'meson_exe_{basename}_{digest}.dat'
         exe_data = os.path.join(self.environment.get_scratch_dir(), scratch_file)
@@ -934,11 +944,14 @@ class Backend:
         args: T.List[str] = []
         pchpath = self.get_target_private_dir(target)
         includeargs = compiler.get_include_args(pchpath, False)
-        p = target.get_pch(compiler.get_language())
+        p = self.get_target_pch(target, compiler.get_language())
         if p:
             args += compiler.get_pch_use_args(pchpath, p[0])
         return includeargs + args
 
+    def get_target_pch(self, target: build.BuildTarget, lang: str) -> T.List[str]:
+        return target.get_pch(lang)
+
     def get_msvc_pch_objname(self, lang: str, pch: T.List[str]) -> str:
         if len(pch) == 1:
             # Same name as in create_msvc_pch_implementation() below.
@@ -8,17 +8,20 @@ from collections import OrderedDict
 from dataclasses import dataclass
 from enum import Enum, unique
 from functools import lru_cache
+from json.encoder import encode_basestring
 from pathlib import PurePath, Path
 from textwrap import dedent
+import hashlib
 import itertools
 import json
 import os
 import pickle
+import posixpath
 import re
 import subprocess
 import typing as T
 
-from . import backends
+from . import backends, ninjagraph
 from .. import modules
 from .. import environment, mesonlib
 from .. import build
@@ -29,10 +32,11 @@ from ..compilers import Compiler
 from ..linkers import ArLikeLinker, RSPFileSyntax
 from ..mesonlib import (
     File, LibType, MachineChoice, MesonBugException, MesonException, OrderedSet, PerMachine,
-    ProgressBar, quote_arg
+    ProgressBar, hash_file, quote_arg
 )
 from ..mesonlib import get_compiler_for_source, has_path_sep
 from ..options import OptionKey
+from ..utils import profiler
 from .backends import CleanTrees
 from ..build import GeneratedList, InvalidArguments
 
@@ -57,6 +61,55 @@ FORTRAN_MODULE_PAT = r"^\s*\bmodule\b\s+(\w+)\s*(?:!+.*)*$"
 FORTRAN_SUBMOD_PAT = r"^\s*\bsubmodule\b\s*\((\w+:?\w+)\)\s*(\w+)"
 FORTRAN_USE_PAT = r"^\s*use,?\s*(?:non_intrinsic)?\s*(?:::)?\s*(\w+)"
 
+# The memory a link is assumed to need with backend_max_links=auto, as a
+# fixed amount plus a multiple of the size of the objects it reads, by
+# linker id or LTO mode.
+MIB = 1024 * 1024
+LINK_MEMORY_ESTIMATES: T.Dict[str, T.Tuple[int, float]] = {
+    'ld.bfd': (128 * MIB, 3.0),
+    'ld.gold': (128 * MIB, 2.0),
+    'ld.lld': (64 * MIB, 1.5),
+    'ld64.lld': (64 * MIB, 1.5),
+    'lld-link': (64 * MIB, 1.5),
+    'ld.mold': (64 * MIB, 1.5),
+    'ld64': (128 * MIB, 2.0),
+    'link': (128 * MIB, 2.0),
+}
+DEFAULT_LINK_MEMORY_ESTIMATE = (128 * MIB, 3.0)
+LTO_LINK_MEMORY_ESTIMATES: T.Dict[str, T.Tuple[int, float]] = {
+    'default': (1024 * MIB, 10.0),
+    'thin': (512 * MIB, 4.0),
+}
+
+# With backend_auto_pch, the headers from outside the project that at least
+# this share of the sources of a target include directly are precompiled,
+# if the previous build compiled at least AUTO_PCH_MIN_SOURCES of them.
+AUTO_PCH_DIRECTIVE_PAT = re.compile(r'^[ \t]*#[ \t]*(\w+)[ \t]*(.*)$', re.MULTILINE)
+AUTO_PCH_SYSTEM_INCLUDE_PAT = re.compile(r'<([^>\n]+)>')
+AUTO_PCH_MIN_SOURCES = 4
+AUTO_PCH_MIN_SHARE = 0.5
+
+def scan_auto_pch_includes(text: str) -> T.Tuple[T.List[str], T.Set[str]]:
+    '''The <...> headers that @text includes before any other preprocessor
+    directive, and those it includes after one.
+
+    Only the first ones can be force-included in front of the source
+    without changing what it sees.
+    '''
+    leading: T.List[str] = []
+    later: T.Set[str] = set()
+    in_leading = True
+    for m in AUTO_PCH_DIRECTIVE_PAT.finditer(text):
+        directive, rest = m.groups()
+        include = AUTO_PCH_SYSTEM_INCLUDE_PAT.match(rest) if directive == 'include' else None
+        if include is None:
+            in_leading = False
+        elif in_leading:
+            leading.append(include.group(1))
+        else:
+            later.add(include.group(1))
+    return leading, later
+
 def cmd_quote(arg: str) -> str:
     # see: https://docs.microsoft.com/en-us/windows/desktop/api/shellapi/nf-shellapi-commandlinetoargvw#remarks
 
@@ -139,6 +192,53 @@ Please report this error with a test case to the Meson bug tracker.'''
         raise MesonException(errmsg)
     return quote_re.sub(r'$\g<0>', text)
 
+NINJA_EXPAND_PAT = re.compile(r'\$(?:([$ :])|\{([\w.-]+)\}|([\w-]+))')
+
+@lru_cache(maxsize=None)
+def ninja_parse_value(text: str) -> T.Tuple[T.Tuple[bool, str], ...]:
+    '''Split @text into literal strings and the names of the variables it
+    refers to, flagged True.
+    '''
+    parts: T.List[T.Tuple[bool, str]] = []
+    pos = 0
+    for m in NINJA_EXPAND_PAT.finditer(text):
+        parts.append((False, text[pos:m.start()]))
+        if m.group(1):
+            parts.append((False, m.group(1)))
+        else:
+            parts.append((True, m.group(2) or m.group(3)))
+        pos = m.end()
+    parts.append((False, text[pos:]))
+    return tuple(p for p in parts if p[0] or p[1])
+
+def ninja_expand(text: str, lookup: T.Callable[[str], str]) -> str:
+    '''Evaluate the ninja escapes and variable references in @text.'''
+    return ''.join([lookup(s) if is_var else s for is_var, s in ninja_parse_value(text)])
+
+NINJA_SHELL_SAFE_PAT = re.compile(r'[\w+./-]*', re.ASCII)
+
+def ninja_shell_escape(path: str, windows: bool) -> str:
+    '''Quote a path like ninja does when expanding $in and $out.'''
+    if windows:
+        if not (' ' in path or '"' in path):
+            return path
+        result = '"'
+        backslashes = 0
+        for c in path:
+            if c == '\\':
+                backslashes += 1
+                continue
+            if c == '"':
+                result += '\\' * (backslashes * 2 + 1)
+            else:
+                result += '\\' * backslashes
+            backslashes = 0
+            result += c
+        return result + '\\' * (backslashes * 2) + '"'
+    if NINJA_SHELL_SAFE_PAT.fullmatch(path):
+        return path
+    return "'" + path.replace("'", "'\\''") + "'"
+
 
 @dataclass
 class TargetDependencyScannerInfo:
@@ -191,7 +291,8 @@ class NinjaRule:
     def __init__(self, rule: str, command: CommandArgOrStr, args: CommandArgOrStr,
                  description: str, rspable: bool = False, deps: T.Optional[str] = None,
                  depfile: T.Optional[str] = None, extra: T.Optional[str] = None,
-                 rspfile_quote_style: RSPFileSyntax = RSPFileSyntax.GCC):
+                 rspfile_quote_style: RSPFileSyntax = RSPFileSyntax.GCC,
+                 launcher: T.Optional[T.List[str]] = None):
 
         def strToCommandArg(c: T.Union[NinjaCommandArg, str]) -> NinjaCommandArg:
             if isinstance(c, NinjaCommandArg):
@@ -219,6 +320,8 @@ class NinjaRule:
 
         self.name = rule
         self.command: T.List[NinjaCommandArg] = [strToCommandArg(c) for c in command]  # includes args which never go into a rspfile
+        # runs the command, but is left out of compile_commands.json
+        self.launcher: T.List[NinjaCommandArg] = [strToCommandArg(c) for c in launcher or []]
         self.args: T.List[NinjaCommandArg] = [strToCommandArg(a) for a in args]  # args which will go into a rspfile, if used
         self.description = description
         self.deps = deps  # depstyle 'gcc' or 'msvc'
@@ -228,6 +331,9 @@ class NinjaRule:
         self.refcount = 0
         self.rsprefcount = 0
         self.rspfile_quote_style = rspfile_quote_style
+        # Memoised by get_command() and get_rspfile_content()
+        self._command_text: T.Dict[T.Tuple[bool, bool], str] = {}
+        self._rspfile_content: T.Optional[str] = None
 
         if self.depfile == '$DEPFILE':
             self.depfile += '_UNQUOTED'
@@ -242,7 +348,19 @@ class NinjaRule:
             return ninja_quote(x.s)
         return ninja_quote(qf(str(x)))
 
-    def write(self, outfile: T.TextIO) -> None:
+    def get_command(self, rsp: bool, launcher: bool = True) -> str:
+        key = (rsp, launcher)
+        if key not in self._command_text:
+            command = self.launcher + self.command if launcher else self.command
+            if rsp:
+                self._command_text[key] = ' '.join([self._quoter(x) for x in command]) + ' @$out.rsp'
+            else:
+                self._command_text[key] = ' '.join([self._quoter(x) for x in command + self.args])
+        return self._command_text[key]
+
+    def get_rspfile_content(self) -> str:
+        if self._rspfile_content is not None:
+            return self._rspfile_content
         rspfile_args = self.args
         rspfile_quote_func: T.Callable[[str], str]
         if self.rspfile_quote_style is RSPFileSyntax.MSVC:
@@ -250,7 +368,10 @@ class NinjaRule:
             rspfile_args = [NinjaCommandArg('$in_newline', arg.quoting) if arg.s == '$in' else arg for arg in rspfile_args]
         else:
             rspfile_quote_func = gcc_rsp_quote
+        self._rspfile_content = ' '.join([self._quoter(x, rspfile_quote_func) for x in rspfile_args])
+        return self._rspfile_content
 
+    def write(self, outfile: T.TextIO) -> None:
         def rule_iter() -> T.Iterable[str]:
             if self.refcount:
                 yield ''
@@ -259,12 +380,10 @@ class NinjaRule:
 
         for rsp in rule_iter():
             outfile.write(f'rule {self.name}{rsp}\n')
+            outfile.write(f' command = {self.get_command(bool(rsp))}\n')
             if rsp == '_RSP':
-                outfile.write(' command = {} @$out.rsp\n'.format(' '.join([self._quoter(x) for x in self.command])))
                 outfile.write(' rspfile = $out.rsp\n')
-                outfile.write(' rspfile_content = {}\n'.format(' '.join([self._quoter(x, rspfile_quote_func) for x in rspfile_args])))
-            else:
-                outfile.write(' command = {}\n'.format(' '.join([self._quoter(x) for x in self.command + self.args])))
+                outfile.write(f' rspfile_content = {self.get_rspfile_content()}\n')
             if self.deps:
                 outfile.write(f' deps = {self.deps}\n')
             if self.depfile:
@@ -307,6 +426,131 @@ class NinjaRule:
         # determine command length
         return estimate
 
+class NinjaSharedArgs:
+
+    '''Arguments shared by several build statements, written once as a
+    top-level variable that the statements refer to.
+
+    The value is quoted differently for commands and for response files, so
+    there is one variable per quoting style.
+    '''
+
+    def __init__(self, name: str, args: T.List[str]):
+        self.name = name
+        self.args = args
+        # The values ninja expands the written variables to, by name
+        self.written: T.Dict[str, str] = {}
+
+    def write(self, outfile: T.TextIO, varname: str, qf: T.Callable[[str], str]) -> None:
+        if varname in self.written:
+            return
+        quoted = [qf(i) for i in self.args]
+        self.written[varname] = ' '.join(quoted)
+        outfile.write(f'{varname} = ' + ' '.join(ninja_quote(i) for i in quoted) + '\n\n')
+
+
+class NinjaCompdb:
+
+    '''compile_commands.json, streamed while build.ninja is written.
+
+    Only build statements using one of @rules are written to it. The entries
+    are kept in @cachefile, by a digest of everything they are computed from,
+    so that a regeneration only computes the entries of the statements that
+    changed. The file is only replaced if its content changes, so that tools
+    watching it, like clangd, do not reload it after every regeneration.
+    '''
+
+    def __init__(self, fname: str, cachefile: str, rules: T.Set[str], directory: str):
+        self.fname = fname
+        self.cachefile = cachefile
+        self.rules = rules
+        self.windows = mesonlib.is_windows()
+        self.directory = encode_basestring(directory)
+        self.hash = hashlib.sha256()
+        self.sep = '[\n'
+        self.rule_keys: T.Dict[T.Tuple[str, bool], str] = {}
+        self.cache: T.Dict[bytes, str] = {}
+        self.entries: T.Dict[bytes, str] = {}
+        try:
+            with open(cachefile, 'rb') as f:
+                directory_, cache = pickle.load(f)
+            if directory_ == self.directory:
+                self.cache = cache
+        except (OSError, EOFError, ValueError, TypeError, pickle.UnpicklingError):
+            pass
+        self.outfile = open(fname + '~', 'w', encoding='utf-8')
+
+    def ninja_path(self, path: str) -> str:
+        # The path as ninja reads it from the build line, see
+        # NinjaBuildElement.write()
+        path = path.replace('\\', '/')
+        if self.windows and path.startswith('//'):
+            return path
+        return posixpath.normpath(path)
+
+    def shell_escape(self, path: str) -> str:
+        return ninja_shell_escape(path, self.windows)
+
+    def get_rule_key(self, rule: NinjaRule, use_rspfile: bool) -> str:
+        key = (rule.name, use_rspfile)
+        if key not in self.rule_keys:
+            self.rule_keys[key] = '\0'.join([
+                rule.get_command(use_rspfile, launcher=False),
+                rule.get_rspfile_content() if use_rspfile else '',
+                rule.depfile or '', rule.deps or ''])
+        return self.rule_keys[key]
+
+    def add(self, elem: NinjaBuildElement, use_rspfile: bool, build_line: str,
+            bindings: T.Dict[str, str]) -> None:
+        '''Add the entry of @elem, whose variables expand to @bindings.'''
+        key = [self.get_rule_key(elem.rule, use_rspfile), build_line]
+        for name, value in bindings.items():
+            key += [name, value]
+        digest = hashlib.sha1('\0'.join(key).encode('utf-8')).digest()
+        entry = self.cache.get(digest)
+        if entry is None:
+            fields = elem.get_compdb_entry(use_rspfile, bindings, self)
+            if fields is None:
+                entry = ''
+            else:
+                command, file, output = fields
+                entry = (f'  {{\n    "directory": {self.directory},\n'
+                         f'    "command": {encode_basestring(command)},\n'
+                         f'    "file": {encode_basestring(file)},\n'
+                         f'    "output": {encode_basestring(output)}\n  }}')
+        self.entries[digest] = entry
+        if entry:
+            chunk = self.sep + entry
+            self.outfile.write(chunk)
+            self.hash.update(chunk.encode('utf-8'))
+            self.sep = ',\n'
+
+    def close(self) -> None:
+        try:
+            chunk = '[\n]\n' if self.sep == '[\n' else '\n]\n'
+            self.outfile.write(chunk)
+            self.hash.update(chunk.encode('utf-8'))
+            self.outfile.close()
+            if os.path.isfile(self.fname) and hash_file(self.fname) == self.hash.hexdigest():
+                os.unlink(self.outfile.name)
+            else:
+                os.replace(self.outfile.name, self.fname)
+        except BaseException:
+            self.abort()
+            raise
+        if self.entries != self.cache:
+            with open(self.cachefile, 'wb') as f:
+                pickle.dump((self.directory, self.entries), f)
+
+    def abort(self) -> None:
+        '''Remove the partially written file, the previous database is kept.'''
+        self.outfile.close()
+        try:
+            os.unlink(self.outfile.name)
+        except FileNotFoundError:
+            pass
+
+
 class NinjaBuildElement:
 
     rule: NinjaRule
@@ -326,6 +570,7 @@ class NinjaBuildElement:
         self.deps = OrderedSet()
         self.orderdeps = OrderedSet()
         self.elems = []
+        self.shared: T.Dict[str, NinjaSharedArgs] = {}
         self.all_outputs = all_outputs
         self.output_errors = ''
 
@@ -341,7 +586,8 @@ class NinjaBuildElement:
         else:
             self.orderdeps.add(dep)
 
-    def add_item(self, name: str, elems: T.Union[str, T.List[str], CompilerArgs]) -> None:
+    def add_item(self, name: str, elems: T.Union[str, T.List[str], CompilerArgs],
+                 shared: T.Optional[NinjaSharedArgs] = None) -> None:
         # Always convert from GCC-style argument naming to the naming used by the
         # current compiler. Also filter system include paths, deduplicate, etc.
         if isinstance(elems, CompilerArgs):
@@ -349,6 +595,8 @@ class NinjaBuildElement:
         if isinstance(elems, str):
             elems = [elems]
         self.elems.append((name, elems))
+        if shared is not None and elems[:len(shared.args)] == shared.args:
+            self.shared[name] = shared
 
         if name == 'DEPFILE':
             self.elems.append((name + '_UNQUOTED', elems))
@@ -375,7 +623,7 @@ class NinjaBuildElement:
             else:
                 self.rule.refcount += 1
 
-    def write(self, outfile: T.TextIO) -> None:
+    def write(self, outfile: T.TextIO, compdb: T.Optional[NinjaCompdb] = None) -> None:
         if self.output_errors:
             raise MesonException(self.output_errors)
         ins = ' '.join([ninja_quote(i, True) for i in self.infilenames])
@@ -389,6 +637,11 @@ class NinjaBuildElement:
             mlog.debug(f'Command line for building {self.outfilenames} is long, using a response file')
         else:
             rulename = self.rulename
+        # The values ninja expands the variables of this statement to, if
+        # it belongs in the compilation database
+        bindings: T.Optional[T.Dict[str, str]] = None
+        if compdb is not None and rulename in compdb.rules:
+            bindings = {}
         line = f'build {outs}{implicit_outs}: {rulename} {ins}'
         if len(self.deps) > 0:
             line += ' | ' + ' '.join([ninja_quote(x, True) for x in sorted(self.deps)])
@@ -409,7 +662,6 @@ class NinjaBuildElement:
                 (l.replace('//', '\\\\', 1) if l.startswith('//') else l)
                 for l in line.split(' ')
             )
-        outfile.write(line)
 
         if use_rspfile:
             if self.rule.rspfile_quote_style is RSPFileSyntax.MSVC:
@@ -419,20 +671,83 @@ class NinjaBuildElement:
         else:
             qf = quote_func
 
+        for shared in self.shared.values():
+            shared.write(outfile, shared.name + ('_RSP' if use_rspfile else ''), qf)
+        outfile.write(line)
+        build_line = line
+
         for e in self.elems:
             (name, elems) = e
             should_quote = name not in raw_names
             line = f' {name} = '
             newelems = []
+            quoted = []
+            if name in self.shared:
+                shared = self.shared[name]
+                varname = shared.name + ('_RSP' if use_rspfile else '')
+                newelems.append('$' + varname)
+                quoted.append(shared.written[varname])
+                elems = elems[len(shared.args):]
             for i in elems:
                 if not should_quote or i == '&&': # Hackety hack hack
-                    newelems.append(ninja_quote(i))
+                    q = i
                 else:
-                    newelems.append(ninja_quote(qf(i)))
+                    q = qf(i)
+                quoted.append(q)
+                newelems.append(ninja_quote(q))
+            if bindings is not None:
+                bindings[name] = ' '.join(quoted)
             line += ' '.join(newelems)
             line += '\n'
             outfile.write(line)
         outfile.write('\n')
+        if bindings is not None:
+            compdb.add(self, use_rspfile, build_line, bindings)
+
+    def get_compdb_entry(self, use_rspfile: bool, bindings: T.Dict[str, str],
+                         compdb: NinjaCompdb) -> T.Optional[T.Tuple[str, str, str]]:
+        '''The command, file and output of this build statement in
+        compile_commands.json, as `ninja -t compdb -x` would write them.
+
+        @bindings are the values the variables of the statement expand to.
+        '''
+        ins = [compdb.ninja_path(i) for i in self.infilenames]
+        outs = [compdb.ninja_path(i) for i in self.outfilenames]
+        inputs = ins or [compdb.ninja_path(str(i)) for i in itertools.chain(sorted(self.deps), sorted(str(x) for x in self.orderdeps))]
+        if not inputs or not outs:
+            return None
+
+        rule_bindings = {'command': self.rule.get_command(use_rspfile, launcher=False)}
+        if use_rspfile:
+            rule_bindings['rspfile'] = '$out.rsp'
+            rule_bindings['rspfile_content'] = self.rule.get_rspfile_content()
+        if self.rule.depfile:
+            rule_bindings['depfile'] = self.rule.depfile
+        if self.rule.deps:
+            rule_bindings['deps'] = self.rule.deps
+
+        def lookup(var: str) -> str:
+            if var == 'in':
+                return ' '.join(compdb.shell_escape(i) for i in ins)
+            if var == 'in_newline':
+                return '\n'.join(compdb.shell_escape(i) for i in ins)
+            if var == 'out':
+                return ' '.join(compdb.shell_escape(i) for i in outs)
+            if var in bindings:
+                return bindings[var]
+            if var in rule_bindings:
+                return ninja_expand(rule_bindings[var], lookup)
+            return ''
+
+        command = lookup('command')
+        if use_rspfile:
+            # Like -x, replace @rspfile by the content of the rspfile
+            rspfile = lookup('rspfile')
+            index = command.find(rspfile)
+            if index > 0 and command[index - 1] == '@':
+                content = lookup('rspfile_content').replace('\n', ' ')
+                command = command[:index - 1] + content + command[index + len(rspfile):]
+        return command, inputs[0], outs[0]
 
     def check_outputs(self) -> None:
         for n in self.outfilenames:
@@ -504,6 +819,15 @@ class NinjaBackend(backends.Backend):
         self.implicit_meson_outs: T.List[str] = []
         self._uses_dyndeps = False
         self._generated_header_cache: T.Dict[str, T.List[FileOrString]] = {}
+        self.shared_compile_args: T.Dict[T.Tuple[str, str], NinjaSharedArgs] = {}
+        self.shared_args_names: T.Set[str] = set()
+        # The depths of link_pool and lto_link_pool, 0 if they are not used
+        self.link_pool_depth = 0
+        self.lto_link_pool_depth = 0
+        # Headers included by each object in the previous build, and the
+        # synthesized precompiled headers, for backend_auto_pch
+        self.previous_deps: T.Dict[str, T.List[str]] = {}
+        self.auto_pch: T.Dict[T.Tuple[str, str], T.List[str]] = {}
         # nvcc chokes on thin archives:
         #   nvlink fatal   : Could not open input file 'libfoo.a.p'
         #   nvlink fatal   : elfLink internal error
@@ -631,10 +955,16 @@ class NinjaBackend(backends.Backend):
             outfile.write('# Do not edit by hand.\n\n')
             outfile.write('ninja_required_version = 1.8.2\n\n')
 
-            num_pools = self.environment.coredata.optstore.get_value('backend_max_links')
-            if num_pools > 0:
+            self.link_pool_depth, self.lto_link_pool_depth = self.get_link_pool_depths()
+            self.previous_deps = self.load_previous_deps()
+            if self.link_pool_depth > 0:
                 outfile.write(f'''pool link_pool
-  depth = {num_pools}
+  depth = {self.link_pool_depth}
+
+''')
+            if self.lto_link_pool_depth > 0:
+                outfile.write(f'''pool lto_link_pool
+  depth = {self.lto_link_pool_depth}
 
 ''')
 
@@ -652,16 +982,20 @@ class NinjaBackend(backends.Backend):
                     if isinstance(target, build.BuildTarget):
                         captured_compile_args_per_target[target.get_id()] = self.generate_common_compile_args_per_src_type(target)
 
-            for t in ProgressBar(self.build.get_targets().values(), desc='Generating targets'):
-                self.generate_target(t)
+            with profiler.span('backend', 'generate targets'):
+                for t in ProgressBar(self.build.get_targets().values(), desc='Generating targets'):
+                    self.generate_target(t)
             mlog.log_timestamp("Targets generated")
             self.add_build_comment(NinjaComment('Test rules'))
-            self.generate_tests()
+            with profiler.span('backend', 'generate tests'):
+                self.generate_tests()
             mlog.log_timestamp("Tests generated")
             self.add_build_comment(NinjaComment('Install rules'))
-            self.generate_install()
+            with profiler.span('backend', 'generate install'):
+                self.generate_install()
             mlog.log_timestamp("Install generated")
-            self.generate_dist()
+            with profiler.span('backend', 'generate dist'):
+                self.generate_dist()
             mlog.log_timestamp("Dist generated")
             key = OptionKey('b_coverage')
             if (key in self.environment.coredata.optstore and
@@ -681,8 +1015,9 @@ class NinjaBackend(backends.Backend):
             mlog.log_timestamp("Utils generated")
             self.generate_ending()
 
-            self.write_rules(outfile)
-            self.write_builds(outfile)
+            with profiler.span('backend', 'write build.ninja'):
+                self.write_rules(outfile)
+                self.write_builds(outfile)
 
             default = 'default all\n\n'
             outfile.write(default)
@@ -695,7 +1030,6 @@ class NinjaBackend(backends.Backend):
         if mesonlib.version_compare(self.ninja_version, '>=1.10.0') and os.path.exists(os.path.join(self.environment.build_dir, '.ninja_log')) and not self._uses_dyndeps:
             subprocess.call(self.ninja_command + ['-t', 'restat'], cwd=self.environment.build_dir)
             subprocess.call(self.ninja_command + ['-t', 'cleandead'], cwd=self.environment.build_dir)
-        self.generate_compdb()
         self.generate_rust_project_json()
 
         if capture:
@@ -716,32 +1050,34 @@ class NinjaBackend(backends.Backend):
                 f, indent=4)
 
     # http://clang.llvm.org/docs/JSONCompilationDatabase.html
-    def generate_compdb(self) -> None:
-        rules = []
+    def get_compdb_rules(self) -> T.Set[str]:
+        rules: T.Set[str] = set()
         # TODO: Rather than an explicit list here, rules could be marked in the
         # rule store as being wanted in compdb
         for for_machine in MachineChoice:
             for compiler in self.environment.coredata.compilers[for_machine].values():
-                rules += [f"{rule}{ext}" for rule in [self.compiler_to_rule_name(compiler)]
-                          for ext in ['', '_RSP']]
-                rules += [f"{rule}{ext}" for rule in [self.compiler_to_pch_rule_name(compiler)]
-                          for ext in ['', '_RSP']]
-        compdb_options = ['-x'] if mesonlib.version_compare(self.ninja_version, '>=1.9') else []
-        ninja_compdb = self.ninja_command + ['-t', 'compdb'] + compdb_options + rules
-        builddir = self.environment.get_build_dir()
+                rules.update(f"{rule}{ext}" for rule in [self.compiler_to_rule_name(compiler)]
+                             for ext in ['', '_RSP'])
+                rules.update(f"{rule}{ext}" for rule in [self.compiler_to_pch_rule_name(compiler)]
+                             for ext in ['', '_RSP'])
+        return rules
+
+    def get_compdb_directory(self) -> str:
+        # ninja used to write this, and it reports the physical working directory
+        return os.path.realpath(self.environment.get_build_dir())
+
+    def open_compdb(self) -> T.Optional[NinjaCompdb]:
+        fname = os.path.join(self.environment.get_build_dir(), 'compile_commands.json')
+        cachefile = os.path.join(self.environment.get_scratch_dir(), 'compdb.dat')
         try:
-            jsondb = subprocess.check_output(ninja_compdb, cwd=builddir)
-            with open(os.path.join(builddir, 'compile_commands.json'), 'wb') as f:
-                f.write(jsondb)
-        except Exception:
+            return NinjaCompdb(fname, cachefile, self.get_compdb_rules(), self.get_compdb_directory())
+        except OSError:
             mlog.warning('Could not create compilation database.', fatal=False)
+            return None
 
     # Get all generated headers. Any source file might need them so
     # we need to add an order dependency to them.
-    def get_generated_headers(self, target: build.BuildTarget) -> T.List[FileOrString]:
-        tid = target.get_id()
-        if tid in self._generated_header_cache:
-            return self._generated_header_cache[tid]
+    def get_own_generated_headers(self, target: build.BuildTarget) -> T.List[FileOrString]:
         header_deps: T.List[FileOrString] = []
         # XXX: Why don't we add deps to CustomTarget headers here?
         for genlist in target.get_generated_sources():
@@ -753,15 +1089,65 @@ class NinjaBackend(backends.Backend):
         if 'vala' in target.compilers and not isinstance(target, build.Executable):
             vala_header = File.from_built_file(self.get_target_dir(target), target.vala_header)
             header_deps.append(vala_header)
-        # Recurse and find generated headers
-        for dep in itertools.chain(target.link_targets, target.link_whole_targets):
-            if isinstance(dep, (build.StaticLibrary, build.SharedLibrary)):
-                header_deps += self.get_generated_headers(dep)
         if isinstance(target, build.CompileTarget):
             header_deps.extend(target.get_generated_headers())
-        self._generated_header_cache[tid] = header_deps
         return header_deps
 
+    def get_generated_header_libraries(self, target: build.BuildTarget) -> T.List[build.BuildTarget]:
+        return [dep for dep in itertools.chain(target.link_targets, target.link_whole_targets)
+                if isinstance(dep, (build.StaticLibrary, build.SharedLibrary))]
+
+    def get_generated_headers(self, target: build.BuildTarget) -> T.List[FileOrString]:
+        tid = target.get_id()
+        if tid in self._generated_header_cache:
+            return self._generated_header_cache[tid]
+        header_deps: OrderedSet[FileOrString] = OrderedSet(self.get_own_generated_headers(target))
+        # Recurse and find generated headers. The libraries share most of
+        # theirs in deep dependency graphs, so only keep the first of each.
+        for dep in self.get_generated_header_libraries(target):
+            header_deps.update(self.get_generated_headers(dep))
+        self._generated_header_cache[tid] = list(header_deps)
+        return self._generated_header_cache[tid]
+
+    def get_generated_headers_phony(self, target: build.BuildTarget) -> T.Optional[str]:
+        '''The phony build statement that stands for all generated headers of
+        @target and the libraries it links to, if there are any.
+        '''
+        if not self.get_generated_headers(target):
+            return None
+        return os.path.join(self.get_target_private_dir(target), 'meson-generated-headers')
+
+    def generate_generated_headers_phony(self, target: build.BuildTarget) -> T.List[FileOrString]:
+        '''Returns the order-only dependencies on generated headers of the
+        sources of @target.
+
+        With backend_header_phony each target gets a phony build statement
+        depending on its own generated headers and on the phony statements of
+        the libraries it links to, so that the compile statements have one
+        order-only dependency instead of the whole transitive list.
+        '''
+        key = OptionKey('backend_header_phony')
+        optstore = self.environment.coredata.optstore
+        if key not in optstore or not optstore.get_value(key):
+            return list(self.get_generated_headers(target))
+        phony = self.get_generated_headers_phony(target)
+        if phony is None:
+            return []
+        inputs: T.List[str] = []
+        for h in self.get_own_generated_headers(target):
+            if isinstance(h, File):
+                h = h.rel_to_builddir(self.build_to_src)
+            elif not self.has_dir_part(h):
+                h = os.path.join(self.get_target_private_dir(target), h)
+            inputs.append(h)
+        for dep in self.get_generated_header_libraries(target):
+            dep_phony = self.get_generated_headers_phony(dep)
+            if dep_phony is not None:
+                inputs.append(dep_phony)
+        elem = NinjaBuildElement(self.all_outputs, phony, 'phony', list(OrderedSet(inputs)))
+        self.add_build(elem)
+        return [phony]
+
     def get_target_generated_sources(self, target: build.BuildTarget) -> T.MutableMapping[str, File]:
         """
         Returns a dictionary with the keys being the path to the file
@@ -890,6 +1276,9 @@ class NinjaBackend(backends.Backend):
         self.process_target_dependencies(target)
 
         self.generate_shlib_aliases(target, self.get_target_dir(target))
+        # Also for the languages below, whose libraries may be linked to
+        # targets in other languages
+        header_deps = self.generate_generated_headers_phony(target)
 
         # If target uses a language that cannot link to C objects,
         # just generate for that language and return.
@@ -938,14 +1327,15 @@ class NinjaBackend(backends.Backend):
         # Generate rules for GeneratedLists
         self.generate_generator_list_rules(target)
 
+        if self.target_uses_pch(target) and not target.has_pch():
+            self.select_auto_pch(target)
+
         # Generate rules for building the remaining source files in this target
         outname = self.get_target_filename(target)
         obj_list = []
         is_unity = target.is_unity
-        header_deps = []
         unity_src = []
         unity_deps = [] # Generated sources that must be built before compiling a Unity target.
-        header_deps += self.get_generated_headers(target)
 
         if is_unity:
             # Warn about incompatible sources if a unity build is enabled
@@ -1007,6 +1397,8 @@ class NinjaBackend(backends.Backend):
             pch_objects = self.generate_pch(target, header_deps=header_deps)
         else:
             pch_objects = []
+            if use_pch:
+                self.generate_auto_pch(target, header_deps)
 
         o, od = self.flatten_object_list(target)
         obj_targets = [t for t in od if t.uses_fortran()]
@@ -1199,7 +1591,8 @@ class NinjaBackend(backends.Backend):
                                                 capture=ofilenames[0] if target.capture else None,
                                                 feed=srcs[0] if target.feed else None,
                                                 env=target.env,
-                                                verbose=target.console)
+                                                verbose=target.console,
+                                                jobserver=target.jobserver)
         if reason:
             cmd_type = f' (wrapped by meson {reason})'
         else:
@@ -1236,7 +1629,8 @@ class NinjaBackend(backends.Backend):
             _, _, cmd = self.eval_custom_target_command(target)
             meson_exe_cmd, reason = self.as_meson_exe_cmdline(target.command[0], cmd[1:],
                                                               env=target_env,
-                                                              verbose=True)
+                                                              verbose=True,
+                                                              jobserver=target.jobserver)
             cmd_type = f' (wrapped by meson {reason})' if reason else ''
             elem = self.create_phony_target(target_name, 'CUSTOM_COMMAND', [])
             elem.add_item('COMMAND', meson_exe_cmd)
@@ -1404,9 +1798,23 @@ class NinjaBackend(backends.Backend):
             r.write(outfile)
 
     def write_builds(self, outfile: T.TextIO) -> None:
-        for b in ProgressBar(self.build_elements, desc='Writing build.ninja'):
-            b.write(outfile)
+        compdb = self.open_compdb()
+        try:
+            for b in ProgressBar(self.build_elements, desc='Writing build.ninja'):
+                if isinstance(b, NinjaBuildElement):
+                    b.write(outfile, compdb)
+                else:
+                    b.write(outfile)
+        except BaseException:
+            if compdb is not None:
+                compdb.abort()
+            raise
         mlog.log_timestamp("build.ninja generated")
+        if compdb is not None:
+            try:
+                compdb.close()
+            except OSError:
+                mlog.warning('Could not create compilation database.', fatal=False)
 
     def generate_phony(self) -> None:
         self.add_build_comment(NinjaComment('Phony build target, always out of date'))
@@ -2300,8 +2708,71 @@ class NinjaBackend(backends.Backend):
             options['rspfile_quote_style'] = tool.rsp_file_syntax()
         return options
 
+    def get_link_pool_depths(self) -> T.Tuple[int, int]:
+        '''The depths of the pools for links and for LTO links.
+
+        With backend_max_links=auto they are chosen so that as many of the
+        largest links as the pool allows fit into three quarters of the
+        available memory, leaving the rest to the compilers that run at the
+        same time. The size of the inputs of each link is taken from the
+        objects of the previous build recorded in .ninja_log.
+        '''
+        value = self.environment.coredata.optstore.get_value('backend_max_links')
+        if value != 'auto':
+            assert isinstance(value, int)
+            return value, 0
+        memory = mesonlib.get_available_memory()
+        if memory is None:
+            mlog.warning('Could not determine the available memory, not limiting the number of links')
+            return 0, 0
+        object_sizes = self.get_ninja_log_object_sizes()
+        link_memory = DEFAULT_LINK_MEMORY_ESTIMATE[0]
+        lto_memory = 0
+        for target in self.build.get_targets().values():
+            if (not isinstance(target, build.BuildTarget) or isinstance(target, (build.StaticLibrary, build.Jar))
+                    or target.uses_rust() or 'cs' in target.compilers or 'swift' in target.compilers):
+                continue
+            inputs = object_sizes.get(self.get_target_private_dir(target), 0)
+            for dep in target.get_dependencies():
+                if isinstance(dep, build.StaticLibrary):
+                    inputs += object_sizes.get(self.get_target_private_dir(dep), 0)
+            if self.target_uses_lto(target):
+                mode = compilers.compilers.get_option_value(target.get_options(), OptionKey('b_lto_mode'), 'default')
+                base, factor = LTO_LINK_MEMORY_ESTIMATES.get(mode, LTO_LINK_MEMORY_ESTIMATES['default'])
+                lto_memory = max(lto_memory, int(base + factor * inputs))
+            else:
+                linker, _ = self.determine_linker_and_stdlib_args(target)
+                base, factor = LINK_MEMORY_ESTIMATES.get(linker.get_linker_id(), DEFAULT_LINK_MEMORY_ESTIMATE)
+                link_memory = max(link_memory, int(base + factor * inputs))
+        budget = memory * 3 // 4
+        depth = max(1, budget // link_memory)
+        lto_depth = max(1, budget // lto_memory) if lto_memory else 0
+        mlog.debug(f'Available memory {memory // MIB} MiB, largest link estimated at {link_memory // MIB} MiB, '
+                   f'link pool depth {depth}')
+        if lto_depth:
+            mlog.debug(f'Largest LTO link estimated at {lto_memory // MIB} MiB, LTO link pool depth {lto_depth}')
+        return depth, lto_depth
+
+    def get_ninja_log_object_sizes(self) -> T.Dict[str, int]:
+        '''The total size of the objects built before, by directory.'''
+        sizes: T.Dict[str, int] = {}
+        build_dir = self.environment.get_build_dir()
+        outputs = [o for o in ninjagraph.read_ninja_log(build_dir) if self.environment.is_object(o)]
+        for o in outputs:
+            try:
+                size = os.stat(os.path.join(build_dir, o)).st_size
+            except OSError:
+                continue
+            d = os.path.dirname(o)
+            sizes[d] = sizes.get(d, 0) + size
+        return sizes
+
+    @staticmethod
+    def target_uses_lto(target: build.BuildTarget) -> bool:
+        return compilers.compilers.get_option_value(target.get_options(), OptionKey('b_lto'), False)
+
     def generate_static_link_rules(self) -> None:
-        num_pools = self.environment.coredata.optstore.get_value('backend_max_links')
+        num_pools = self.link_pool_depth
         if 'java' in self.environment.coredata.compilers.host:
             self.generate_java_link()
         for for_machine in MachineChoice:
@@ -2349,7 +2820,7 @@ class NinjaBackend(backends.Backend):
             self.add_rule(NinjaRule(rule, cmdlist, args, description, **options, extra=pool))
 
     def generate_dynamic_link_rules(self) -> None:
-        num_pools = self.environment.coredata.optstore.get_value('backend_max_links')
+        num_pools = self.link_pool_depth
         for for_machine in MachineChoice:
             complist = self.environment.coredata.compilers[for_machine]
             for langname, compiler in complist.items():
@@ -2520,7 +2991,23 @@ https://gcc.gnu.org/bugzilla/show_bug.cgi?id=47485'''))
             deps = 'gcc'
             depfile = '$DEPFILE'
         self.add_rule(NinjaRule(rule, command, args, description, **options,
-                                deps=deps, depfile=depfile))
+                                deps=deps, depfile=depfile,
+                                launcher=self.get_object_cache_launcher(compiler)))
+
+    def get_object_cache_launcher(self, compiler: Compiler) -> T.List[str]:
+        '''The command to run compiles with @compiler through Meson's own
+        object cache, if backend_object_cache is enabled and ccache or
+        sccache are not used already.
+        '''
+        key = OptionKey('backend_object_cache')
+        optstore = self.environment.coredata.optstore
+        if key not in optstore or not optstore.get_value(key):
+            return []
+        if (compiler.language not in {'c', 'cpp', 'objc', 'objcpp'}
+                or compiler.get_argument_syntax() != 'gcc'
+                or compiler.get_exelist() != compiler.get_exelist(ccache=False)):
+            return []
+        return self.environment.get_build_command() + ['--internal', 'objcache', '--']
 
     def generate_pch_rule_for(self, langname: str, compiler: Compiler) -> None:
         if langname not in {'c', 'cpp'}:
@@ -2956,6 +3443,28 @@ https://gcc.gnu.org/bugzilla/show_bug.cgi?id=47485'''))
             src_type_to_args[src_type_str] = commands.to_native()
         return src_type_to_args
 
+    def get_shared_compile_args(self, target: build.BuildTarget, compiler: Compiler,
+                                commands: CompilerArgs) -> T.Optional[NinjaSharedArgs]:
+        '''The compile arguments common to all sources of a target in the
+        language of @compiler, if they are written only once.
+        '''
+        key = OptionKey('backend_shared_args')
+        optstore = self.environment.coredata.optstore
+        if key not in optstore or not optstore.get_value(key):
+            return None
+        shared = self.shared_compile_args.get((target.get_id(), compiler.get_language()))
+        if shared is None:
+            base = re.sub(r'[^A-Za-z0-9_]', '_', f'{target.get_id()}_{compiler.get_language()}_ARGS')
+            name = base
+            i = 1
+            while name in self.shared_args_names:
+                i += 1
+                name = f'{base}{i}'
+            self.shared_args_names.add(name)
+            shared = NinjaSharedArgs(name, commands.to_native(copy=True))
+            self.shared_compile_args[(target.get_id(), compiler.get_language())] = shared
+        return shared
+
     def generate_single_compile(self, target: build.BuildTarget, src,
                                 is_generated: bool = False, header_deps=None,
                                 order_deps: T.Optional[T.List[FileOrString]] = None,
@@ -2987,6 +3496,7 @@ https://gcc.gnu.org/bugzilla/show_bug.cgi?id=47485'''))
             commands += self.get_pch_include_args(compiler, target)
 
         commands = commands.compiler.compiler_args(commands)
+        shared_args = self.get_shared_compile_args(target, compiler, commands)
 
         # Create introspection information
         if is_generated is False:
@@ -3016,7 +3526,7 @@ https://gcc.gnu.org/bugzilla/show_bug.cgi?id=47485'''))
 
         # PCH handling
         if self.target_uses_pch(target):
-            pchlist = target.get_pch(compiler.language)
+            pchlist = self.get_target_pch(target, compiler.language)
         else:
             pchlist = []
         if not pchlist:
@@ -3094,7 +3604,7 @@ https://gcc.gnu.org/bugzilla/show_bug.cgi?id=47485'''))
                     result += c
                 return result
             element.add_item('CUDA_ESCAPED_TARGET', quote_make_target(rel_obj))
-        element.add_item('ARGS', commands)
+        element.add_item('ARGS', commands, shared_args)
 
         self.add_dependency_scanner_entries_to_element(target, compiler, element, src)
         self.add_build(element)
@@ -3229,6 +3739,136 @@ https://gcc.gnu.org/bugzilla/show_bug.cgi?id=47485'''))
             self.add_build(elem)
         return pch_objects
 
+    def get_target_pch(self, target: build.BuildTarget, lang: str) -> T.List[str]:
+        return target.get_pch(lang) or self.auto_pch.get((target.get_id(), lang), [])
+
+    def load_previous_deps(self) -> T.Dict[str, T.List[str]]:
+        '''The headers each object included in the previous build, as
+        recorded by Ninja, if backend_auto_pch needs them.
+        '''
+        key = OptionKey('backend_auto_pch')
+        optstore = self.environment.coredata.optstore
+        build_dir = self.environment.get_build_dir()
+        if (key not in optstore or not optstore.get_value(key)
+                or not os.path.exists(os.path.join(build_dir, '.ninja_deps'))):
+            return {}
+        deps = ninjagraph.read_ninja_deps(self.ninja_command, build_dir)
+        if deps is None:
+            mlog.debug('Could not read the dependencies of the previous build')
+            return {}
+        return deps
+
+    def is_external_header(self, path: str) -> bool:
+        '''Whether @path, relative to the build directory, is a header from
+        outside the project, which changes rarely.
+        '''
+        path = os.path.normpath(os.path.join(self.environment.get_build_dir(), path))
+        subprojects = os.path.join(self.environment.get_source_dir(), self.build.subproject_dir)
+        if path.startswith(subprojects + os.sep):
+            return True
+        return not any(path.startswith(d + os.sep) for d in (self.environment.get_source_dir(), self.environment.get_build_dir()))
+
+    def get_auto_pch_include_dirs(self, target: build.BuildTarget, compiler: Compiler) -> T.Set[str]:
+        '''The absolute directories in which the <...> includes of @target
+        are looked up.
+        '''
+        source_dir = self.environment.get_source_dir()
+        build_dir = self.environment.get_build_dir()
+        dirs = list(compiler.get_default_include_dirs())
+        for inc in target.get_include_dirs():
+            dirs += inc.to_string_list(source_dir, build_dir)
+        for dep in target.get_external_deps():
+            args = dep.get_compile_args()
+            for i, arg in enumerate(args):
+                for prefix in ('-isystem', '-idirafter', '-I'):
+                    if arg.startswith(prefix):
+                        d = arg[len(prefix):]
+                        if not d and i + 1 < len(args):
+                            d = args[i + 1]
+                        dirs.append(d)
+                        break
+        return {os.path.normpath(os.path.join(build_dir, d)) for d in dirs if d}
+
+    def select_auto_pch(self, target: build.BuildTarget) -> None:
+        '''Synthesize a precompiled header for each language of @target
+        from the headers from outside the project that most of its sources
+        included in the previous build.
+
+        Only <...> includes are considered, when they resolve in an include
+        directory of the target to a header that Ninja recorded. A header
+        that some source includes after another preprocessor directive is
+        left out, as it is force-included in front of every source.
+
+        The header is only rewritten when that set of headers changes, so
+        that the precompiled header is not rebuilt needlessly.
+        '''
+        if not self.previous_deps or target.is_unity or isinstance(target, build.CompileTarget):
+            return
+        private_dir = self.get_target_private_dir(target)
+        build_dir = self.environment.get_build_dir()
+        for lang in ('c', 'cpp'):
+            compiler = target.compilers.get(lang)
+            if compiler is None or compiler.get_id() not in {'gcc', 'clang'}:
+                continue
+            header = os.path.join(private_dir, f'meson_auto_pch-{lang}.h')
+            abs_header = os.path.join(build_dir, header)
+            try:
+                with open(abs_header, encoding='utf-8') as f:
+                    old_content = f.read()
+            except OSError:
+                old_content = None
+            # Sources that include them do not list them in their
+            # dependencies once they are precompiled.
+            previous = set(scan_auto_pch_includes(old_content or '')[0])
+
+            include_dirs = self.get_auto_pch_include_dirs(target, compiler)
+            counts: T.Dict[str, int] = {}
+            excluded: T.Set[str] = set()
+            num_sources = 0
+            for src in target.get_sources():
+                if get_compiler_for_source(target.compilers.values(), src) is not compiler:
+                    continue
+                obj = os.path.join(private_dir, self.object_filename_from_source(target, src))
+                deps = self.previous_deps.get(obj.replace('\\', '/'))
+                if deps is None:
+                    continue
+                try:
+                    with open(src.absolute_path(self.environment.get_source_dir(), build_dir),
+                              encoding='utf-8', errors='replace') as f:
+                        leading, later = scan_auto_pch_includes(f.read())
+                except OSError:
+                    continue
+                num_sources += 1
+                excluded |= later
+                external = {os.path.normpath(os.path.join(build_dir, d)) for d in deps if self.is_external_header(d)}
+                for name in OrderedSet(leading):
+                    if name in previous or any(os.path.normpath(os.path.join(d, name)) in external for d in include_dirs):
+                        counts[name] = counts.get(name, 0) + 1
+            selected = [name for name, n in counts.items()
+                        if n >= max(2, num_sources * AUTO_PCH_MIN_SHARE) and name not in excluded]
+            if num_sources < AUTO_PCH_MIN_SOURCES or not selected:
+                continue
+            content = '/* Headers included by most sources of this target, precompiled by Meson. */\n'
+            content += ''.join(f'#include <{name}>\n' for name in selected)
+            if content != old_content:
+                os.makedirs(os.path.dirname(abs_header), exist_ok=True)
+                with open(abs_header, 'w', encoding='utf-8') as f:
+                    f.write(content)
+            self.auto_pch[(target.get_id(), lang)] = [header]
+
+    def generate_auto_pch(self, target: build.BuildTarget, header_deps: T.List[FileOrString]) -> None:
+        for lang in ('c', 'cpp'):
+            pch = self.auto_pch.get((target.get_id(), lang))
+            if not pch:
+                continue
+            compiler: Compiler = target.compilers[lang]
+            (commands, dep, dst, _) = self.generate_gcc_pch_command(target, compiler, pch[0])
+            elem = NinjaBuildElement(self.all_outputs, dst, self.compiler_to_pch_rule_name(compiler), pch[0])
+            self.add_header_deps(target, elem, header_deps)
+            elem.add_item('ARGS', commands)
+            elem.add_item('DEPFILE', dep)
+            self.add_build(elem)
+
     def get_target_shsym_filename(self, target):
         # Always name the .symbols file after the primary build output because it always exists
         targetdir = self.get_target_private_dir(target)
@@ -3555,6 +4195,8 @@ https://gcc.gnu.org/bugzilla/show_bug.cgi?id=47485'''))
         elem = NinjaBuildElement(self.all_outputs, outname, linker_rule, obj_list, implicit_outs=implicit_outs)
         elem.add_dep(dep_targets + custom_target_libraries)
         elem.add_item('LINK_ARGS', commands)
+        if self.lto_link_pool_depth > 0 and linker_base != 'STATIC' and self.target_uses_lto(target):
+            elem.add_item('pool', 'lto_link_pool')
         self.create_target_linker_introspection(target, linker, commands)
         return elem
 
@@ -0,0 +1,401 @@
+# SPDX-License-Identifier: Apache-2.0
+# Copyright 2024 The Meson development team
+
+"""Read back what Ninja knows about a build directory.
+
+build.ninja has the edges of the build graph, .ninja_deps the headers each
+object included when it was last compiled and .ninja_log how long each edge
+took. Together they tell which outputs a change to a file makes dirty and
+how long rebuilding them is going to take.
+
+The graph is indexed for lookups in both directions and cached in the
+private directory until one of the three files changes.
+"""
+
+from __future__ import annotations
+
+from dataclasses import dataclass, field
+import os
+import pickle
+import re
+import subprocess
+import typing as T
+
+from .. import coredata
+
+GRAPH_CACHE_FNAME = 'ninja-graph.dat'
+# Bump when the layout of BuildGraph changes
+GRAPH_CACHE_VERSION = 1
+
+# Paths in build lines are quoted with ninja_quote(..., True)
+_BUILD_TOKEN_PAT = re.compile(r'\$(.)|( +)|(:)|([^$ :]+)')
+
+
+@dataclass
+class LogEntry:
+
+    start: int
+    end: int
+    output: str
+
+    @property
+    def duration(self) -> int:
+        return self.end - self.start
+
+
+@dataclass
+class Edge:
+
+    rule: str
+    outputs: T.List[int]
+    inputs: T.List[int]
+    order_only: T.List[int]
+    duration: T.Optional[int] = None
+
+
+def read_ninja_log(build_dir: str, before: T.Optional[T.Tuple[int, int]] = None) -> T.Dict[str, LogEntry]:
+    '''The newest entry of each output in .ninja_log.
+
+    Times are in milliseconds since the start of the build that produced the
+    entry. Ninja appends to the log, so with @before, the inode and size of
+    the log before a build, only the entries of that build are returned. If
+    Ninja recompacted the log in the meantime, which replaces the file, the
+    whole log is read instead and only the entries after the last point
+    where the end time goes backwards, which is where a new build starts,
+    are kept.
+    '''
+    entries: T.Dict[str, LogEntry] = {}
+    last_end = 0
+    try:
+        with open(os.path.join(build_dir, '.ninja_log'), 'rb') as f:
+            recompacted = False
+            if before is not None:
+                st = os.fstat(f.fileno())
+                inode, size = before
+                if st.st_ino == inode and st.st_size >= size:
+                    f.seek(size)
+                else:
+                    recompacted = True
+            for raw in f:
+                line = raw.decode('utf-8', errors='replace')
+                if line.startswith('#'):
+                    continue
+                fields = line.rstrip('\r\n').split('\t')
+                if len(fields) < 4:
+                    continue
+                try:
+                    start, end = int(fields[0]), int(fields[1])
+                except ValueError:
+                    continue
+                if recompacted and end < last_end:
+                    entries = {}
+                last_end = end
+                entries[fields[3]] = LogEntry(start, end, fields[3])
+    except OSError:
+        pass
+    return entries
+
+
+def read_ninja_deps(ninja_command: T.List[str], build_dir: str) -> T.Optional[T.Dict[str, T.List[str]]]:
+    '''The headers each output included when it was last built, as recorded
+    by Ninja in .ninja_deps, or None if Ninja could not be asked.
+    '''
+    if not os.path.exists(os.path.join(build_dir, '.ninja_deps')):
+        return {}
+    try:
+        p = subprocess.run(ninja_command + ['-t', 'deps'], cwd=build_dir,
+                           stdout=subprocess.PIPE, stderr=subprocess.DEVNULL)
+    except OSError:
+        return None
+    if p.returncode != 0:
+        return None
+    deps: T.Dict[str, T.List[str]] = {}
+    current: T.List[str] = []
+    for line in p.stdout.decode('utf-8', errors='replace').splitlines():
+        if line.startswith('    '):
+            current.append(line[4:])
+        elif ': #deps ' in line:
+            current = deps[line.rpartition(': #deps ')[0].replace('\\', '/')] = []
+    return deps
+
+
+def _split_build_line(line: str) -> T.Tuple[T.List[str], str, T.List[str]]:
+    '''Split the text after `build ` into the outputs, the rule and the
+    inputs, undoing the quoting.
+    '''
+    outs: T.List[str] = []
+    rest: T.List[str] = []
+    current = outs
+    token: T.Optional[str] = None
+    for m in _BUILD_TOKEN_PAT.finditer(line):
+        escaped, space, colon, text = m.groups()
+        if space or (colon and current is outs):
+            if token is not None:
+                current.append(token)
+                token = None
+            if colon:
+                current = rest
+            continue
+        token = (token or '') + (escaped or colon or text)
+    if token is not None:
+        current.append(token)
+    if not rest:
+        return outs, '', []
+    return outs, rest[0], rest[1:]
+
+
+def parse_ninja_file(fname: str) -> T.Tuple[T.List[T.Tuple[str, T.List[str], T.List[str], T.List[str]]], T.List[str]]:
+    '''The rule, outputs, inputs and order-only inputs of each build
+    statement in the Ninja file @fname, and its default targets.
+
+    Implicit outputs and inputs are returned along with the explicit ones,
+    validations are skipped.
+    '''
+    edges: T.List[T.Tuple[str, T.List[str], T.List[str], T.List[str]]] = []
+    defaults: T.List[str] = []
+    with open(fname, encoding='utf-8') as f:
+        pending = ''
+        for line in f:
+            line = line.rstrip('\n')
+            if pending:
+                line = pending + line.lstrip(' ')
+                pending = ''
+            if not line.startswith(('build ', 'default ')):
+                continue
+            # A trailing unescaped $ continues the statement on the next line
+            stripped = line.rstrip('$')
+            if (len(line) - len(stripped)) % 2:
+                pending = line[:-1]
+                continue
+            if line.startswith('default '):
+                defaults += _split_build_line(line[8:])[0]
+                continue
+            outs, rule, ins = _split_build_line(line[6:])
+            outs = [o for o in outs if o != '|']
+            inputs: T.List[str] = []
+            order_only: T.List[str] = []
+            current = inputs
+            for i in ins:
+                if i == '|':
+                    continue
+                elif i == '||':
+                    current = order_only
+                    continue
+                elif i == '|@':
+                    break
+                current.append(i)
+            edges.append((rule, outs, inputs, order_only))
+    return edges, defaults
+
+
+def _stamp(build_dir: str) -> T.Tuple[T.Any, ...]:
+    stamp: T.List[T.Any] = [coredata.version, GRAPH_CACHE_VERSION]
+    for f in ('build.ninja', '.ninja_deps', '.ninja_log'):
+        try:
+            st = os.stat(os.path.join(build_dir, f))
+            stamp.append((st.st_mtime_ns, st.st_size))
+        except OSError:
+            stamp.append(None)
+    return tuple(stamp)
+
+
+@dataclass
+class BuildGraph:
+
+    '''The build graph of a build directory.
+
+    Files are numbered; each edge refers to its outputs and inputs by
+    number, and for each file the graph has the edge that produces it and
+    the edges that consume it.
+    '''
+
+    stamp: T.Tuple[T.Any, ...] = ()
+    names: T.List[str] = field(default_factory=list)
+    ids: T.Dict[str, int] = field(default_factory=dict)
+    edges: T.List[Edge] = field(default_factory=list)
+    producers: T.Dict[int, int] = field(default_factory=dict)
+    consumers: T.Dict[int, T.List[int]] = field(default_factory=dict)
+    default_edges: T.Set[int] = field(default_factory=set)
+    has_header_deps: bool = True
+
+    def _id(self, name: str) -> int:
+        try:
+            return self.ids[name]
+        except KeyError:
+            self.ids[name] = len(self.names)
+            self.names.append(name)
+            return self.ids[name]
+
+    def add_edge(self, rule: str, outputs: T.List[str], inputs: T.List[str], order_only: T.List[str]) -> None:
+        index = len(self.edges)
+        edge = Edge(rule, [self._id(o) for o in outputs], [self._id(i) for i in inputs],
+                    [self._id(i) for i in order_only])
+        self.edges.append(edge)
+        for o in edge.outputs:
+            self.producers[o] = index
+        for i in edge.inputs:
+            self.consumers.setdefault(i, []).append(index)
+
+    def add_header_deps(self, deps: T.Dict[str, T.List[str]]) -> None:
+        for output, headers in deps.items():
+            index = self.producers.get(self.ids.get(output, -1))
+            if index is None:
+                continue
+            edge = self.edges[index]
+            known = set(edge.inputs)
+            for h in headers:
+                i = self._id(h)
+                if i not in known:
+                    known.add(i)
+                    edge.inputs.append(i)
+                    self.consumers.setdefault(i, []).append(index)
+
+    def add_durations(self, log: T.Dict[str, LogEntry]) -> None:
+        for edge in self.edges:
+            for o in edge.outputs:
+                entry = log.get(self.names[o])
+                if entry is not None:
+                    edge.duration = max(edge.duration or 0, entry.duration)
+
+    @classmethod
+    def from_build_dir(cls, build_dir: str, ninja_command: T.Optional[T.List[str]]) -> BuildGraph:
+        graph = cls(stamp=_stamp(build_dir))
+        edges, defaults = parse_ninja_file(os.path.join(build_dir, 'build.ninja'))
+        for rule, outputs, inputs, order_only in edges:
+            graph.add_edge(rule, outputs, inputs, order_only)
+        # Ninja always brings its manifest up to date first
+        roots = [graph.ids[d] for d in defaults + ['build.ninja'] if d in graph.ids]
+        graph.default_edges = graph.required_edges(roots)
+        deps = read_ninja_deps(ninja_command, build_dir) if ninja_command else None
+        if deps is None:
+            graph.has_header_deps = False
+        else:
+            graph.add_header_deps(deps)
+        graph.add_durations(read_ninja_log(build_dir))
+        return graph
+
+    @classmethod
+    def load(cls, build_dir: str, ninja_command: T.Optional[T.List[str]]) -> BuildGraph:
+        '''The graph of @build_dir, from the cache if it is still current.'''
+        cache = os.path.join(build_dir, 'meson-private', GRAPH_CACHE_FNAME)
+        try:
+            with open(cache, 'rb') as f:
+                graph = pickle.load(f)
+            if isinstance(graph, cls) and graph.stamp == _stamp(build_dir) and (graph.has_header_deps or not ninja_command):
+                return graph
+        except (OSError, pickle.UnpicklingError, EOFError, AttributeError, TypeError):
+            pass
+        graph = cls.from_build_dir(build_dir, ninja_command)
+        tmp = cache + '~'
+        try:
+            with open(tmp, 'wb') as f:
+                pickle.dump(graph, f)
+            os.replace(tmp, cache)
+        except OSError:
+            pass
+        return graph
+
+    def lookup(self, build_dir: str, path: str) -> T.Optional[int]:
+        '''The number of the file @path, which is either absolute or
+        relative to the current directory, in the spelling of build.ninja.
+        '''
+        abspath = os.path.abspath(path)
+        candidates = [path, os.path.relpath(abspath, build_dir), abspath]
+        for c in candidates:
+            for spelling in (c, c.replace('\\', '/')):
+                if spelling in self.ids:
+                    return self.ids[spelling]
+        return None
+
+    def required_edges(self, files: T.Iterable[int]) -> T.Set[int]:
+        '''The edges that have to run to build @files from scratch.'''
+        required: T.Set[int] = set()
+        todo = list(files)
+        while todo:
+            index = self.producers.get(todo.pop())
+            if index is not None and index not in required:
+                required.add(index)
+                edge = self.edges[index]
+                todo.extend(edge.inputs)
+                todo.extend(edge.order_only)
+        return required
+
+    def dirty_edges(self, files: T.Iterable[int]) -> T.Set[int]:
+        '''The edges that have to run again when @files change.'''
+        dirty: T.Set[int] = set()
+        todo = list(files)
+        while todo:
+            for index in self.consumers.get(todo.pop(), []):
+                if index not in dirty:
+                    dirty.add(index)
+                    todo.extend(self.edges[index].outputs)
+        return dirty
+
+    def critical_path(self, edges: T.Collection[int],
+                      durations: T.Optional[T.Dict[int, int]] = None) -> T.Tuple[int, T.List[int]]:
+        '''The longest chain of @edges that have to run one after another,
+        and its total duration in milliseconds.
+
+        The duration of each edge is taken from @durations if given, or
+        else from the log. Edges that never ran, and phony edges, count as
+        taking no time.
+        '''
+        finish: T.Dict[int, T.Tuple[int, T.Optional[int]]] = {}
+        for root in edges:
+            stack = [(root, False)]
+            while stack:
+                index, expanded = stack.pop()
+                if index in finish:
+                    continue
+                edge = self.edges[index]
+                preds = [self.producers[i] for i in edge.inputs + edge.order_only
+                         if i in self.producers and self.producers[i] in edges]
+                if not expanded:
+                    stack.append((index, True))
+                    stack.extend((p, False) for p in preds if p not in finish)
+                    continue
+                best: T.Tuple[int, T.Optional[int]] = (0, None)
+                for p in preds:
+                    # A cycle would leave the predecessor unfinished
+                    if p in finish and finish[p][0] > best[0]:
+                        best = (finish[p][0], p)
+                duration = durations.get(index, 0) if durations is not None else edge.duration
+                finish[index] = (best[0] + (duration or 0), best[1])
+        if not finish:
+            return 0, []
+        last: T.Optional[int] = max(finish, key=lambda i: finish[i][0])
+        total = finish[T.cast('int', last)][0]
+        path: T.List[int] = []
+        while last is not None:
+            path.append(last)
+            last = finish[last][1]
+        path.reverse()
+        return total, path
+
+
+class TargetIndex:
+
+    '''Maps the outputs in build.ninja to the targets they belong to, given
+    the contents of intro-targets.json.
+
+    Objects and other intermediate files belong to the target whose private
+    directory they are in.
+    '''
+
+    def __init__(self, targets: T.List[T.Dict[str, T.Any]], build_dir: str) -> None:
+        self.by_output: T.Dict[str, T.Dict[str, T.Any]] = {}
+        for t in targets:
+            for i, fname in enumerate(t['filename']):
+                rel = os.path.relpath(fname, build_dir).replace('\\', '/')
+                self.by_output.setdefault(rel, t)
+                if i == 0:
+                    self.by_output.setdefault(rel + '.p', t)
+
+    def lookup(self, output: str) -> T.Optional[T.Dict[str, T.Any]]:
+        path = output.replace('\\', '/')
+        while path:
+            t = self.by_output.get(path)
+            if t is not None:
+                return t
+            path = path.rpartition('/')[0]
+        return None
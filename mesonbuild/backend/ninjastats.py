@@ -0,0 +1,233 @@
+# SPDX-License-Identifier: Apache-2.0
+# Copyright 2024 The Meson development team
+
+"""Statistics about the last Ninja build of a build directory.
+
+The jobs of the last build are read back from .ninja_log and matched with
+the edges of build.ninja, which tell the rule of each job and the order
+the jobs had to run in, and with the targets from the introspection data.
+The result is written as a Chrome trace (loadable in chrome://tracing or
+Perfetto) and as a plain text summary.
+"""
+
+from __future__ import annotations
+
+from dataclasses import dataclass, field
+import json
+import os
+import typing as T
+
+from .ninjagraph import BuildGraph, TargetIndex, read_ninja_log
+from ..scripts import objcache
+
+TRACE_FNAME = 'build-trace.json'
+SUMMARY_FNAME = 'build-stats.txt'
+
+# Number of rows of the parallelism over time histogram
+TIMELINE_SLICES = 10
+TOP_COUNT = 10
+
+
+@dataclass
+class Job:
+
+    output: str
+    rule: str
+    start: int
+    end: int
+    target: T.Optional[str] = None
+    source: T.Optional[str] = None
+    lane: int = 0
+
+    @property
+    def duration(self) -> int:
+        return self.end - self.start
+
+
+@dataclass
+class _Totals:
+
+    count: int = 0
+    total: int = 0
+    start: int = 0
+    end: int = 0
+
+
+@dataclass
+class BuildStats:
+
+    jobs: T.List[Job] = field(default_factory=list)
+    critical_path: T.List[Job] = field(default_factory=list)
+    # Compiles by outcome, if backend_object_cache is enabled
+    object_cache: T.Dict[str, int] = field(default_factory=dict)
+
+    @classmethod
+    def from_build_dir(cls, build_dir: str, log_before: T.Optional[T.Tuple[int, int]] = None) -> BuildStats:
+        '''The statistics of the last build, the one that appended to
+        .ninja_log after it had the inode and size @log_before.'''
+        log = read_ninja_log(build_dir, log_before)
+        graph = BuildGraph.load(build_dir, None)
+        with open(os.path.join(build_dir, 'meson-info', 'intro-targets.json'), encoding='utf-8') as f:
+            targets = TargetIndex(json.load(f), build_dir)
+
+        stats = cls()
+        by_edge: T.Dict[int, Job] = {}
+        for entry in sorted(log.values(), key=lambda e: (e.start, e.output)):
+            index = graph.producers.get(graph.ids.get(entry.output, -1))
+            if index is not None and index in by_edge:
+                # Another output of the same edge
+                continue
+            job = Job(entry.output, '', entry.start, entry.end)
+            if index is not None:
+                edge = graph.edges[index]
+                job.rule = edge.rule
+                if '_COMPILER' in edge.rule and edge.inputs:
+                    job.source = graph.names[edge.inputs[0]]
+                by_edge[index] = job
+            t = targets.lookup(entry.output)
+            if t is not None:
+                job.target = t['name']
+            stats.jobs.append(job)
+        stats.assign_lanes()
+
+        _, path = graph.critical_path(set(by_edge), {i: j.duration for i, j in by_edge.items()})
+        stats.critical_path = [by_edge[i] for i in path]
+        stats.object_cache = objcache.read_stats(build_dir)
+        return stats
+
+    def assign_lanes(self) -> None:
+        '''Put each job on the first lane that is free when it starts, so that
+        the trace shows one row per concurrently running job.
+        '''
+        lanes: T.List[int] = []
+        for job in self.jobs:
+            for i, end in enumerate(lanes):
+                if end <= job.start:
+                    job.lane = i
+                    lanes[i] = job.end
+                    break
+            else:
+                job.lane = len(lanes)
+                lanes.append(job.end)
+
+    @property
+    def start(self) -> int:
+        return min((j.start for j in self.jobs), default=0)
+
+    @property
+    def end(self) -> int:
+        return max((j.end for j in self.jobs), default=0)
+
+    def totals(self, key: T.Callable[[Job], str]) -> T.Dict[str, _Totals]:
+        result: T.Dict[str, _Totals] = {}
+        for j in self.jobs:
+            t = result.get(key(j))
+            if t is None:
+                t = result[key(j)] = _Totals(start=j.start, end=j.end)
+            t.count += 1
+            t.total += j.duration
+            t.start = min(t.start, j.start)
+            t.end = max(t.end, j.end)
+        return result
+
+    def timeline(self, slices: int = TIMELINE_SLICES) -> T.List[float]:
+        '''The average number of running jobs in each of @slices equal
+        parts of the build.
+        '''
+        start, end = self.start, self.end
+        if end <= start:
+            return []
+        width = (end - start) / slices
+        busy = [0.0] * slices
+        for j in self.jobs:
+            first = min(int((j.start - start) / width), slices - 1)
+            last = min(int((j.end - start) / width), slices - 1)
+            for i in range(first, last + 1):
+                lo = start + i * width
+                busy[i] += max(0.0, min(j.end, lo + width) - max(j.start, lo))
+        return [b / width for b in busy]
+
+    def write_trace(self, fname: str) -> None:
+        events: T.List[T.Dict[str, T.Any]] = []
+        start = self.start
+        for j in self.jobs:
+            event: T.Dict[str, T.Any] = {
+                'name': j.target or j.output,
+                'cat': j.rule or 'unknown',
+                'ph': 'X',
+                'ts': (j.start - start) * 1000,
+                'dur': j.duration * 1000,
+                'pid': 0,
+                'tid': j.lane,
+                'args': {'output': j.output},
+            }
+            if j.source:
+                event['args']['source'] = j.source
+            events.append(event)
+        changes: T.Dict[int, int] = {}
+        for j in self.jobs:
+            changes[j.start] = changes.get(j.start, 0) + 1
+            changes[j.end] = changes.get(j.end, 0) - 1
+        running = 0
+        for ts in sorted(changes):
+            running += changes[ts]
+            events.append({'name': 'running jobs', 'ph': 'C', 'ts': (ts - start) * 1000,
+                           'pid': 0, 'args': {'jobs': running}})
+        with open(fname, 'w', encoding='utf-8') as f:
+            json.dump({'traceEvents': events, 'displayTimeUnit': 'ms'}, f)
+
+    def summary(self) -> str:
+        wall = (self.end - self.start) / 1000
+        cpu = sum(j.duration for j in self.jobs) / 1000
+        lines = [f'Build time: {wall:.3f}s, {len(self.jobs)} jobs taking {cpu:.3f}s in total']
+        if wall > 0:
+            timeline = self.timeline()
+            lines.append(f'Average parallelism: {cpu / wall:.2f}, peak: {max(j.lane for j in self.jobs) + 1}')
+            lines += ['', 'Parallelism over time:']
+            for i, jobs in enumerate(timeline):
+                lines.append(f'  {i * 100 // len(timeline):3}% {jobs:6.2f} {"#" * round(jobs * 4)}')
+
+        def table(title: str, totals: T.Dict[str, _Totals], wall_column: bool) -> None:
+            lines.extend(['', f'{title}:'])
+            header = f'  {"total (s)":>10}'
+            if wall_column:
+                header += f' {"wall (s)":>10}'
+            lines.append(header + f' {"jobs":>6}  name')
+            entries = sorted(totals.items(), key=lambda x: (-x[1].total, x[0]))
+            for name, t in entries[:TOP_COUNT]:
+                line = f'  {t.total / 1000:10.3f}'
+                if wall_column:
+                    line += f' {(t.end - t.start) / 1000:10.3f}'
+                lines.append(line + f' {t.count:6}  {name}')
+
+        table('Targets', self.totals(lambda j: j.target or '(none)'), True)
+        table('Rules', self.totals(lambda j: j.rule or '(unknown)'), False)
+
+        if self.critical_path:
+            total = sum(j.duration for j in self.critical_path) / 1000
+            lines.extend(['', f'Critical path ({total:.3f}s):'])
+            for j in self.critical_path:
+                lines.append(f'  {j.duration / 1000:10.3f}  {j.target or "(none)"}: {j.output}')
+
+        compiles = sorted((j for j in self.jobs if j.source), key=lambda j: (-j.duration, j.output))
+        if compiles:
+            lines.extend(['', 'Slowest translation units:'])
+            for j in compiles[:TOP_COUNT]:
+                lines.append(f'  {j.duration / 1000:10.3f}  {j.source} ({j.target or "(none)"})')
+
+        if self.object_cache:
+            hits = self.object_cache.get('hit', 0)
+            misses = self.object_cache.get('miss', 0)
+            uncacheable = self.object_cache.get('uncacheable', 0)
+            rate = hits * 100 / (hits + misses) if hits + misses else 0.0
+            lines.extend(['', f'Object cache: {hits} hits, {misses} misses, {uncacheable} uncacheable, '
+                              f'hit rate {rate:.1f}%'])
+        return '\n'.join(lines) + '\n'
+
+    def write(self, log_dir: str) -> T.Tuple[str, str]:
+        trace = os.path.join(log_dir, TRACE_FNAME)
+        summary = os.path.join(log_dir, SUMMARY_FNAME)
+        self.write_trace(trace)
+        with open(summary, 'w', encoding='utf-8') as f:
+            f.write(self.summary())
+        return trace, summary
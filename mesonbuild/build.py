@@ -2580,6 +2580,7 @@ class CustomTarget(Target, CustomTargetBase, CommandBase):
                  install_dir: T.Optional[T.List[T.Union[str, Literal[False]]]] = None,
                  install_mode: T.Optional[FileMode] = None,
                  install_tag: T.Optional[T.List[T.Optional[str]]] = None,
+                 jobserver: bool = False,
                  absolute_paths: bool = False,
                  backend: T.Optional['Backend'] = None,
                  description: str = 'Generating {} with a custom command',
@@ -2606,6 +2607,7 @@ class CustomTarget(Target, CustomTargetBase, CommandBase):
         self.install_dir = list(install_dir or [])
         self.install_mode = install_mode
         self.install_tag = _process_install_tag(install_tag, len(self.outputs))
+        self.jobserver = jobserver
         self.name = name if name else self.outputs[0]
         self.description = description
 
@@ -2827,7 +2829,8 @@ class RunTarget(Target, CommandBase):
                  subproject: str,
                  environment: environment.Environment,
                  env: T.Optional[EnvironmentVariables] = None,
-                 default_env: bool = True):
+                 default_env: bool = True,
+                 jobserver: bool = False):
         # These don't produce output artifacts
         super().__init__(name, subdir, subproject, False, MachineChoice.BUILD, environment)
         self.dependencies = dependencies
@@ -2836,6 +2839,7 @@ class RunTarget(Target, CommandBase):
         self.absolute_paths = False
         self.env = env
         self.default_env = default_env
+        self.jobserver = jobserver
 
     def __repr__(self) -> str:
         repr_str = "<{0} {1}: {2}>"
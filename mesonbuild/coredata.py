@@ -430,11 +430,27 @@ class CoreData:
 
     def init_backend_options(self, backend_name: str) -> None:
         if backend_name == 'ninja':
-            self.optstore.add_system_option('backend_max_links', options.UserIntegerOption(
+            self.optstore.add_system_option('backend_max_links', options.UserIntegerOrAutoOption(
                 'backend_max_links',
-                'Maximum number of linker processes to run or 0 for no '
-                'limit',
+                'Maximum number of linker processes to run, 0 for no '
+                'limit or auto to fit them into the available memory',
                 (0, None, 0)))
+            self.optstore.add_system_option('backend_shared_args', options.UserBooleanOption(
+                'backend_shared_args',
+                'Write compile arguments common to all sources of a target only once',
+                False))
+            self.optstore.add_system_option('backend_header_phony', options.UserBooleanOption(
+                'backend_header_phony',
+                'Order compiles after generated headers through one phony statement per target',
+                False))
+            self.optstore.add_system_option('backend_auto_pch', options.UserBooleanOption(
+                'backend_auto_pch',
+                'Precompile the external headers most sources of a target included in the previous build',
+                False))
+            self.optstore.add_system_option('backend_object_cache', options.UserBooleanOption(
+                'backend_object_cache',
+                'Cache object files with a launcher built into Meson when ccache and sccache are not used',
+                False))
         elif backend_name.startswith('vs'):
             self.optstore.add_system_option('backend_startup_project', options.UserStringOption(
                 'backend_startup_project',
@@ -516,6 +532,28 @@ class CoreData:
         self.compiler_check_cache.clear()
         self.run_check_cache.clear()
 
+    def export_check_cache(self, filename: str) -> None:
+        '''Write the compiler check results out for import_check_cache().
+
+        Checks of files are left out, their key is the file name and not its
+        content.
+        '''
+        compiles = {k: v for k, v in self.compiler_check_cache.items() if isinstance(k[2], str)}
+        with open(filename, 'wb') as f:
+            pickle.dump((compiles, dict(self.run_check_cache)), f)
+
+    def import_check_cache(self, filename: str) -> None:
+        '''Seed the compiler check caches with the results of another build
+        directory.
+
+        The keys contain the compiler and all of its arguments, so results
+        are only reused for identical checks.
+        '''
+        with open(filename, 'rb') as f:
+            compiles, runs = pickle.load(f)
+        self.compiler_check_cache.update(compiles)
+        self.run_check_cache.update(runs)
+
     def get_nondefault_buildtype_args(self) -> T.List[T.Union[T.Tuple[str, str, str], T.Tuple[str, bool, bool]]]:
         result: T.List[T.Union[T.Tuple[str, str, str], T.Tuple[str, bool, bool]]] = []
         value = self.optstore.get_value('buildtype')
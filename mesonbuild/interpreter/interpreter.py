@@ -22,6 +22,7 @@ from ..mesonlib import (EnvironmentVariables, ExecutableSerialisation, MesonBugE
                         FileMode, MachineChoice, listify,
                         extract_as_list, has_path_sep, path_is_in_root, PerMachine)
 from ..options import OptionKey
+from ..utils import profiler
 from ..programs import ExternalProgram, NonExistingExternalProgram
 from ..dependencies import Dependency
 from ..depfile import DepFile
@@ -33,7 +34,6 @@ from ..interpreterbase import FeatureNew, FeatureDeprecated, FeatureBroken, Feat
 from ..interpreterbase import ObjectHolder, ContextManagerObject
 from ..interpreterbase import stringifyUserArguments
 from ..modules import ExtensionModule, ModuleObject, MutableModuleObject, NewExtensionModule, NotFoundExtensionModule
-from ..optinterpreter import optname_regex
 
 from . import interpreterobjects as OBJ
 from . import compiler as compilerOBJ
@@ -260,6 +260,8 @@ implicit_check_false_warning = """You should add the boolean check kwarg to the
          See also: https://github.com/mesonbuild/meson/issues/9300"""
 class Interpreter(InterpreterBase, HoldableObject):
 
+    keep_whitespace = False
+
     def __init__(
                 self,
                 _build: build.Build,
@@ -1095,7 +1097,7 @@ class Interpreter(InterpreterBase, HoldableObject):
                                        'projects are not allowed to directly access '
                                        'options of other subprojects.')
 
-        if optname_regex.search(optname.split('.', maxsplit=1)[-1]) is not None:
+        if optinterpreter.optname_regex.search(optname.split('.', maxsplit=1)[-1]) is not None:
             raise InterpreterException(f'Invalid option name {optname!r}')
 
         opt = self.get_option_internal(optname)
@@ -1291,12 +1293,16 @@ class Interpreter(InterpreterBase, HoldableObject):
         wrap_mode = WrapMode.from_string(self.coredata.get_option(OptionKey('wrap_mode')))
         if not self.is_subproject() or wrap_mode != WrapMode.nopromote:
             subdir = os.path.join(self.subdir, spdirname)
-            r = wrap.Resolver(self.environment.get_source_dir(), subdir, self.subproject, wrap_mode)
+            r = wrap.Resolver(self.environment.get_source_dir(), subdir, self.subproject, wrap_mode,
+                              use_shared_cache=self.coredata.get_option(OptionKey('wrap_cache')))
             if self.is_subproject():
                 assert self.environment.wrap_resolver is not None, 'for mypy'
                 self.environment.wrap_resolver.merge_wraps(r)
             else:
                 self.environment.wrap_resolver = r
+                if self.coredata.get_option(OptionKey('wrap_prefetch')) and \
+                        wrap_mode not in {WrapMode.nodownload, WrapMode.nofallback}:
+                    r.prefetch()
 
         self.build.projects[self.subproject] = proj_name
         mlog.log('Project name:', mlog.bold(proj_name))
@@ -2039,6 +2045,7 @@ class Interpreter(InterpreterBase, HoldableObject):
         KwargInfo('feed', bool, default=False, since='0.59.0'),
         KwargInfo('capture', bool, default=False),
         KwargInfo('console', bool, default=False, since='0.48.0'),
+        KwargInfo('jobserver', bool, default=False, since='1.6.0'),
     )
     def func_custom_target(self, node: mparser.FunctionNode, args: T.Tuple[str],
                            kwargs: 'kwtypes.CustomTarget') -> build.CustomTarget:
@@ -2129,6 +2136,7 @@ class Interpreter(InterpreterBase, HoldableObject):
             install_dir=kwargs['install_dir'],
             install_mode=install_mode,
             install_tag=kwargs['install_tag'],
+            jobserver=kwargs['jobserver'],
             backend=self.backend)
         self.add_target(tg.name, tg)
         return tg
@@ -2139,6 +2147,7 @@ class Interpreter(InterpreterBase, HoldableObject):
         COMMAND_KW,
         DEPENDS_KW,
         ENV_KW.evolve(since='0.57.0'),
+        KwargInfo('jobserver', bool, default=False, since='1.6.0'),
     )
     def func_run_target(self, node: mparser.FunctionNode, args: T.Tuple[str],
                         kwargs: 'kwtypes.RunTarget') -> build.RunTarget:
@@ -2151,7 +2160,7 @@ class Interpreter(InterpreterBase, HoldableObject):
             all_args[0] = self.find_program_impl([all_args[0]])
         name = args[0]
         tg = build.RunTarget(name, all_args, kwargs['depends'], self.subdir, self.subproject, self.environment,
-                             kwargs['env'])
+                             kwargs['env'], jobserver=kwargs['jobserver'])
         self.add_target(name, tg)
         return tg
 
@@ -2450,15 +2459,16 @@ class Interpreter(InterpreterBase, HoldableObject):
             self.subdir = prev_subdir
             raise InterpreterException(f"Nonexistent build file '{buildfilename!s}'")
         code = self.read_buildfile(absname, buildfilename)
-        try:
-            codeblock = mparser.Parser(code, absname).parse()
-        except mesonlib.MesonException as me:
-            me.file = absname
-            raise me
-        try:
-            self.evaluate_codeblock(codeblock)
-        except SubdirDoneRequest:
-            pass
+        with profiler.span('buildfile', buildfilename):
+            try:
+                codeblock = mparser.Parser(code, absname, keep_whitespace=self.keep_whitespace).parse()
+            except mesonlib.MesonException as me:
+                me.file = absname
+                raise me
+            try:
+                self.evaluate_codeblock(codeblock)
+            except SubdirDoneRequest:
+                pass
         self.subdir = prev_subdir
 
     # This is either ignored on basically any OS nowadays, or silently gets
@@ -3037,7 +3047,8 @@ class Interpreter(InterpreterBase, HoldableObject):
             return ret
 
     def run(self) -> None:
-        super().run()
+        with profiler.span('buildfile', os.path.join(self.subdir, environment.build_filename)):
+            super().run()
         mlog.log('Build targets in project:', mlog.bold(str(len(self.build.targets))))
         FeatureNew.report(self.subproject)
         FeatureDeprecated.report(self.subproject)
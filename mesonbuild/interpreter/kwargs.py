@@ -171,6 +171,7 @@ class RunTarget(TypedDict):
     command: T.List[T.Union[str, build.BuildTarget, build.CustomTarget, ExternalProgram, File]]
     depends: T.List[T.Union[build.BuildTarget, build.CustomTarget]]
     env: EnvironmentVariables
+    jobserver: bool
 
 
 class CustomTarget(TypedDict):
@@ -193,6 +194,7 @@ class CustomTarget(TypedDict):
     install_dir: T.List[T.Union[str, T.Literal[False]]]
     install_mode: FileMode
     install_tag: T.List[T.Optional[str]]
+    jobserver: bool
     output: T.List[str]
 
 class AddTestSetup(TypedDict):
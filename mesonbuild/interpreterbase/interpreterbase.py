@@ -6,6 +6,7 @@
 from __future__ import annotations
 
 from .. import environment, mparser, mesonlib
+from ..utils import profiler
 
 from .baseobjects import (
     InterpreterObject,
@@ -67,6 +68,11 @@ class InvalidCodeOnVoid(InvalidCode):
 
 
 class InterpreterBase:
+
+    # Whether parsed build files keep their whitespace and comments. Only
+    # tools that print the AST back out as source need them.
+    keep_whitespace = True
+
     def __init__(self, source_root: str, subdir: str, subproject: 'SubProject'):
         self.source_root = source_root
         self.funcs: FunctionType = {}
@@ -110,7 +116,7 @@ class InterpreterBase:
             raise InvalidCode('Builder file is empty.')
         assert isinstance(code, str)
         try:
-            self.ast = mparser.Parser(code, mesonfile).parse()
+            self.ast = mparser.Parser(code, mesonfile, keep_whitespace=self.keep_whitespace).parse()
             self.handle_meson_version_from_ast()
         except mparser.ParseException as me:
             me.file = mesonfile
@@ -525,7 +531,11 @@ class InterpreterBase:
             if not getattr(func, 'no-second-level-holder-flattening', False):
                 func_args, kwargs = resolve_second_level_holders(func_args, kwargs)
             self.current_node = node
-            res = func(node, func_args, kwargs)
+            if profiler.is_enabled():
+                with profiler.span('function', func_name):
+                    res = func(node, func_args, kwargs)
+            else:
+                res = func(node, func_args, kwargs)
             return self._holderify(res) if res is not None else None
         else:
             self.unknown_function_called(func_name)
@@ -554,7 +564,12 @@ class InterpreterBase:
             elif not isinstance(obj, Disabler):
                 raise InvalidArguments(f'Invalid operation "extract_objects" on {object_display_name} of type {type(obj).__name__}')
         obj.current_node = self.current_node = node
-        res = obj.method_call(method_name, args, kwargs)
+        if profiler.is_enabled():
+            # Only build the span name when profiling, this is the hottest path
+            with profiler.span('method', f'{obj.display_name()}.{method_name}'):
+                res = obj.method_call(method_name, args, kwargs)
+        else:
+            res = obj.method_call(method_name, args, kwargs)
         return self._holderify(res) if res is not None else None
 
     def _holderify(self, res: T.Union[TYPE_var, InterpreterObject]) -> InterpreterObject:
@@ -328,6 +328,11 @@ def add_arguments(parser: 'argparse.ArgumentParser') -> None:
         action='store_true',
         help='Show more verbose output.'
     )
+    parser.add_argument(
+        '--stats',
+        action='store_true',
+        help='Report where the time of the build went (applied only on `ninja` backend).'
+    )
     parser.add_argument(
         '--ninja-args',
         type=array_arg,
@@ -375,7 +380,38 @@ def run(options: 'argparse.Namespace') -> int:
         raise MesonException(
             f'Backend `{backend}` is not yet supported by `compile`. Use generated project files directly instead.')
 
+    if options.stats and backend != 'ninja':
+        raise MesonException('`--stats` is only supported with the ninja backend')
+    ninja_log = bdir / '.ninja_log'
+    log_before = log_stat(ninja_log)
+    if options.stats:
+        from .scripts.objcache import STATS_FNAME
+        try:
+            (bdir / STATS_FNAME).unlink()
+        except FileNotFoundError:
+            pass
+
     mlog.log(mlog.green('INFO:'), 'calculating backend command to run:', join_args(cmd))
     p, *_ = mesonlib.Popen_safe(cmd, stdout=sys.stdout.buffer, stderr=sys.stderr.buffer, env=env)
 
+    if options.stats:
+        if log_stat(ninja_log) in {None, log_before}:
+            mlog.log('No build statistics, nothing was built')
+        else:
+            print_build_stats(bdir, log_before)
     return p.returncode
+
+def log_stat(ninja_log: Path) -> T.Optional[T.Tuple[int, int]]:
+    try:
+        st = ninja_log.stat()
+    except FileNotFoundError:
+        return None
+    return st.st_ino, st.st_size
+
+def print_build_stats(bdir: Path, log_before: T.Optional[T.Tuple[int, int]]) -> None:
+    from .backend.ninjastats import BuildStats
+    stats = BuildStats.from_build_dir(str(bdir), log_before)
+    trace, _ = stats.write(str(bdir / 'meson-logs'))
+    print()
+    print(stats.summary(), end='')
+    mlog.log('Trace written to', mlog.bold(trace))
@@ -19,7 +19,6 @@ from . import environment
 from . import mesonlib
 from . import mintro
 from . import mlog
-from .ast import AstIDGenerator, IntrospectionInterpreter
 from .mesonlib import MachineChoice
 from .options import OptionKey
 from .optinterpreter import OptionInterpreter
@@ -113,6 +112,7 @@ class Conf:
         elif os.path.isfile(os.path.join(self.build_dir, environment.build_filename)):
             # Make sure that log entries in other parts of meson don't interfere with the JSON output
             with mlog.no_logging():
+                from .ast import AstIDGenerator, IntrospectionInterpreter
                 self.source_dir = os.path.abspath(os.path.realpath(self.build_dir))
                 intr = IntrospectionInterpreter(self.source_dir, '', 'ninja', visitors = [AstIDGenerator()])
                 intr.analyze()
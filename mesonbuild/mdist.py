@@ -8,22 +8,26 @@ from __future__ import annotations
 import abc
 import argparse
 import gzip
+import io
 import os
+import queue
 import sys
 import shlex
 import shutil
 import subprocess
 import tarfile
 import tempfile
+import threading
 import hashlib
 import typing as T
+import zipfile
 
 from dataclasses import dataclass
 from glob import glob
 from pathlib import Path
 from mesonbuild.environment import Environment, detect_ninja
 from mesonbuild.mesonlib import (MesonException, RealPathAction, get_meson_command, quiet_git,
-                                 windows_proof_rmtree, setup_vsenv)
+                                 windows_proof_rmtree, setup_vsenv, hash_file)
 from .options import OptionKey
 from mesonbuild.msetup import add_arguments as msetup_argparse
 from mesonbuild.wrap import wrap
@@ -31,6 +35,8 @@ from mesonbuild import mlog, build, coredata
 from .scripts.meson_exe import run_exe
 
 if T.TYPE_CHECKING:
+    from _typeshed import ReadableBuffer
+
     from ._typing import ImmutableListProtocol
     from .mesonlib import ExecutableSerialisation
 
@@ -54,16 +60,211 @@ def add_arguments(parser: argparse.ArgumentParser) -> None:
                         help='Include source code of subprojects that have been used for the build.')
     parser.add_argument('--no-tests', action='store_true',
                         help='Do not build and test generated packages.')
+    parser.add_argument('--skip-tests', action='store_true',
+                        help='Build and install the generated package, but do not run its tests.')
+    parser.add_argument('--reuse-cache', action='store_true',
+                        help='Reuse the compiler check results and the wrap package cache of this build '
+                             'directory when testing the generated package.')
+    parser.add_argument('-j', '--jobs', type=int, default=0,
+                        help='Number of parallel jobs to build and test the generated package with.')
 
 
-def create_hash(fname: str) -> None:
+def create_hash(fname: str, hexdigest: T.Optional[str] = None) -> None:
     hashname = fname + '.sha256sum'
-    m = hashlib.sha256()
-    m.update(open(fname, 'rb').read())
+    if hexdigest is None:
+        hexdigest = hash_file(fname)
     with open(hashname, 'w', encoding='utf-8') as f:
         # A space and an asterisk because that is the format defined by GNU coreutils
         # and accepted by busybox and the Perl shasum tool.
-        f.write('{} *{}\n'.format(m.hexdigest(), os.path.basename(fname)))
+        f.write('{} *{}\n'.format(hexdigest, os.path.basename(fname)))
+
+
+# Data is handed to the compressor threads in chunks of this size
+CHUNK_SIZE = 1024 * 1024
+
+
+class _HashingWriter(io.RawIOBase):
+    '''A write-only file that computes the sha256 of what goes through it.'''
+
+    def __init__(self, fname: str) -> None:
+        super().__init__()
+        self.file = open(fname, 'wb')
+        self.hash = hashlib.sha256()
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data: ReadableBuffer) -> int:
+        self.hash.update(data)
+        return self.file.write(data)
+
+    def flush(self) -> None:
+        self.file.flush()
+
+    def close(self) -> None:
+        if not self.closed:
+            super().close()
+            self.file.close()
+
+
+class _XzProcess:
+    '''Compresses with the xz tool, which, unlike the lzma module, can use
+    all cores.
+    '''
+
+    def __init__(self, xz: str, output: _HashingWriter) -> None:
+        self.output = output
+        self.proc = subprocess.Popen([xz, '--threads=0', '--stdout', '-'],
+                                     stdin=subprocess.PIPE, stdout=subprocess.PIPE)
+        self.reader = threading.Thread(target=self._read)
+        self.reader.start()
+
+    def _read(self) -> None:
+        assert self.proc.stdout is not None, 'for mypy'
+        for chunk in iter(lambda: self.proc.stdout.read(CHUNK_SIZE), b''):
+            self.output.write(chunk)
+
+    def write(self, data: bytes) -> int:
+        assert self.proc.stdin is not None, 'for mypy'
+        return self.proc.stdin.write(data)
+
+    def close(self) -> None:
+        assert self.proc.stdin is not None, 'for mypy'
+        self.proc.stdin.close()
+        self.reader.join()
+        if self.proc.wait() != 0:
+            raise MesonException(f'xz failed with exit code {self.proc.returncode}')
+
+
+def _open_compressor(fmt: str, output: _HashingWriter) -> T.Any:
+    if fmt == 'gztar':
+        return gzip.GzipFile(fileobj=output, mode='wb')
+    if fmt == 'bztar':
+        import bz2
+        return bz2.BZ2File(output, 'wb')
+    xz = shutil.which('xz')
+    if xz:
+        return _XzProcess(xz, output)
+    import lzma
+    return lzma.LZMAFile(output, 'wb')  # type: ignore[arg-type]
+
+
+def _compress(chunks: queue.Queue[T.Optional[bytes]], fmt: str, fname: str) -> str:
+    output = _HashingWriter(fname)
+    compressor = None
+    error: T.Optional[BaseException] = None
+    try:
+        compressor = _open_compressor(fmt, output)
+    except BaseException as e:
+        error = e
+    # Keep consuming after an error, the producer would block otherwise.
+    while True:
+        chunk = chunks.get()
+        if chunk is None:
+            break
+        if error is None:
+            assert compressor is not None, 'for mypy'
+            try:
+                compressor.write(chunk)
+            except BaseException as e:
+                error = e
+    try:
+        if compressor is not None:
+            compressor.close()
+    except BaseException as e:
+        error = error or e
+    finally:
+        output.close()
+    if error is not None:
+        raise error
+    return output.hash.hexdigest()
+
+
+class _FanOut:
+    '''A write-only stream that hands its data to several queues.'''
+
+    def __init__(self, queues: T.List[queue.Queue[T.Optional[bytes]]]) -> None:
+        self.queues = queues
+        self.buffer = bytearray()
+
+    def write(self, data: bytes) -> int:
+        self.buffer += data
+        if len(self.buffer) >= CHUNK_SIZE:
+            self.flush()
+        return len(data)
+
+    def flush(self) -> None:
+        if self.buffer:
+            chunk = bytes(self.buffer)
+            for q in self.queues:
+                q.put(chunk)
+            self.buffer.clear()
+
+    def close(self) -> None:
+        self.flush()
+        for q in self.queues:
+            q.put(None)
+
+
+def compress_tar(write_tar: T.Callable[[T.BinaryIO], None], outputs: T.Dict[str, str]) -> T.Dict[str, str]:
+    '''Compress the tar stream produced by @write_tar once per format.
+
+    @outputs maps archive formats to file names. The compressors run in
+    parallel threads, and the sha256 of each archive is computed while it is
+    written. Returns the hashes by file name.
+    '''
+    from concurrent.futures import ThreadPoolExecutor
+    queues: T.List[queue.Queue[T.Optional[bytes]]] = [queue.Queue(maxsize=8) for _ in outputs]
+    fanout = _FanOut(queues)
+    with ThreadPoolExecutor(len(outputs)) as executor:
+        futures = {fname: executor.submit(_compress, q, fmt, fname)
+                   for q, (fmt, fname) in zip(queues, outputs.items())}
+        try:
+            write_tar(T.cast('T.BinaryIO', fanout))
+        finally:
+            fanout.close()
+        return {fname: f.result() for fname, f in futures.items()}
+
+
+def make_zip(root_dir: str, base_dir: str, fname: str) -> str:
+    '''Like shutil.make_archive(), returns the sha256 of the archive.'''
+    output = _HashingWriter(fname)
+    try:
+        with zipfile.ZipFile(T.cast('T.BinaryIO', output), 'w', compression=zipfile.ZIP_DEFLATED) as zf:
+            zf.write(os.path.join(root_dir, base_dir), base_dir)
+            for dirpath, dirnames, filenames in os.walk(os.path.join(root_dir, base_dir)):
+                arcdir = os.path.relpath(dirpath, root_dir)
+                for name in sorted(dirnames):
+                    zf.write(os.path.join(dirpath, name), os.path.join(arcdir, name))
+                for name in sorted(filenames):
+                    path = os.path.join(dirpath, name)
+                    if os.path.isfile(path):
+                        zf.write(path, os.path.join(arcdir, name))
+    finally:
+        output.close()
+    return output.hash.hexdigest()
+
+
+def make_archives(root_dir: str, base_dir: str, archives: T.List[str]) -> T.Dict[str, str]:
+    '''Create archives of @base_dir in all requested formats at once.
+
+    The tree is only walked once for all tar formats, and all archives are
+    compressed in parallel. Returns the sha256 of each archive by file name.
+    '''
+    from concurrent.futures import ThreadPoolExecutor
+    base_name = os.path.join(root_dir, base_dir)
+    tar_outputs = {a: base_name + archive_extension[a] for a in archives if a != 'zip'}
+
+    def write_tar(f: T.BinaryIO) -> None:
+        with tarfile.open(fileobj=f, mode='w|') as tf:
+            tf.add(base_name, arcname=base_dir)
+
+    with ThreadPoolExecutor(1) as executor:
+        zip_future = executor.submit(make_zip, root_dir, base_dir, base_name + '.zip') if 'zip' in archives else None
+        hashes = compress_tar(write_tar, tar_outputs) if tar_outputs else {}
+        if zip_future is not None:
+            hashes[base_name + '.zip'] = zip_future.result()
+    return {base_name + archive_extension[a]: hashes[base_name + archive_extension[a]] for a in archives}
 
 
 msg_uncommitted_changes = 'Repository has uncommitted changes that will not be included in the dist tarball'
@@ -98,6 +299,8 @@ class Dist(metaclass=abc.ABCMeta):
     def __post_init__(self) -> None:
         self.dist_sub = os.path.join(self.bld_root, 'meson-dist')
         self.distdir = os.path.join(self.dist_sub, self.dist_name)
+        # sha256 of the created archives, when known
+        self.hashes: T.Dict[str, str] = {}
 
     @abc.abstractmethod
     def create_dist(self, archives: T.List[str]) -> T.List[str]:
@@ -211,13 +414,9 @@ class GitDist(Dist):
             else:
                 shutil.copytree(sub_src_root, sub_distdir)
         self.run_dist_scripts()
-        output_names = []
-        for a in archives:
-            compressed_name = self.distdir + archive_extension[a]
-            shutil.make_archive(self.distdir, a, root_dir=self.dist_sub, base_dir=self.dist_name)
-            output_names.append(compressed_name)
+        self.hashes = make_archives(self.dist_sub, self.dist_name, archives)
         windows_proof_rmtree(self.distdir)
-        return output_names
+        return list(self.hashes)
 
 
 class HgDist(Dist):
@@ -236,9 +435,6 @@ class HgDist(Dist):
 
         os.makedirs(self.dist_sub, exist_ok=True)
         tarname = os.path.join(self.dist_sub, self.dist_name + '.tar')
-        xzname = tarname + '.xz'
-        bz2name = tarname + '.bz2'
-        gzname = tarname + '.gz'
         zipname = os.path.join(self.dist_sub, self.dist_name + '.zip')
         # Note that -X interprets relative paths using the current working
         # directory, not the repository root, so this must be an absolute path:
@@ -251,20 +447,16 @@ class HgDist(Dist):
         subprocess.check_call(['hg', 'archive', '-R', self.src_root, '-S', '-t', 'tar',
                                '-X', self.src_root + '/.hg[a-z]*', tarname])
         output_names = []
-        if 'xztar' in archives:
-            import lzma
-            with lzma.open(xzname, 'wb') as xf, open(tarname, 'rb') as tf:
-                shutil.copyfileobj(tf, xf)
-            output_names.append(xzname)
-        if 'bztar' in archives:
-            import bz2
-            with bz2.open(bz2name, 'wb') as bf, open(tarname, 'rb') as tf:
-                shutil.copyfileobj(tf, bf)
-            output_names.append(bz2name)
-        if 'gztar' in archives:
-            with gzip.open(gzname, 'wb') as zf, open(tarname, 'rb') as tf:
-                shutil.copyfileobj(tf, zf)
-            output_names.append(gzname)
+        tar_outputs = {a: tarname + archive_extension[a][len('.tar'):] for a in archives if a != 'zip'}
+
+        def write_tar(f: T.BinaryIO) -> None:
+            with open(tarname, 'rb') as tf:
+                for chunk in iter(lambda: tf.read(CHUNK_SIZE), b''):
+                    f.write(chunk)
+
+        if tar_outputs:
+            self.hashes.update(compress_tar(write_tar, tar_outputs))
+            output_names += [tar_outputs[a] for a in archives if a in tar_outputs]
         os.unlink(tarname)
         if 'zip' in archives:
             subprocess.check_call(['hg', 'archive', '-R', self.src_root, '-S', '-t', 'zip', zipname])
@@ -272,24 +464,41 @@ class HgDist(Dist):
         return output_names
 
 
-def run_dist_steps(meson_command: T.List[str], unpacked_src_dir: str, builddir: str, installdir: str, ninja_args: T.List[str]) -> int:
-    if subprocess.call(meson_command + ['--backend=ninja', unpacked_src_dir, builddir]) != 0:
+def run_dist_steps(meson_command: T.List[str], unpacked_src_dir: str, builddir: str, installdir: str, ninja_args: T.List[str],
+                   run_tests: bool = True, env: T.Optional[T.Dict[str, str]] = None) -> int:
+    if subprocess.call(meson_command + ['--backend=ninja', unpacked_src_dir, builddir], env=env) != 0:
         print('Running Meson on distribution package failed')
         return 1
-    if subprocess.call(ninja_args, cwd=builddir) != 0:
+    if subprocess.call(ninja_args, cwd=builddir, env=env) != 0:
         print('Compiling the distribution package failed')
         return 1
-    if subprocess.call(ninja_args + ['test'], cwd=builddir) != 0:
+    if run_tests and subprocess.call(ninja_args + ['test'], cwd=builddir, env=env) != 0:
         print('Running unit tests on the distribution package failed')
         return 1
-    myenv = os.environ.copy()
+    myenv = (env or os.environ).copy()
     myenv['DESTDIR'] = installdir
     if subprocess.call(ninja_args + ['install'], cwd=builddir, env=myenv) != 0:
         print('Installing the distribution package failed')
         return 1
     return 0
 
-def check_dist(packagename: str, _meson_command: ImmutableListProtocol[str], extra_meson_args: T.List[str], bld_root: str, privdir: str) -> int:
+def reuse_cache_env(b: build.Build, privdir: str) -> T.Dict[str, str]:
+    '''Environment variables that let the dist check share caches with the
+    build directory it was started from.
+    '''
+    env: T.Dict[str, str] = {}
+    packagecache = os.path.join(b.environment.source_dir, b.subproject_dir, 'packagecache')
+    if os.path.isdir(packagecache):
+        env['MESON_PACKAGE_CACHE_DIR'] = packagecache
+    # The unpacked sources and the build directory are both below privdir,
+    # let ccache hash paths relative to it so that its results survive a
+    # version bump, which renames the unpacked directory.
+    env['CCACHE_BASEDIR'] = privdir
+    env['CCACHE_NOHASHDIR'] = 'true'
+    return {k: v for k, v in env.items() if k not in os.environ}
+
+def check_dist(packagename: str, _meson_command: ImmutableListProtocol[str], extra_meson_args: T.List[str], bld_root: str, privdir: str,
+               run_tests: bool = True, jobs: int = 0, env: T.Optional[T.Dict[str, str]] = None) -> int:
     print(f'Testing distribution package {packagename}')
     unpackdir = os.path.join(privdir, 'dist-unpack')
     builddir = os.path.join(privdir, 'dist-build')
@@ -299,6 +508,9 @@ def check_dist(packagename: str, _meson_command: ImmutableListProtocol[str], ext
             windows_proof_rmtree(p)
         os.mkdir(p)
     ninja_args = detect_ninja()
+    if jobs > 0:
+        ninja_args += ['-j', str(jobs)]
+        env = dict(env or os.environ, MESON_TESTTHREADS=str(jobs))
     shutil.unpack_archive(packagename, unpackdir)
     unpacked_files = glob(os.path.join(unpackdir, '*'))
     assert len(unpacked_files) == 1
@@ -308,7 +520,7 @@ def check_dist(packagename: str, _meson_command: ImmutableListProtocol[str], ext
     meson_command += create_cmdline_args(bld_root)
     meson_command += extra_meson_args
 
-    ret = run_dist_steps(meson_command, unpacked_src_dir, builddir, installdir, ninja_args)
+    ret = run_dist_steps(meson_command, unpacked_src_dir, builddir, installdir, ninja_args, run_tests, env)
     if ret > 0:
         print(f'Dist check build directory was {builddir}')
     else:
@@ -380,10 +592,17 @@ def run(options: argparse.Namespace) -> int:
         return 1
     rc = 0
     if not options.no_tests:
+        env = None
+        if options.reuse_cache:
+            cache_file = os.path.join(priv_dir, 'dist-check-cache.dat')
+            b.environment.coredata.export_check_cache(cache_file)
+            extra_meson_args.append(f'--import-check-cache={cache_file}')
+            env = dict(os.environ, **reuse_cache_env(b, priv_dir))
         # Check only one.
-        rc = check_dist(names[0], get_meson_command(), extra_meson_args, bld_root, priv_dir)
+        rc = check_dist(names[0], get_meson_command(), extra_meson_args, bld_root, priv_dir,
+                        not options.skip_tests, options.jobs, env)
     if rc == 0:
         for name in names:
-            create_hash(name)
+            create_hash(name, project.hashes.get(name))
             print('Created', name)
     return rc
@@ -56,14 +56,27 @@ def errorhandler(e: Exception, command: str) -> int:
             mlog.exception(e)
         return 2
 
+if T.TYPE_CHECKING:
+    AddArgumentsFunc = T.Callable[[argparse.ArgumentParser], None]
+    RunFunc = T.Callable[[argparse.Namespace], int]
+    CommandLoader = T.Callable[[], T.Tuple[AddArgumentsFunc, RunFunc]]
+
+def module_command(module: str) -> CommandLoader:
+    """Return a loader for a command implemented by a module's
+    add_arguments() and run() functions.
+
+    The module is only imported when the command is actually used, so that
+    e.g. `meson compile` does not pay for importing the interpreter.
+    """
+    def loader() -> T.Tuple[AddArgumentsFunc, RunFunc]:
+        mod = importlib.import_module('mesonbuild.' + module)
+        return mod.add_arguments, mod.run
+    return loader
+
 # Note: when adding arguments, please also add them to the completion
 # scripts in $MESONSRC/data/shell-completions/
 class CommandLineParser:
     def __init__(self) -> None:
-        # only import these once we do full argparse processing
-        from . import mconf, mdist, minit, minstall, mintro, msetup, mtest, rewriter, msubprojects, munstable_coredata, mcompile, mdevenv, mformat
-        from .scripts import env2mfile
-        from .wrap import wraptool
         import shutil
 
         self.term_width = shutil.get_terminal_size().columns
@@ -71,49 +84,49 @@ class CommandLineParser:
 
         self.commands: T.Dict[str, argparse.ArgumentParser] = {}
         self.hidden_commands: T.List[str] = []
+        self.loaders: T.Dict[str, CommandLoader] = {}
         self.parser = argparse.ArgumentParser(prog='meson', formatter_class=self.formatter)
         self.subparsers = self.parser.add_subparsers(title='Commands', dest='command',
                                                      description='If no command is specified it defaults to setup command.')
-        self.add_command('setup', msetup.add_arguments, msetup.run,
+        self.add_command('setup', module_command('msetup'),
                          help_msg='Configure the project')
-        self.add_command('configure', mconf.add_arguments, mconf.run,
+        self.add_command('configure', module_command('mconf'),
                          help_msg='Change project options',)
-        self.add_command('dist', mdist.add_arguments, mdist.run,
+        self.add_command('dist', module_command('mdist'),
                          help_msg='Generate release archive',)
-        self.add_command('install', minstall.add_arguments, minstall.run,
+        self.add_command('install', module_command('minstall'),
                          help_msg='Install the project')
-        self.add_command('introspect', mintro.add_arguments, mintro.run,
+        self.add_command('introspect', module_command('mintro'),
                          help_msg='Introspect project')
-        self.add_command('init', minit.add_arguments, minit.run,
+        self.add_command('init', module_command('minit'),
                          help_msg='Create a new project')
-        self.add_command('test', mtest.add_arguments, mtest.run,
+        self.add_command('test', module_command('mtest'),
                          help_msg='Run tests')
-        self.add_command('wrap', wraptool.add_arguments, wraptool.run,
+        self.add_command('wrap', module_command('wrap.wraptool'),
                          help_msg='Wrap tools')
-        self.add_command('subprojects', msubprojects.add_arguments, msubprojects.run,
+        self.add_command('subprojects', module_command('msubprojects'),
                          help_msg='Manage subprojects')
-        self.add_command('rewrite', lambda parser: rewriter.add_arguments(parser, self.formatter), rewriter.run,
+        self.add_command('rewrite', self.load_rewrite_command,
                          help_msg='Modify the project definition')
-        self.add_command('compile', mcompile.add_arguments, mcompile.run,
+        self.add_command('compile', module_command('mcompile'),
                          help_msg='Build the project')
-        self.add_command('devenv', mdevenv.add_arguments, mdevenv.run,
+        self.add_command('devenv', module_command('mdevenv'),
                          help_msg='Run commands in developer environment')
-        self.add_command('env2mfile', env2mfile.add_arguments, env2mfile.run,
+        self.add_command('env2mfile', module_command('scripts.env2mfile'),
                          help_msg='Convert current environment to a cross or native file')
-        self.add_command('format', mformat.add_arguments, mformat.run, aliases=['fmt'],
+        self.add_command('format', module_command('mformat'), aliases=['fmt'],
                          help_msg='Format meson source file')
         # Add new commands above this line to list them in help command
-        self.add_command('help', self.add_help_arguments, self.run_help_command,
+        self.add_command('help', lambda: (self.add_help_arguments, self.run_help_command),
                          help_msg='Print help of a subcommand')
 
         # Hidden commands
-        self.add_command('runpython', self.add_runpython_arguments, self.run_runpython_command,
+        self.add_command('runpython', lambda: (self.add_runpython_arguments, self.run_runpython_command),
                          help_msg=argparse.SUPPRESS)
-        self.add_command('unstable-coredata', munstable_coredata.add_arguments, munstable_coredata.run,
+        self.add_command('unstable-coredata', module_command('munstable_coredata'),
                          help_msg=argparse.SUPPRESS)
 
-    def add_command(self, name: str, add_arguments_func: T.Callable[[argparse.ArgumentParser], None],
-                    run_func: T.Callable[[argparse.Namespace], int], help_msg: str, aliases: T.List[str] = None) -> None:
+    def add_command(self, name: str, loader: CommandLoader, help_msg: str, aliases: T.List[str] = None) -> None:
         aliases = aliases or []
         # FIXME: Cannot have hidden subparser:
         # https://bugs.python.org/issue22848
@@ -122,10 +135,26 @@ class CommandLineParser:
             self.hidden_commands.append(name)
         else:
             p = self.subparsers.add_parser(name, help=help_msg, aliases=aliases, formatter_class=self.formatter)
-        add_arguments_func(p)
-        p.set_defaults(run_func=run_func)
         for i in [name] + aliases:
             self.commands[i] = p
+            self.loaders[i] = loader
+
+    def load_command(self, name: str) -> argparse.ArgumentParser:
+        """Fill in the arguments of a command, importing its implementation."""
+        p = self.commands[name]
+        loader = self.loaders.pop(name, None)
+        if loader is not None:
+            add_arguments_func, run_func = loader()
+            add_arguments_func(p)
+            p.set_defaults(run_func=run_func)
+            for alias, parser in self.commands.items():
+                if parser is p:
+                    self.loaders.pop(alias, None)
+        return p
+
+    def load_rewrite_command(self) -> T.Tuple[AddArgumentsFunc, RunFunc]:
+        from . import rewriter
+        return lambda parser: rewriter.add_arguments(parser, self.formatter), rewriter.run
 
     def add_runpython_arguments(self, parser: argparse.ArgumentParser) -> None:
         parser.add_argument('-c', action='store_true', dest='eval_arg', default=False)
@@ -148,12 +177,19 @@ class CommandLineParser:
 
     def run_help_command(self, options: argparse.Namespace) -> int:
         if options.command:
-            self.commands[options.command].print_help()
+            self.load_command(options.command).print_help()
         else:
             self.parser.print_help()
         return 0
 
     def run(self, args: T.List[str]) -> int:
+        # `meson --version` is an option of the implicit setup command, there
+        # is no need to load that command just to print the version.
+        if args and args[0] in {'-v', '--version'}:
+            from .coredata import version
+            print(version)
+            return 0
+
         implicit_setup_command_notice = False
         # If first arg is not a known command, assume user wants to run the setup
         # command.
@@ -162,6 +198,9 @@ class CommandLineParser:
             implicit_setup_command_notice = True
             args = ['setup'] + args
 
+        if args[0] in self.commands:
+            self.load_command(args[0])
+
         # Hidden commands have their own parser instead of using the global one
         if args[0] in self.hidden_commands:
             command = args[0]
@@ -229,6 +268,14 @@ def set_meson_command(mainfile: str) -> None:
     from . import mesonlib
     mesonlib.set_meson_command(mainfile)
 
+def regenerate(args: T.List[str], mainfile: str) -> int:
+    from . import msetup
+    set_meson_command(mainfile)
+    try:
+        return msetup.run(['--reconfigure'] + args)
+    except Exception as e:
+        return errorhandler(e, 'setup')
+
 def run(original_args: T.List[str], mainfile: str) -> int:
     if os.environ.get('MESON_SHOW_DEPRECATIONS'):
         # workaround for https://bugs.python.org/issue34624
@@ -267,11 +314,18 @@ def run(original_args: T.List[str], mainfile: str) -> int:
     if len(args) >= 2 and args[0] == '--internal':
         if args[1] == 'regenerate':
             set_meson_command(mainfile)
-            from . import msetup
-            try:
-                return msetup.run(['--reconfigure'] + args[2:])
-            except Exception as e:
-                return errorhandler(e, 'setup')
+            use_daemon = bool(os.environ.get('MESON_CONFIGURE_DAEMON'))
+            if use_daemon:
+                from .scripts import configure_daemon
+                use_daemon = configure_daemon.is_supported()
+            if use_daemon:
+                ret = configure_daemon.regenerate(args[2:], mainfile)
+                if ret is not None:
+                    return ret
+            ret = regenerate(args[2:], mainfile)
+            if use_daemon and ret == 0:
+                configure_daemon.spawn(args[2:])
+            return ret
         else:
             return run_script_command(args[1], args[2:])
 
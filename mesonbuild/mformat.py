@@ -15,7 +15,6 @@ from .mesonlib import MesonException
 from .ast.postprocess import AstConditionLevel
 from .ast.printer import RawPrinter
 from .ast.visitor import FullAstVisitor
-from .environment import build_filename
 
 if T.TYPE_CHECKING:
     import argparse
@@ -945,7 +944,7 @@ def run(options: argparse.Namespace) -> int:
     if options.recursive and not (options.inplace or options.check_only):
         raise MesonException('--recursive argument requires either --inplace or --check-only option')
 
-    sources: T.List[Path] = options.sources.copy() or [Path(build_filename)]
+    sources: T.List[Path] = options.sources.copy() or [Path('meson.build')]
     if not options.configuration:
         default_config_path = sources[0].parent / 'meson.format'
         if default_config_path.exists():
@@ -955,7 +954,7 @@ def run(options: argparse.Namespace) -> int:
     while sources:
         src_file = sources.pop(0)
         if src_file.is_dir():
-            src_file = src_file / build_filename
+            src_file = src_file / 'meson.build'
 
         try:
             code = src_file.read_text(encoding='utf-8')
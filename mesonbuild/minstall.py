@@ -6,19 +6,24 @@ from __future__ import annotations
 from glob import glob
 import argparse
 import errno
+import functools
+import json
 import os
 import selectors
 import shlex
 import shutil
+import stat
 import subprocess
 import sys
+import threading
 import typing as T
 import re
 
 from . import build, environment
 from .backend.backends import InstallData
 from .mesonlib import (MesonException, Popen_safe, RealPathAction, is_windows,
-                       is_aix, setup_vsenv, pickle_load, is_osx)
+                       is_aix, setup_vsenv, pickle_load, is_osx, copy_file_data,
+                       hash_file)
 from .options import OptionKey
 from .scripts import depfixer, destdir_join
 from .scripts.meson_exe import run_exe
@@ -35,6 +40,14 @@ if T.TYPE_CHECKING:
             InstallSymlinkData, TargetInstallData
     )
     from .mesonlib import FileMode, EnvironOrDict, ExecutableSerialisation
+    from typing_extensions import TypedDict
+
+    class ManifestEntry(TypedDict):
+        source: T.List[int]
+        source_hash: str
+        recipe: str
+        installed: T.List[int]
+        installed_hash: str
 
     try:
         from typing import Protocol
@@ -53,6 +66,9 @@ if T.TYPE_CHECKING:
         skip_subprojects: str
         tags: str
         strip: bool
+        jobs: int
+        hardlink: bool
+        verbose: bool
 
 
 symlink_warning = '''\
@@ -73,7 +89,7 @@ def add_arguments(parser: argparse.ArgumentParser) -> None:
     parser.add_argument('--no-rebuild', default=False, action='store_true',
                         help='Do not rebuild before installing.')
     parser.add_argument('--only-changed', default=False, action='store_true',
-                        help='Only overwrite files that are older than the copied file.')
+                        help='Only overwrite files whose content has changed.')
     parser.add_argument('--quiet', default=False, action='store_true',
                         help='Do not print every file that was installed.')
     parser.add_argument('--destdir', default=None,
@@ -86,6 +102,14 @@ def add_arguments(parser: argparse.ArgumentParser) -> None:
                         help='Install only targets having one of the given tags. (Since 0.60.0)')
     parser.add_argument('--strip', action='store_true',
                         help='Strip targets even if strip option was not set during configure. (Since 0.62.0)')
+    parser.add_argument('-j', '--jobs', default=1, type=int,
+                        help='Number of files to copy, strip and fix up in parallel. '
+                             'If the value is less than 1 the number of CPUs is used. (Since 1.6.0)')
+    parser.add_argument('--hardlink', default=False, action='store_true',
+                        help='Hardlink files that are installed unmodified instead of copying them. '
+                             'Only allowed when installing into a DESTDIR. (Since 1.6.0)')
+    parser.add_argument('-v', '--verbose', default=False, action='store_true',
+                        help='Also print how many files were copied, cloned or hardlinked. (Since 1.6.0)')
 
 class DirMaker:
     def __init__(self, lf: T.TextIO, makedirs: T.Callable[..., None]):
@@ -125,6 +149,78 @@ class DirMaker:
             append_to_log(self.lf, d)
 
 
+class InstallManifest:
+    '''Size, mtime and content hash of the files installed with --only-changed,
+    and of the build or source files they were installed from.
+
+    `recipe` describes how the installed file was derived from the source
+    (e.g. stripping and rpath changes), so that a file is only considered
+    up to date if both its input and the post-processing are the same.
+    '''
+
+    VERSION = 2
+
+    def __init__(self, fname: str):
+        self.fname = fname
+        self.files: T.Dict[str, ManifestEntry] = {}
+        self.lock = threading.Lock()
+        try:
+            with open(fname, encoding='utf-8') as f:
+                data = json.load(f)
+            if data.get('version') == self.VERSION:
+                self.files = data['files']
+        except (OSError, ValueError, KeyError):
+            pass
+
+    @staticmethod
+    def _stat(path: str) -> T.List[int]:
+        st = os.stat(path)
+        return [st.st_size, st.st_mtime_ns]
+
+    def _source_hash(self, entry: ManifestEntry, from_file: str) -> str:
+        if entry['source'] == self._stat(from_file):
+            return entry['source_hash']
+        return hash_file(from_file)
+
+    def is_unchanged(self, from_file: str, to_file: str, recipe: str) -> T.Optional[bool]:
+        '''Whether @to_file is what installing @from_file would produce, or
+        None if @to_file was not installed with a manifest.'''
+        entry = self.files.get(to_file)
+        if entry is None:
+            return None
+        if entry['recipe'] != recipe:
+            return False
+        if self._source_hash(entry, from_file) != entry['source_hash']:
+            return False
+        installed = self._stat(to_file)
+        if installed != entry['installed']:
+            # Touched since it was installed, only the content matters
+            if hash_file(to_file) != entry['installed_hash']:
+                return False
+            entry['installed'] = installed
+        entry['source'] = self._stat(from_file)
+        return True
+
+    def record(self, from_file: str, to_file: str, recipe: str) -> None:
+        '''Record @to_file after it was installed and post-processed.'''
+        source_hash = hash_file(from_file)
+        # Without post-processing the content is the same as the source
+        installed_hash = hash_file(to_file) if recipe else source_hash
+        entry: ManifestEntry = {
+            'source': self._stat(from_file),
+            'source_hash': source_hash,
+            'recipe': recipe,
+            'installed': self._stat(to_file),
+            'installed_hash': installed_hash,
+        }
+        with self.lock:
+            self.files[to_file] = entry
+
+    def write(self) -> None:
+        with open(self.fname, 'w', encoding='utf-8') as f:
+            json.dump({'version': self.VERSION, 'files': self.files}, f)
+
+
 def load_install_data(fname: str) -> InstallData:
     return pickle_load(fname, 'InstallData', InstallData)
 
@@ -227,6 +323,23 @@ def set_mode(path: str, mode: T.Optional['FileMode'], default_umask: T.Union[str
         sanitize_permissions(path, default_umask)
 
 
+def set_mode_is_noop(path: str, mode: T.Optional['FileMode'], default_umask: T.Union[str, int]) -> bool:
+    '''Whether set_mode() would leave the permissions and the owner of @path
+    as they are.'''
+    if mode is not None and (mode.owner is not None or mode.group is not None) and not is_windows():
+        return False
+    st = os.stat(path)
+    # chmod() can only change the read-only flag on Windows
+    mask = stat.S_IWRITE if is_windows() else 0o7777
+    if mode is not None and mode.perms_s is not None:
+        return st.st_mode & mask == mode.perms & mask
+    if default_umask == 'preserve':
+        return True
+    assert isinstance(default_umask, int), 'umask should only be "preserve" or an integer'
+    new_perms = 0o777 if st.st_mode & 0o111 else 0o666
+    return st.st_mode & mask == new_perms & ~default_umask & mask
+
+
 def restore_selinux_contexts() -> None:
     '''
     Restores the SELinux context for files in @selinux_updates
@@ -302,6 +415,18 @@ class Installer:
         # ['sub1', ...] means skip only those.
         self.skip_subprojects = [i.strip() for i in options.skip_subprojects.split(',')]
         self.tags = [i.strip() for i in options.tags.split(',')] if options.tags else None
+        self.jobs = options.jobs if options.jobs > 0 else (os.cpu_count() or 1)
+        self.hardlink = options.hardlink
+        # How installed files were written: 'copied', 'cloned' or 'hardlinked'
+        self.copy_stats: T.Dict[str, int] = {}
+        self.bytes_copied = 0
+        self.stats_lock = threading.Lock()
+        # Work on installed files, grouped by destination so that the steps
+        # for one file run in order. Only used when installing in parallel.
+        self.deferred: T.Dict[str, T.List[T.Callable[[], None]]] = {}
+        self.manifest: T.Optional[InstallManifest] = None
+        # Files to add to the manifest once they are fully installed
+        self.manifest_pending: T.List[T.Tuple[str, str, str]] = []
 
     def remove(self, *args: T.Any, **kwargs: T.Any) -> None:
         if not self.dry_run:
@@ -323,6 +448,35 @@ class Installer:
         if not self.dry_run:
             shutil.copy2(*args, **kwargs)
 
+    def can_hardlink(self, from_file: str, mode: T.Optional['FileMode'], default_umask: T.Union[str, int]) -> bool:
+        '''A hardlink shares its inode with the file in the source or build
+        directory, only link files whose mode and owner are already final.'''
+        if not self.hardlink:
+            return False
+        try:
+            return set_mode_is_noop(from_file, mode, default_umask)
+        except OSError:
+            return False
+
+    def install_file(self, from_file: str, to_file: str, allow_hardlink: bool = False) -> None:
+        '''Like copy2(), but clones, copies in the kernel, or hardlinks the
+        file where possible, and counts how the data was written.'''
+        if self.dry_run:
+            return
+        how = None
+        if allow_hardlink and self.hardlink:
+            try:
+                os.link(from_file, to_file)
+                how, size = 'hardlinked', 0
+            except OSError:
+                pass
+        if how is None:
+            how, size = copy_file_data(from_file, to_file)
+            shutil.copystat(from_file, to_file)
+        with self.stats_lock:
+            self.copy_stats[how] = self.copy_stats.get(how, 0) + 1
+            self.bytes_copied += size
+
     def copyfile(self, *args: T.Any, **kwargs: T.Any) -> None:
         if not self.dry_run:
             shutil.copyfile(*args, **kwargs)
@@ -355,6 +509,37 @@ class Installer:
         if not self.dry_run and not destdir:
             restore_selinux_contexts()
 
+    def defer(self, path: str, func: T.Callable[..., None], *args: T.Any, **kwargs: T.Any) -> None:
+        '''Run @func now, or queue it after the other work on @path when
+        installing in parallel.'''
+        if self.jobs <= 1:
+            func(*args, **kwargs)
+        else:
+            self.deferred.setdefault(path, []).append(functools.partial(func, *args, **kwargs))
+
+    def run_deferred(self) -> None:
+        '''Run the queued work on a thread pool and re-raise the first error,
+        in the order the files were installed.'''
+        if not self.deferred:
+            return
+        from concurrent.futures import ThreadPoolExecutor, wait, FIRST_EXCEPTION
+        chains = list(self.deferred.values())
+        self.deferred = {}
+
+        def run_chain(chain: T.List[T.Callable[[], None]]) -> None:
+            for func in chain:
+                func()
+
+        with ThreadPoolExecutor(self.jobs) as executor:
+            futures = [executor.submit(run_chain, c) for c in chains]
+            wait(futures, return_when=FIRST_EXCEPTION)
+            # Stop early on errors, like a sequential install would
+            for f in futures:
+                f.cancel()
+        for f in futures:
+            if not f.cancelled():
+                f.result()
+
     def Popen_safe(self, *args: T.Any, **kwargs: T.Any) -> T.Tuple[int, str, str]:
         if not self.dry_run:
             p, o, e = Popen_safe(*args, **kwargs)
@@ -379,19 +564,33 @@ class Installer:
         if not self.options.quiet:
             print(msg)
 
-    def should_preserve_existing_file(self, from_file: str, to_file: str) -> bool:
+    def should_preserve_existing_file(self, from_file: str, to_file: str, recipe: str = '') -> bool:
         if not self.options.only_changed:
             return False
         # Always replace danging symlinks
         if os.path.islink(from_file) and not os.path.isfile(from_file):
             return False
+        if self.manifest is not None:
+            unchanged = self.manifest.is_unchanged(from_file, to_file, recipe)
+            if unchanged is not None:
+                return unchanged
+        # Installed before there was a manifest, fall back to timestamps
         from_time = os.stat(from_file).st_mtime
         to_time = os.stat(to_file).st_mtime
         return from_time <= to_time
 
+    def record_installed(self) -> None:
+        if self.manifest is None or self.dry_run:
+            return
+        for from_file, to_file, recipe in self.manifest_pending:
+            self.manifest.record(from_file, to_file, recipe)
+        self.manifest_pending = []
+        self.manifest.write()
+
     def do_copyfile(self, from_file: str, to_file: str,
                     makedirs: T.Optional[T.Tuple[T.Any, str]] = None,
-                    follow_symlinks: T.Optional[bool] = None) -> bool:
+                    follow_symlinks: T.Optional[bool] = None,
+                    allow_hardlink: bool = False, recipe: str = '') -> bool:
         outdir = os.path.split(to_file)[0]
         if not os.path.isfile(from_file) and not os.path.islink(from_file):
             raise MesonException(f'Tried to install something that isn\'t a file: {from_file!r}')
@@ -401,12 +600,12 @@ class Installer:
         if os.path.exists(to_file):
             if not os.path.isfile(to_file):
                 raise MesonException(f'Destination {to_file!r} already exists and is not a file')
-            if self.should_preserve_existing_file(from_file, to_file):
+            if self.should_preserve_existing_file(from_file, to_file, recipe):
                 append_to_log(self.lf, f'# Preserving old file {to_file}\n')
                 self.preserved_file_count += 1
                 return False
             self.log(f'Installing {from_file} to {outdir}')
-            self.remove(to_file)
+            self.defer(to_file, self.remove, to_file)
         else:
             self.log(f'Installing {from_file} to {outdir}')
             if makedirs:
@@ -417,14 +616,19 @@ class Installer:
         if os.path.islink(from_file):
             if not os.path.exists(from_file):
                 # Dangling symlink. Replicate as is.
-                self.copy(from_file, outdir, follow_symlinks=False)
+                self.defer(to_file, self.copy, from_file, outdir, follow_symlinks=False)
             else:
                 if follow_symlinks is None:
                     follow_symlinks = True  # TODO: change to False when removing the warning
                     print(symlink_warning)
-                self.copy2(from_file, to_file, follow_symlinks=follow_symlinks)
+                if follow_symlinks:
+                    self.defer(to_file, self.install_file, from_file, to_file, allow_hardlink)
+                else:
+                    self.defer(to_file, self.copy2, from_file, to_file, follow_symlinks=False)
         else:
-            self.copy2(from_file, to_file)
+            self.defer(to_file, self.install_file, from_file, to_file, allow_hardlink)
+        if self.manifest is not None and os.path.isfile(from_file) and (follow_symlinks or not os.path.islink(from_file)):
+            self.manifest_pending.append((from_file, to_file, recipe))
         selinux_updates.append(to_file)
         append_to_log(self.lf, to_file)
         return True
@@ -521,8 +725,9 @@ class Installer:
                     dm.makedirs(parent_dir)
                     self.copystat(os.path.dirname(abs_src), parent_dir)
                 # FIXME: what about symlinks?
-                self.do_copyfile(abs_src, abs_dst, follow_symlinks=follow_symlinks)
-                self.set_mode(abs_dst, install_mode, data.install_umask)
+                self.do_copyfile(abs_src, abs_dst, follow_symlinks=follow_symlinks,
+                                 allow_hardlink=self.can_hardlink(abs_src, install_mode, data.install_umask))
+                self.defer(abs_dst, self.set_mode, abs_dst, install_mode, data.install_umask)
 
     def do_install(self, datafilename: str) -> None:
         d = load_install_data(datafilename)
@@ -538,11 +743,16 @@ class Installer:
             os.environ['DESTDIR'] = destdir
         destdir = destdir or ''
         fullprefix = destdir_join(destdir, d.prefix)
+        if self.hardlink and not destdir:
+            raise MesonException('--hardlink can only be used when installing into a DESTDIR')
 
         if d.install_umask != 'preserve':
             assert isinstance(d.install_umask, int)
             os.umask(d.install_umask)
 
+        if self.options.only_changed:
+            self.manifest = InstallManifest(os.path.join(d.build_dir, 'meson-private', 'install-manifest.json'))
+
         self.did_install_something = False
         try:
             with DirMaker(self.lf, self.makedirs) as dm:
@@ -552,11 +762,19 @@ class Installer:
                 self.install_man(d, dm, destdir, fullprefix)
                 self.install_emptydir(d, dm, destdir, fullprefix)
                 self.install_data(d, dm, destdir, fullprefix)
+                # Symlinks may point to any of the files installed so far
+                self.run_deferred()
+                self.record_installed()
                 self.install_symlinks(d, dm, destdir, fullprefix)
                 self.restore_selinux_contexts(destdir)
                 self.run_install_script(d, destdir, fullprefix)
                 if not self.did_install_something:
                     self.log('Nothing to install.')
+                if self.options.verbose and self.copy_stats:
+                    self.log('Installed {} files: {}; {} bytes copied'.format(
+                             sum(self.copy_stats.values()),
+                             ', '.join(f'{n} {how}' for how, n in sorted(self.copy_stats.items())),
+                             self.bytes_copied))
                 if not self.options.quiet and self.preserved_file_count > 0:
                     self.log('Preserved {} unchanged files, see {} for the full list'
                              .format(self.preserved_file_count, os.path.normpath(self.lf.name)))
@@ -625,9 +843,10 @@ class Installer:
             fullfilename = i.path
             outfilename = get_destdir_path(destdir, fullprefix, i.install_path)
             outdir = os.path.dirname(outfilename)
-            if self.do_copyfile(fullfilename, outfilename, makedirs=(dm, outdir), follow_symlinks=i.follow_symlinks):
+            if self.do_copyfile(fullfilename, outfilename, makedirs=(dm, outdir), follow_symlinks=i.follow_symlinks,
+                                allow_hardlink=self.can_hardlink(fullfilename, i.install_mode, d.install_umask)):
                 self.did_install_something = True
-            self.set_mode(outfilename, i.install_mode, d.install_umask)
+            self.defer(outfilename, self.set_mode, outfilename, i.install_mode, d.install_umask)
 
     def install_symlinks(self, d: InstallData, dm: DirMaker, destdir: str, fullprefix: str) -> None:
         for s in d.symlinks:
@@ -646,9 +865,10 @@ class Installer:
             full_source_filename = m.path
             outfilename = get_destdir_path(destdir, fullprefix, m.install_path)
             outdir = os.path.dirname(outfilename)
-            if self.do_copyfile(full_source_filename, outfilename, makedirs=(dm, outdir)):
+            if self.do_copyfile(full_source_filename, outfilename, makedirs=(dm, outdir),
+                                allow_hardlink=self.can_hardlink(full_source_filename, m.install_mode, d.install_umask)):
                 self.did_install_something = True
-            self.set_mode(outfilename, m.install_mode, d.install_umask)
+            self.defer(outfilename, self.set_mode, outfilename, m.install_mode, d.install_umask)
 
     def install_emptydir(self, d: InstallData, dm: DirMaker, destdir: str, fullprefix: str) -> None:
         for e in d.emptydir:
@@ -672,9 +892,10 @@ class Installer:
             outdir = get_destdir_path(destdir, fullprefix, t.install_path)
             outfilename = os.path.join(outdir, fname)
             if self.do_copyfile(fullfilename, outfilename, makedirs=(dm, outdir),
-                                follow_symlinks=t.follow_symlinks):
+                                follow_symlinks=t.follow_symlinks,
+                                allow_hardlink=self.can_hardlink(fullfilename, t.install_mode, d.install_umask)):
                 self.did_install_something = True
-            self.set_mode(outfilename, t.install_mode, d.install_umask)
+            self.defer(outfilename, self.set_mode, outfilename, t.install_mode, d.install_umask)
 
     def run_install_script(self, d: InstallData, destdir: str, fullprefix: str) -> None:
         env = {'MESON_SOURCE_ROOT': d.source_dir,
@@ -744,12 +965,16 @@ class Installer:
             if not os.path.exists(fname):
                 raise MesonException(f'File {fname!r} could not be found')
             elif os.path.isfile(fname):
-                file_copied = self.do_copyfile(fname, outname, makedirs=(dm, outdir))
+                recipe = repr((d.strip_bin if should_strip else None, install_rpath, final_path,
+                               sorted(t.rpath_dirs_to_remove), sorted(install_name_mappings.items())))
+                file_copied = self.do_copyfile(fname, outname, makedirs=(dm, outdir), recipe=recipe)
                 if should_strip and d.strip_bin is not None:
                     if fname.endswith('.jar'):
                         self.log('Not stripping jar target: {}'.format(os.path.basename(fname)))
                         continue
-                    self.do_strip(d.strip_bin, fname, outname)
+                    # A preserved file has already been stripped
+                    if file_copied:
+                        self.defer(outname, self.do_strip, d.strip_bin, fname, outname)
                 if fname.endswith('.js'):
                     # Emscripten outputs js files and optionally a wasm file.
                     # If one was generated, install it as well.
@@ -766,16 +991,21 @@ class Installer:
                 raise RuntimeError(f'Unknown file type for {fname!r}')
             if file_copied:
                 self.did_install_something = True
-                try:
-                    self.fix_rpath(outname, t.rpath_dirs_to_remove, install_rpath, final_path,
-                                   install_name_mappings, verbose=False)
-                except SystemExit as e:
-                    if isinstance(e.code, int) and e.code == 0:
-                        pass
-                    else:
-                        raise
+                self.defer(outname, self.fix_target_rpath, outname, t.rpath_dirs_to_remove, install_rpath,
+                           final_path, install_name_mappings)
                 # file mode needs to be set last, after strip/depfixer editing
-                self.set_mode(outname, install_mode, d.install_umask)
+                self.defer(outname, self.set_mode, outname, install_mode, d.install_umask)
+
+    def fix_target_rpath(self, outname: str, rpath_dirs_to_remove: T.Set[bytes], install_rpath: str,
+                         final_path: str, install_name_mappings: T.Mapping[str, str]) -> None:
+        try:
+            self.fix_rpath(outname, rpath_dirs_to_remove, install_rpath, final_path,
+                           install_name_mappings, verbose=False)
+        except SystemExit as e:
+            if isinstance(e.code, int) and e.code == 0:
+                pass
+            else:
+                raise
 
 def rebuild_all(wd: str, backend: str) -> bool:
     if backend == 'none':
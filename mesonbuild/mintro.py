@@ -20,7 +20,7 @@ import sys
 import typing as T
 
 from . import build, mesonlib, options, coredata as cdata
-from .ast import IntrospectionInterpreter, BUILD_TARGET_FUNCTIONS, AstConditionLevel, AstIDGenerator, AstIndentationGenerator, AstJSONPrinter
+from .ast import AstConditionLevel, AstIDGenerator, AstIndentationGenerator, AstJSONPrinter
 from .backend import backends
 from .dependencies import Dependency
 from . import environment
@@ -33,6 +33,7 @@ if T.TYPE_CHECKING:
     from typing import Any
     from .options import UserOption
 
+    from .ast import IntrospectionInterpreter
     from .interpreter import Interpreter
     from .mparser import BaseNode
 
@@ -90,6 +91,9 @@ def add_arguments(parser: argparse.ArgumentParser) -> None:
         flag = '--' + key.replace('_', '-')
         parser.add_argument(flag, action='store_true', dest=key, default=False, help=val.desc)
 
+    parser.add_argument('--rebuild-impact', action='append', dest='rebuild_impact', default=[], metavar='FILE',
+                        help='List the outputs, targets and tests that a change to FILE would rebuild, '
+                             'and estimate how long that takes. Can be given multiple times.')
     parser.add_argument('--backend', choices=sorted(options.backendlist), dest='backend', default='ninja',
                         help='The backend to use for the --buildoptions introspection.')
     parser.add_argument('-a', '--all', action='store_true', dest='all', default=False,
@@ -171,6 +175,7 @@ def get_target_dir(coredata: cdata.CoreData, subdir: str) -> str:
         return subdir
 
 def list_targets_from_source(intr: IntrospectionInterpreter) -> T.List[T.Dict[str, T.Union[bool, str, T.List[T.Union[str, T.Dict[str, T.Union[str, T.List[str], bool]]]]]]]:
+    from .ast import BUILD_TARGET_FUNCTIONS
     tlist: T.List[T.Dict[str, T.Union[bool, str, T.List[T.Union[str, T.Dict[str, T.Union[str, T.List[str], bool]]]]]]] = []
     root_dir = Path(intr.source_root)
 
@@ -500,6 +505,55 @@ def list_projinfo_from_source(intr: IntrospectionInterpreter) -> T.Dict[str, T.U
     intr.project_data['subproject_dir'] = intr.subproject_dir
     return intr.project_data
 
+def list_rebuild_impact(builddir: str, infodir: str, files: T.List[str]) -> T.Dict[str, T.Any]:
+    from .backend.ninjagraph import BuildGraph, TargetIndex
+    if not os.path.isfile(os.path.join(builddir, 'build.ninja')):
+        raise mesonlib.MesonException('--rebuild-impact is only supported with the ninja backend.')
+    build_dir = os.path.abspath(builddir)
+    graph = BuildGraph.load(build_dir, environment.detect_ninja())
+
+    known: T.List[int] = []
+    unknown: T.List[str] = []
+    for f in files:
+        i = graph.lookup(build_dir, f)
+        if i is None:
+            unknown.append(f)
+        else:
+            known.append(i)
+    dirty = graph.dirty_edges(known) & graph.default_edges
+    outputs = sorted(graph.names[o] for e in dirty if graph.edges[e].rule != 'phony' for o in graph.edges[e].outputs)
+
+    index = TargetIndex(load_info_file(infodir, 'targets'), build_dir)
+    targets: T.Dict[str, T.Dict[str, str]] = {}
+    for o in outputs:
+        t = index.lookup(o)
+        if t is not None and t['id'] not in targets:
+            targets[t['id']] = {'id': t['id'], 'name': t['name'], 'type': t['type']}
+
+    def affected_tests(kind: str) -> T.List[str]:
+        try:
+            tests = load_info_file(infodir, kind)
+        except FileNotFoundError:
+            return []
+        return [t['name'] for t in tests if any(d in targets for d in t['depends'])]
+
+    total, path = graph.critical_path(dirty)
+    return {
+        'unknown_files': unknown,
+        'regenerate': 'build.ninja' in outputs,
+        'outputs': outputs,
+        'targets': sorted(targets.values(), key=lambda t: t['id']),
+        'tests': affected_tests('tests'),
+        'benchmarks': affected_tests('benchmarks'),
+        'estimated_time': {
+            'serial': sum(graph.edges[e].duration or 0 for e in dirty) / 1000,
+            'critical_path': total / 1000,
+        },
+        'critical_path': [graph.names[graph.edges[e].outputs[0]] for e in path if graph.edges[e].outputs],
+        'unknown_durations': len([e for e in dirty if graph.edges[e].duration is None and graph.edges[e].rule != 'phony']),
+        'header_dependencies': graph.has_header_deps,
+    }
+
 def print_results(options: argparse.Namespace, results: T.Sequence[T.Tuple[str, T.Union[dict, T.List[T.Any]]]], indent: T.Optional[int]) -> int:
     if not results and not options.force_dict:
         print('No command specified')
@@ -541,6 +595,7 @@ def run(options: argparse.Namespace) -> int:
     if 'meson.build' in [os.path.basename(options.builddir), options.builddir]:
         # Make sure that log entries in other parts of meson don't interfere with the JSON output
         with redirect_stdout(sys.stderr):
+            from .ast import IntrospectionInterpreter
             backend = backends.get_backend_from_name(options.backend)
             assert backend is not None
             intr = IntrospectionInterpreter(sourcedir, '', backend.name, visitors = [AstIDGenerator(), AstIndentationGenerator(), AstConditionLevel()])
@@ -573,6 +628,13 @@ def run(options: argparse.Namespace) -> int:
                   .format(intro_vers, ' and '.join(vers_to_check)))
             return 1
 
+    if options.rebuild_impact:
+        try:
+            results += [('rebuild_impact', list_rebuild_impact(options.builddir, infodir, options.rebuild_impact))]
+        except mesonlib.MesonException as e:
+            print(e)
+            return 1
+
     # Extract introspection information from JSON
     for i, v in intro_types.items():
         if not v.func:
@@ -79,6 +79,11 @@ TV_TokenTypes = T.TypeVar('TV_TokenTypes', int, str, bool)
 
 @dataclass(eq=False)
 class Token(T.Generic[TV_TokenTypes]):
+
+    # A build file produces one token per lexeme, so avoid a per-instance
+    # __dict__ for them.
+    __slots__ = ('tid', 'filename', 'line_start', 'lineno', 'colno', 'bytespan', 'value')
+
     tid: str
     filename: str
     line_start: int
@@ -683,20 +688,24 @@ comparison_map: T.Mapping[str, COMPARISONS] = {
 # 9 plain token
 
 class Parser:
-    def __init__(self, code: str, filename: str):
+    def __init__(self, code: str, filename: str, keep_whitespace: bool = True):
         self.lexer = Lexer(code)
         self.stream = self.lexer.lex(filename)
         self.current: Token = Token('eof', '', 0, 0, 0, (0, 0), None)
         self.previous = self.current
         self.current_ws: T.List[Token] = []
+        # Whitespace and comments are only needed to reproduce the source
+        # (e.g. by `meson format`), an AST that is only evaluated can drop them.
+        self.keep_whitespace = keep_whitespace
 
         self.getsym()
         self.in_ternary = False
 
     def create_node(self, node_type: T.Type[BaseNodeT], *args: T.Any, **kwargs: T.Any) -> BaseNodeT:
         node = node_type(*args, **kwargs)
-        for ws_token in self.current_ws:
-            node.append_whitespaces(ws_token)
+        if self.keep_whitespace:
+            for ws_token in self.current_ws:
+                node.append_whitespaces(ws_token)
         self.current_ws = []
         return node
 
@@ -1083,8 +1092,9 @@ class Parser:
 
         try:
             while cond:
-                for ws_token in self.current_ws:
-                    block.append_whitespaces(ws_token)
+                if self.keep_whitespace:
+                    for ws_token in self.current_ws:
+                        block.append_whitespaces(ws_token)
                 self.current_ws = []
 
                 curline = self.line()
@@ -1099,8 +1109,9 @@ class Parser:
             raise
 
         # Remaining whitespaces will not be catched since there are no more nodes
-        for ws_token in self.current_ws:
-            block.append_whitespaces(ws_token)
+        if self.keep_whitespace:
+            for ws_token in self.current_ws:
+                block.append_whitespaces(ws_token)
         self.current_ws = []
 
         return block
@@ -12,6 +12,7 @@ import typing as T
 from . import build, coredata, environment, interpreter, mesonlib, mintro, mlog
 from .mesonlib import MesonException
 from .options import OptionKey
+from .utils import profiler
 
 if T.TYPE_CHECKING:
     from typing_extensions import Protocol
@@ -20,10 +21,12 @@ if T.TYPE_CHECKING:
     class CMDOptions(SharedCMDOptions, Protocol):
 
         profile: bool
+        profile_configure: bool
         fatal_warnings: bool
         reconfigure: bool
         wipe: bool
         clearcache: bool
+        import_check_cache: T.Optional[str]
         builddir: str
         sourcedir: str
         pager: bool
@@ -54,6 +57,8 @@ def add_arguments(parser: argparse.ArgumentParser) -> None:
                         version=coredata.version)
     parser.add_argument('--profile-self', action='store_true', dest='profile',
                         help=argparse.SUPPRESS)
+    parser.add_argument('--profile-configure', action='store_true',
+                        help='Record where configure time is spent and write a trace and a summary to meson-logs.')
     parser.add_argument('--fatal-meson-warnings', action='store_true', dest='fatal_warnings',
                         help='Make all Meson warnings fatal')
     parser.add_argument('--reconfigure', action='store_true',
@@ -66,6 +71,8 @@ def add_arguments(parser: argparse.ArgumentParser) -> None:
                              'newer version of meson.')
     parser.add_argument('--clearcache', action='store_true', default=False,
                         help='Clear cached state (e.g. found dependencies). Since 1.3.0.')
+    # Used by `meson dist --reuse-cache`
+    parser.add_argument('--import-check-cache', default=None, help=argparse.SUPPRESS)
     parser.add_argument('builddir', nargs='?', default=None)
     parser.add_argument('sourcedir', nargs='?', default=None)
 
@@ -182,10 +189,19 @@ class MesonApp:
         mlog.initialize(env.get_log_dir(), self.options.fatal_warnings)
         if self.options.profile:
             mlog.set_timestamp_start(time.monotonic())
+        if self.options.profile_configure:
+            profiler.enable()
         if self.options.clearcache:
             env.coredata.clear_cache()
+        if self.options.import_check_cache:
+            env.coredata.import_check_cache(self.options.import_check_cache)
         with mesonlib.BuildDirLock(self.build_dir):
-            return self._generate(env, capture, vslite_ctx)
+            try:
+                return self._generate(env, capture, vslite_ctx)
+            finally:
+                if self.options.profile_configure:
+                    trace, summary = profiler.write(env.get_log_dir())
+                    mlog.log('Configure profile written to', mlog.bold(trace), 'and', mlog.bold(summary))
 
     def _generate(self, env: environment.Environment, capture: bool, vslite_ctx: T.Optional[dict]) -> T.Optional[dict]:
         # Get all user defined options, including options that have been defined
@@ -224,7 +240,8 @@ class MesonApp:
                 fname = os.path.join(self.build_dir, 'meson-logs', 'profile-interpreter.log')
                 profile.runctx('intr.run()', globals(), locals(), filename=fname)
             else:
-                intr.run()
+                with profiler.span('setup', 'interpreter'):
+                    intr.run()
         except Exception as e:
             mintro.write_meson_info_file(b, [e])
             raise
@@ -250,7 +267,8 @@ class MesonApp:
                 captured_compile_args = localvars['gen_result']
                 assert captured_compile_args is None or isinstance(captured_compile_args, dict)
             else:
-                captured_compile_args = intr.backend.generate(capture, vslite_ctx)
+                with profiler.span('setup', 'backend'):
+                    captured_compile_args = intr.backend.generate(capture, vslite_ctx)
 
             build.save(b, dumpfile)
             if env.first_invocation:
@@ -267,11 +285,13 @@ class MesonApp:
                 fname = os.path.join(self.build_dir, 'meson-logs', 'profile-introspector.log')
                 profile.runctx('mintro.generate_introspection_file(b, intr.backend)', globals(), locals(), filename=fname)
             else:
-                mintro.generate_introspection_file(b, intr.backend)
+                with profiler.span('setup', 'introspection'):
+                    mintro.generate_introspection_file(b, intr.backend)
             mintro.write_meson_info_file(b, [], True)
 
             # Post-conf scripts must be run after writing coredata or else introspection fails.
-            intr.backend.run_postconf_scripts()
+            with profiler.span('setup', 'postconf scripts'):
+                intr.backend.run_postconf_scripts()
 
             # collect warnings about unsupported build configurations; must be done after full arg processing
             # by Interpreter() init, but this is most visible at the end
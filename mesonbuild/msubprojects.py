@@ -15,8 +15,8 @@ import zipfile
 
 from . import mlog
 from .ast import IntrospectionInterpreter
-from .mesonlib import quiet_git, GitException, Popen_safe, MesonException, windows_proof_rmtree
-from .wrap.wrap import (Resolver, WrapException, ALL_TYPES,
+from .mesonlib import quiet_git, GitException, Popen_safe, MesonException, windows_proof_rm, windows_proof_rmtree
+from .wrap.wrap import (Resolver, WrapException, ALL_TYPES, get_hash_sidecar,
                         parse_patch_url, update_wrap_file, get_releases)
 
 if T.TYPE_CHECKING:
@@ -535,6 +535,7 @@ class Runner:
                 if subproject_cache_file.is_file():
                     if options.confirm:
                         subproject_cache_file.unlink()
+                        windows_proof_rm(get_hash_sidecar(str(subproject_cache_file)))
                     self.log(f'Deleting {subproject_cache_file}')
             except WrapException:
                 pass
@@ -544,6 +545,7 @@ class Runner:
                 if subproject_patch_file.is_file():
                     if options.confirm:
                         subproject_patch_file.unlink()
+                        windows_proof_rm(get_hash_sidecar(str(subproject_patch_file)))
                     self.log(f'Deleting {subproject_patch_file}')
             except WrapException:
                 pass
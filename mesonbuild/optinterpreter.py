@@ -86,7 +86,7 @@ class OptionInterpreter:
         except UnicodeDecodeError as e:
             raise mesonlib.MesonException(f'Malformed option file {option_file!r} failed to parse as unicode: {e}')
         try:
-            ast = mparser.Parser(code, option_file).parse()
+            ast = mparser.Parser(code, option_file, keep_whitespace=False).parse()
         except mesonlib.MesonException as me:
             me.file = option_file
             raise me
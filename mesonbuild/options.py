@@ -74,6 +74,8 @@ _BUILTIN_NAMES = {
     'warning_level',
     'werror',
     'wrap_mode',
+    'wrap_cache',
+    'wrap_prefetch',
     'force_fallback_for',
     'pkg_config_path',
     'cmake_prefix_path',
@@ -361,6 +363,17 @@ class UserUmaskOption(UserIntegerOption, UserOption[T.Union[str, OctalInt]]):
         except ValueError as e:
             raise MesonException(f'Invalid mode for option "{self.name}" {e}')
 
+class UserIntegerOrAutoOption(UserIntegerOption, UserOption[T.Union[str, int]]):
+    def __init__(self, name: str, description: str, value: T.Any, yielding: bool = DEFAULT_YIELDING,
+                 deprecated: T.Union[bool, str, T.Dict[str, str], T.List[str]] = False):
+        super().__init__(name, description, value, yielding, deprecated)
+        self.choices = ['auto', self.choices]
+
+    def validate_value(self, value: T.Any) -> T.Union[str, int]:
+        if value == 'auto':
+            return 'auto'
+        return super().validate_value(value)
+
 class UserComboOption(UserOption[str]):
     def __init__(self, name: str, description: str, choices: T.List[str], value: T.Any,
                  yielding: bool = DEFAULT_YIELDING,
@@ -634,6 +647,8 @@ BUILTIN_CORE_OPTIONS: T.Dict['OptionKey', 'BuiltinOption'] = OrderedDict([
     (OptionKey('warning_level'),   BuiltinOption(UserComboOption, 'Compiler warning level to use', '1', choices=['0', '1', '2', '3', 'everything'], yielding=False)),
     (OptionKey('werror'),          BuiltinOption(UserBooleanOption, 'Treat warnings as errors', False, yielding=False)),
     (OptionKey('wrap_mode'),       BuiltinOption(UserComboOption, 'Wrap mode', 'default', choices=['default', 'nofallback', 'nodownload', 'forcefallback', 'nopromote'])),
+    (OptionKey('wrap_cache'),      BuiltinOption(UserBooleanOption, 'Share downloaded wrap archives with other projects in a per-user cache', False)),
+    (OptionKey('wrap_prefetch'),   BuiltinOption(UserBooleanOption, 'Download and extract all wraps in parallel before configuring', False)),
     (OptionKey('force_fallback_for'), BuiltinOption(UserArrayOption, 'Force fallback for those subprojects', [])),
     (OptionKey('vsenv'),           BuiltinOption(UserBooleanOption, 'Activate Visual Studio environment', False, readonly=True)),
 
@@ -0,0 +1,261 @@
+# SPDX-License-Identifier: Apache-2.0
+# Copyright 2024 The Meson development team
+
+"""A per build directory server for `meson --internal regenerate`.
+
+Most of the time of a regeneration in small and medium sized projects goes
+into starting Python and importing Meson. When `MESON_CONFIGURE_DAEMON` is
+set, the first regeneration of a build directory starts this server in the
+background. It imports everything a regeneration needs once and listens on a
+UNIX socket in the private directory. Later regenerations connect to it and
+pass their standard streams, working directory, environment and arguments;
+the server forks and runs the regeneration in the child.
+
+Every request runs in a fresh fork of a process that has never configured
+anything, so nothing is carried over from one regeneration to the next:
+compilers and check results are reused through coredata just like in a
+normal regeneration, and changes to the environment or to machine files are
+picked up as usual. The server exits after being idle for a while, when its
+socket goes away (e.g. with `meson setup --wipe`), or when a client runs a
+different Meson.
+"""
+
+from __future__ import annotations
+
+import array
+import json
+import os
+import signal
+import socket
+import struct
+import subprocess
+import sys
+import time
+import typing as T
+
+SOCKET_NAME = 'configure-daemon.sock'
+LOG_NAME = 'configure-daemon.log'
+IDLE_TIMEOUT = 30 * 60
+POLL_INTERVAL = 1.0
+
+# Sent instead of a return code when the server cannot handle the request.
+# The client then regenerates by itself.
+_REJECT = -1
+_HEADER = struct.Struct('!i')
+_STDIO = (0, 1, 2)
+
+
+def is_supported() -> bool:
+    return hasattr(os, 'fork') and hasattr(socket, 'AF_UNIX') and hasattr(socket, 'SCM_RIGHTS')
+
+
+def _identity() -> T.Dict[str, str]:
+    from ..coredata import version
+    return {'version': version, 'package': os.path.dirname(os.path.dirname(os.path.abspath(__file__)))}
+
+
+def _find_build_dir(args: T.List[str]) -> T.Optional[str]:
+    # regenerate gets the source and build directories in either order
+    for a in args[:2]:
+        if os.path.isfile(os.path.join(a, 'meson-private', 'coredata.dat')):
+            return os.path.abspath(a)
+    return None
+
+
+def _socket_path(build_dir: str) -> str:
+    path = os.path.join(build_dir, 'meson-private', SOCKET_NAME)
+    # UNIX socket paths are limited to a bit over a hundred bytes, a relative
+    # path is often shorter.
+    rel = os.path.relpath(path)
+    return rel if len(rel) < len(path) else path
+
+
+def _recv_exactly(conn: socket.socket, size: int) -> bytes:
+    data = b''
+    while len(data) < size:
+        chunk = conn.recv(size - len(data))
+        if not chunk:
+            raise ConnectionError('unexpected end of stream')
+        data += chunk
+    return data
+
+
+def _send_request(conn: socket.socket, request: T.Dict[str, T.Any]) -> None:
+    payload = json.dumps(request).encode('utf-8')
+    fds = array.array('i', _STDIO)
+    conn.sendmsg([_HEADER.pack(len(payload))], [(socket.SOL_SOCKET, socket.SCM_RIGHTS, fds)])
+    conn.sendall(payload)
+
+
+def _recv_request(conn: socket.socket) -> T.Tuple[T.List[int], T.Dict[str, T.Any]]:
+    fds = array.array('i')
+    msg, ancdata, _, _ = conn.recvmsg(_HEADER.size, socket.CMSG_SPACE(len(_STDIO) * fds.itemsize))
+    for level, kind, data in ancdata:
+        if level == socket.SOL_SOCKET and kind == socket.SCM_RIGHTS:
+            fds.frombytes(data[:len(data) - (len(data) % fds.itemsize)])
+    try:
+        if len(msg) != _HEADER.size or len(fds) != len(_STDIO):
+            raise ConnectionError('malformed request')
+        size, = _HEADER.unpack(msg)
+        request = json.loads(_recv_exactly(conn, size).decode('utf-8'))
+    except BaseException:
+        for fd in fds:
+            os.close(fd)
+        raise
+    return list(fds), request
+
+
+def regenerate(args: T.List[str], mainfile: str) -> T.Optional[int]:
+    """Have a running server regenerate the build directory.
+
+    Returns the exit code of the regeneration, or None if there is no usable
+    server and the caller has to regenerate by itself.
+    """
+    build_dir = _find_build_dir(args)
+    if build_dir is None:
+        return None
+    request = {
+        'args': args,
+        'mainfile': mainfile,
+        'cwd': os.getcwd(),
+        'env': dict(os.environ),
+    }
+    request.update(_identity())
+    try:
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as conn:
+            conn.connect(_socket_path(build_dir))
+            _send_request(conn, request)
+            code = int(_HEADER.unpack(_recv_exactly(conn, _HEADER.size))[0])
+    except OSError:
+        return None
+    if code == _REJECT:
+        return None
+    return code
+
+
+def spawn(args: T.List[str]) -> None:
+    """Start a server for the build directory in the background."""
+    from ..mesonlib import get_meson_command
+    build_dir = _find_build_dir(args)
+    meson_command = get_meson_command()
+    if build_dir is None or meson_command is None:
+        return
+    log = os.path.join(build_dir, 'meson-logs', LOG_NAME)
+    with open(log, 'a', encoding='utf-8') as logfile:
+        subprocess.Popen(list(meson_command) + ['--internal', 'configure_daemon', build_dir],
+                         stdin=subprocess.DEVNULL, stdout=logfile, stderr=subprocess.STDOUT,
+                         cwd=build_dir, start_new_session=True)
+
+
+def _log(msg: str) -> None:
+    print(time.strftime('%Y-%m-%d %H:%M:%S'), f'[{os.getpid()}]', msg, flush=True)
+
+
+def _serve_one(server: socket.socket, conn: socket.socket, fds: T.List[int], request: T.Dict[str, T.Any]) -> T.NoReturn:
+    code = 1
+    try:
+        signal.signal(signal.SIGCHLD, signal.SIG_DFL)
+        server.close()
+        for fd, target in zip(fds, _STDIO):
+            os.dup2(fd, target)
+            os.close(fd)
+        sys.stdout.reconfigure(line_buffering=sys.stdout.isatty())  # type: ignore[attr-defined]
+        os.chdir(request['cwd'])
+        os.environ.clear()
+        os.environ.update(request['env'])
+        from .. import mesonmain
+        code = mesonmain.regenerate(request['args'], request['mainfile'])
+    finally:
+        sys.stdout.flush()
+        sys.stderr.flush()
+        try:
+            conn.sendall(_HEADER.pack(code))
+        except OSError:
+            pass
+        os._exit(code)
+
+
+def serve(build_dir: str) -> int:
+    os.chdir(build_dir)
+    path = os.path.join('meson-private', SOCKET_NAME)
+    server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        server.connect(path)
+        _log('Another server is already running')
+        server.close()
+        return 0
+    except OSError:
+        server.close()
+    if os.path.exists(path):
+        os.unlink(path)
+
+    # Everything a regeneration imports, so that the children don't have to.
+    from .. import mesonmain, msetup
+    from ..backend import ninjabackend
+    del mesonmain, msetup, ninjabackend
+    identity = _identity()
+
+    server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    old_umask = os.umask(0o077)
+    try:
+        server.bind(path)
+    finally:
+        os.umask(old_umask)
+    server.listen()
+    server.settimeout(POLL_INTERVAL)
+    inode = os.stat(path).st_ino
+    # Children are not waited for, the client gets their exit code.
+    signal.signal(signal.SIGCHLD, signal.SIG_IGN)
+    _log(f'Serving regenerations of {build_dir}')
+
+    last_request = time.monotonic()
+    while True:
+        try:
+            conn, _ = server.accept()
+        except socket.timeout:
+            try:
+                if os.stat(path).st_ino != inode:
+                    _log('Socket was replaced, exiting')
+                    break
+            except OSError:
+                _log('Socket was removed, exiting')
+                break
+            if time.monotonic() - last_request > IDLE_TIMEOUT:
+                _log('Idle, exiting')
+                break
+            continue
+        last_request = time.monotonic()
+        conn.settimeout(None)
+        with conn:
+            try:
+                fds, request = _recv_request(conn)
+            except (OSError, ValueError) as e:
+                _log(f'Dropping malformed request: {e}')
+                continue
+            if {k: request.get(k) for k in identity} != identity:
+                _log('Client runs a different Meson, exiting')
+                for fd in fds:
+                    os.close(fd)
+                conn.sendall(_HEADER.pack(_REJECT))
+                os.unlink(path)
+                break
+            pid = os.fork()
+            if pid == 0:
+                _serve_one(server, conn, fds, request)
+            for fd in fds:
+                os.close(fd)
+            _log(f'Serving regeneration in process {pid}')
+
+    server.close()
+    return 0
+
+
+def run(args: T.List[str]) -> int:
+    if not is_supported():
+        print('The configure daemon is not supported on this platform', file=sys.stderr)
+        return 1
+    return serve(args[0])
+
+
+if __name__ == '__main__':
+    sys.exit(run(sys.argv[1:]))
@@ -5,6 +5,7 @@ from __future__ import annotations
 
 
 import sys
+import mmap
 import os
 import stat
 import struct
@@ -31,90 +32,39 @@ class DataSizes:
             p = '<'
         else:
             p = '>'
-        self.Half = p + 'h'
-        self.HalfSize = 2
-        self.Word = p + 'I'
-        self.WordSize = 4
-        self.Sword = p + 'i'
-        self.SwordSize = 4
         if ptrsize == 64:
-            self.Addr = p + 'Q'
-            self.AddrSize = 8
-            self.Off = p + 'Q'
-            self.OffSize = 8
-            self.XWord = p + 'Q'
-            self.XWordSize = 8
-            self.Sxword = p + 'q'
-            self.SxwordSize = 8
+            # e_type .. e_shstrndx, everything after e_ident
+            self.Header = struct.Struct(p + 'HHIQQQIHHHHHH')
+            self.SectionHeader = struct.Struct(p + 'IIQQQQIIQQ')
+            self.DynamicEntry = struct.Struct(p + 'qQ')
         else:
-            self.Addr = p + 'I'
-            self.AddrSize = 4
-            self.Off = p + 'I'
-            self.OffSize = 4
-
-class DynamicEntry(DataSizes):
-    def __init__(self, ifile: T.BinaryIO, ptrsize: int, is_le: bool) -> None:
-        super().__init__(ptrsize, is_le)
-        self.ptrsize = ptrsize
-        if ptrsize == 64:
-            self.d_tag = struct.unpack(self.Sxword, ifile.read(self.SxwordSize))[0]
-            self.val = struct.unpack(self.XWord, ifile.read(self.XWordSize))[0]
-        else:
-            self.d_tag = struct.unpack(self.Sword, ifile.read(self.SwordSize))[0]
-            self.val = struct.unpack(self.Word, ifile.read(self.WordSize))[0]
+            self.Header = struct.Struct(p + 'HHIIIIIHHHHHH')
+            self.SectionHeader = struct.Struct(p + 'IIIIIIIIII')
+            self.DynamicEntry = struct.Struct(p + 'iI')
 
-    def write(self, ofile: T.BinaryIO) -> None:
-        if self.ptrsize == 64:
-            ofile.write(struct.pack(self.Sxword, self.d_tag))
-            ofile.write(struct.pack(self.XWord, self.val))
-        else:
-            ofile.write(struct.pack(self.Sword, self.d_tag))
-            ofile.write(struct.pack(self.Word, self.val))
-
-class SectionHeader(DataSizes):
-    def __init__(self, ifile: T.BinaryIO, ptrsize: int, is_le: bool) -> None:
-        super().__init__(ptrsize, is_le)
-        is_64 = ptrsize == 64
-
-# Elf64_Word
-        self.sh_name = struct.unpack(self.Word, ifile.read(self.WordSize))[0]
-# Elf64_Word
-        self.sh_type = struct.unpack(self.Word, ifile.read(self.WordSize))[0]
-# Elf64_Xword
-        if is_64:
-            self.sh_flags = struct.unpack(self.XWord, ifile.read(self.XWordSize))[0]
-        else:
-            self.sh_flags = struct.unpack(self.Word, ifile.read(self.WordSize))[0]
-# Elf64_Addr
-        self.sh_addr = struct.unpack(self.Addr, ifile.read(self.AddrSize))[0]
-# Elf64_Off
-        self.sh_offset = struct.unpack(self.Off, ifile.read(self.OffSize))[0]
-# Elf64_Xword
-        if is_64:
-            self.sh_size = struct.unpack(self.XWord, ifile.read(self.XWordSize))[0]
-        else:
-            self.sh_size = struct.unpack(self.Word, ifile.read(self.WordSize))[0]
-# Elf64_Word
-        self.sh_link = struct.unpack(self.Word, ifile.read(self.WordSize))[0]
-# Elf64_Word
-        self.sh_info = struct.unpack(self.Word, ifile.read(self.WordSize))[0]
-# Elf64_Xword
-        if is_64:
-            self.sh_addralign = struct.unpack(self.XWord, ifile.read(self.XWordSize))[0]
-        else:
-            self.sh_addralign = struct.unpack(self.Word, ifile.read(self.WordSize))[0]
-# Elf64_Xword
-        if is_64:
-            self.sh_entsize = struct.unpack(self.XWord, ifile.read(self.XWordSize))[0]
-        else:
-            self.sh_entsize = struct.unpack(self.Word, ifile.read(self.WordSize))[0]
+class DynamicEntry:
+    def __init__(self, data: T.Union[bytes, mmap.mmap], offset: int, ds: DataSizes) -> None:
+        self.ds = ds
+        self.d_tag, self.val = ds.DynamicEntry.unpack_from(data, offset)
+
+    def write(self, data: mmap.mmap, offset: int) -> None:
+        self.ds.DynamicEntry.pack_into(data, offset, self.d_tag, self.val)
+
+class SectionHeader:
+    def __init__(self, data: T.Union[bytes, mmap.mmap], offset: int, ds: DataSizes) -> None:
+        (self.sh_name, self.sh_type, self.sh_flags, self.sh_addr, self.sh_offset,
+         self.sh_size, self.sh_link, self.sh_info, self.sh_addralign,
+         self.sh_entsize) = ds.SectionHeader.unpack_from(data, offset)
 
 class Elf(DataSizes):
     def __init__(self, bfile: str, verbose: bool = True) -> None:
         self.bfile = bfile
         self.verbose = verbose
         self.sections: T.List[SectionHeader] = []
+        self.section_names: T.List[bytes] = []
+        self.sections_by_name: T.Dict[bytes, SectionHeader] = {}
         self.dynamic: T.List[DynamicEntry] = []
+        self.data: T.Optional[mmap.mmap] = None
         self.open_bf(bfile)
         try:
             (self.ptrsize, self.is_le) = self.detect_elf_type()
@@ -140,8 +90,14 @@ class Elf(DataSizes):
                 os.chmod(bfile, self.bf_perms)
                 self.bf_perms = None
                 raise e
+        # mmap cannot map empty files, those are not ELF files anyway
+        if os.fstat(self.bf.fileno()).st_size > 0:
+            self.data = mmap.mmap(self.bf.fileno(), 0)
 
     def close_bf(self) -> None:
+        if self.data is not None:
+            self.data.close()
+            self.data = None
         if self.bf is not None:
             if self.bf_perms is not None:
                 os.chmod(self.bf.fileno(), self.bf_perms)
@@ -159,7 +115,7 @@ class Elf(DataSizes):
         self.close_bf()
 
     def detect_elf_type(self) -> T.Tuple[int, bool]:
-        data = self.bf.read(6)
+        data = self.data[:6] if self.data is not None else b''
         if data[1:4] != b'ELF':
             # This script gets called to non-elf targets too
             # so just ignore them.
@@ -181,63 +137,45 @@ class Elf(DataSizes):
         return ptrsize, is_le
 
     def parse_header(self) -> None:
-        self.bf.seek(0)
-        self.e_ident = struct.unpack('16s', self.bf.read(16))[0]
-        self.e_type = struct.unpack(self.Half, self.bf.read(self.HalfSize))[0]
-        self.e_machine = struct.unpack(self.Half, self.bf.read(self.HalfSize))[0]
-        self.e_version = struct.unpack(self.Word, self.bf.read(self.WordSize))[0]
-        self.e_entry = struct.unpack(self.Addr, self.bf.read(self.AddrSize))[0]
-        self.e_phoff = struct.unpack(self.Off, self.bf.read(self.OffSize))[0]
-        self.e_shoff = struct.unpack(self.Off, self.bf.read(self.OffSize))[0]
-        self.e_flags = struct.unpack(self.Word, self.bf.read(self.WordSize))[0]
-        self.e_ehsize = struct.unpack(self.Half, self.bf.read(self.HalfSize))[0]
-        self.e_phentsize = struct.unpack(self.Half, self.bf.read(self.HalfSize))[0]
-        self.e_phnum = struct.unpack(self.Half, self.bf.read(self.HalfSize))[0]
-        self.e_shentsize = struct.unpack(self.Half, self.bf.read(self.HalfSize))[0]
-        self.e_shnum = struct.unpack(self.Half, self.bf.read(self.HalfSize))[0]
-        self.e_shstrndx = struct.unpack(self.Half, self.bf.read(self.HalfSize))[0]
+        self.e_ident = self.data[:16]
+        (self.e_type, self.e_machine, self.e_version, self.e_entry, self.e_phoff,
+         self.e_shoff, self.e_flags, self.e_ehsize, self.e_phentsize, self.e_phnum,
+         self.e_shentsize, self.e_shnum, self.e_shstrndx) = self.Header.unpack_from(self.data, 16)
 
     def parse_sections(self) -> None:
-        self.bf.seek(self.e_shoff)
-        for _ in range(self.e_shnum):
-            self.sections.append(SectionHeader(self.bf, self.ptrsize, self.is_le))
-
-    def read_str(self) -> bytes:
-        arr = []
-        x = self.bf.read(1)
-        while x != b'\0':
-            arr.append(x)
-            x = self.bf.read(1)
-            if x == b'':
-                raise RuntimeError('Tried to read past the end of the file')
-        return b''.join(arr)
+        size = self.SectionHeader.size
+        for i in range(self.e_shnum):
+            self.sections.append(SectionHeader(self.data, self.e_shoff + i * size, self))
+        # Resolve all names once, lookups by name are then a dict access
+        section_names = self.sections[self.e_shstrndx]
+        for section in self.sections:
+            name = self.read_str(section_names.sh_offset + section.sh_name)
+            self.section_names.append(name)
+            self.sections_by_name.setdefault(name, section)
+
+    def read_str(self, offset: int) -> bytes:
+        end = self.data.find(b'\0', offset)
+        if end == -1:
+            raise RuntimeError('Tried to read past the end of the file')
+        return self.data[offset:end]
 
     def find_section(self, target_name: bytes) -> T.Optional[SectionHeader]:
-        section_names = self.sections[self.e_shstrndx]
-        for i in self.sections:
-            self.bf.seek(section_names.sh_offset + i.sh_name)
-            name = self.read_str()
-            if name == target_name:
-                return i
-        return None
+        return self.sections_by_name.get(target_name)
 
     def parse_dynamic(self) -> None:
         sec = self.find_section(b'.dynamic')
         if sec is None:
             return
-        self.bf.seek(sec.sh_offset)
+        offset = sec.sh_offset
         while True:
-            e = DynamicEntry(self.bf, self.ptrsize, self.is_le)
+            e = DynamicEntry(self.data, offset, self)
             self.dynamic.append(e)
+            offset += self.DynamicEntry.size
             if e.d_tag == 0:
                 break
 
-    @generate_list
-    def get_section_names(self) -> T.Generator[str, None, None]:
-        section_names = self.sections[self.e_shstrndx]
-        for i in self.sections:
-            self.bf.seek(section_names.sh_offset + i.sh_name)
-            yield self.read_str().decode()
+    def get_section_names(self) -> T.List[str]:
+        return [n.decode() for n in self.section_names]
 
     def get_soname(self) -> T.Optional[str]:
         soname = None
@@ -249,8 +187,7 @@ class Elf(DataSizes):
                 strtab = i
         if soname is None or strtab is None:
             return None
-        self.bf.seek(strtab.val + soname.val)
-        return self.read_str().decode()
+        return self.read_str(strtab.val + soname.val).decode()
 
     def get_entry_offset(self, entrynum: int) -> T.Optional[int]:
         sec = self.find_section(b'.dynstr')
@@ -265,24 +202,20 @@ class Elf(DataSizes):
         offset = self.get_entry_offset(DT_RPATH)
         if offset is None:
             return None
-        self.bf.seek(offset)
-        return self.read_str().decode()
+        return self.read_str(offset).decode()
 
     def get_runpath(self) -> T.Optional[str]:
         offset = self.get_entry_offset(DT_RUNPATH)
         if offset is None:
             return None
-        self.bf.seek(offset)
-        return self.read_str().decode()
+        return self.read_str(offset).decode()
 
     @generate_list
     def get_deps(self) -> T.Generator[str, None, None]:
         sec = self.find_section(b'.dynstr')
         for i in self.dynamic:
             if i.d_tag == DT_NEEDED:
-                offset = sec.sh_offset + i.val
-                self.bf.seek(offset)
-                yield self.read_str().decode()
+                yield self.read_str(sec.sh_offset + i.val).decode()
 
     def fix_deps(self, prefix: bytes) -> None:
         sec = self.find_section(b'.dynstr')
@@ -292,15 +225,13 @@ class Elf(DataSizes):
                 deps.append(i)
         for i in deps:
             offset = sec.sh_offset + i.val
-            self.bf.seek(offset)
-            name = self.read_str()
+            name = self.read_str(offset)
             if name.startswith(prefix):
                 basename = name.rsplit(b'/', maxsplit=1)[-1]
                 padding = b'\0' * (len(name) - len(basename))
                 newname = basename + padding
                 assert len(newname) == len(name)
-                self.bf.seek(offset)
-                self.bf.write(newname)
+                self.data[offset:offset + len(newname)] = newname
 
     def fix_rpath(self, fname: str, rpath_dirs_to_remove: T.Set[bytes], new_rpath: bytes) -> None:
         # The path to search for can be either rpath or runpath.
@@ -314,9 +245,8 @@ class Elf(DataSizes):
             if self.verbose:
                 print(f'File {fname!r} does not have an rpath. It should be a fully static executable.')
             return
-        self.bf.seek(rp_off)
 
-        old_rpath = self.read_str()
+        old_rpath = self.read_str(rp_off)
         # Some rpath entries may come from multiple sources.
         # Only add each one once.
         new_rpaths: OrderedSet[bytes] = OrderedSet()
@@ -349,9 +279,7 @@ class Elf(DataSizes):
         if not new_rpath:
             self.remove_rpath_entry(entrynum)
         else:
-            self.bf.seek(rp_off)
-            self.bf.write(new_rpath)
-            self.bf.write(b'\0')
+            self.data[rp_off:rp_off + len(new_rpath) + 1] = new_rpath + b'\0'
 
     def remove_rpath_entry(self, entrynum: int) -> None:
         sec = self.find_section(b'.dynamic')
@@ -368,9 +296,8 @@ class Elf(DataSizes):
             if entry.d_tag == DT_MIPS_RLD_MAP_REL:
                 entry.val += 2 * (self.ptrsize // 8)
                 break
-        self.bf.seek(sec.sh_offset)
-        for entry in self.dynamic:
-            entry.write(self.bf)
+        for (i, entry) in enumerate(self.dynamic):
+            entry.write(self.data, sec.sh_offset + i * self.DynamicEntry.size)
         return None
 
 def fix_elf(fname: str, rpath_dirs_to_remove: T.Set[bytes], new_rpath: T.Optional[bytes], verbose: bool = True) -> None:
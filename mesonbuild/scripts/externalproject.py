@@ -11,6 +11,7 @@ from pathlib import Path
 import typing as T
 
 from ..mesonlib import Popen_safe, split_args
+from ..utils.core import find_jobserver, remove_jobserver
 
 class ExternalProject:
     def __init__(self, options: argparse.Namespace):
@@ -39,15 +40,22 @@ class ExternalProject:
         with open(self.stampfile, 'w', encoding='utf-8'):
             pass
 
-    def supports_jobs_flag(self) -> bool:
+    def get_make_flavor(self) -> T.Optional[str]:
         p, o, e = Popen_safe(self.make + ['--version'])
-        if p.returncode == 0 and ('GNU Make' in o or 'waf' in o):
-            return True
-        return False
+        if p.returncode == 0:
+            for flavor in ('GNU Make', 'waf'):
+                if flavor in o:
+                    return flavor
+        return None
 
     def build(self) -> int:
         make_cmd = self.make.copy()
-        if self.supports_jobs_flag():
+        flavor = self.get_make_flavor()
+        if flavor == 'GNU Make' and find_jobserver(os.environ) is not None:
+            # make takes its jobs from the jobserver in MAKEFLAGS, passing -j
+            # would make it start a jobserver of its own next to it.
+            pass
+        elif flavor is not None:
             make_cmd.append(f'-j{multiprocessing.cpu_count()}')
         rc = self._run('build', make_cmd)
         if rc != 0:
@@ -79,6 +87,8 @@ class ExternalProject:
         run_env = os.environ.copy()
         if env:
             run_env.update(env)
+        if find_jobserver(run_env) is None:
+            remove_jobserver(run_env)
         p, o, e = Popen_safe(command, stderr=subprocess.STDOUT, stdout=output,
                              cwd=self.build_dir,
                              env=run_env)
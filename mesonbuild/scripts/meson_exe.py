@@ -11,13 +11,14 @@ import subprocess
 import typing as T
 import locale
 
-from ..utils.core import ExecutableSerialisation
+from ..utils.core import ExecutableSerialisation, find_jobserver, remove_jobserver
 
 def buildparser() -> argparse.ArgumentParser:
     parser = argparse.ArgumentParser(description='Custom executable wrapper for Meson. Do not run on your own, mmm\'kay?')
     parser.add_argument('--unpickle')
     parser.add_argument('--capture')
     parser.add_argument('--feed')
+    parser.add_argument('--jobserver', action='store_true')
     return parser
 
 def run_exe(exe: ExecutableSerialisation, extra_env: T.Optional[T.Dict[str, str]] = None) -> int:
@@ -43,6 +44,11 @@ def run_exe(exe: ExecutableSerialisation, extra_env: T.Optional[T.Dict[str, str]
                 ['Z:' + p for p in exe.extra_paths] + child_env.get('WINEPATH', '').split(';'),
                 exe.workdir
             )
+    if exe.jobserver and find_jobserver(child_env) is None:
+        # The jobserver file descriptors are inherited with close_fds=False
+        # below; drop a jobserver that did not make it to this process so that
+        # the command does not complain about it.
+        remove_jobserver(child_env)
 
     stdin = None
     if exe.feed:
@@ -101,13 +107,14 @@ def run(args: T.List[str]) -> int:
     if not options.unpickle and not cmd_args:
         parser.error('either --unpickle or executable and arguments are required')
     if options.unpickle:
-        if cmd_args or options.capture or options.feed:
+        if cmd_args or options.capture or options.feed or options.jobserver:
             parser.error('no other arguments can be used with --unpickle')
         with open(options.unpickle, 'rb') as f:
             exe = pickle.load(f)
             exe.pickled = True
     else:
-        exe = ExecutableSerialisation(cmd_args, capture=options.capture, feed=options.feed)
+        exe = ExecutableSerialisation(cmd_args, capture=options.capture, feed=options.feed,
+                                      jobserver=options.jobserver)
 
     return run_exe(exe)
 
@@ -0,0 +1,420 @@
+# SPDX-License-Identifier: Apache-2.0
+# Copyright 2024 The Meson development team
+
+"""A compiler launcher that caches object files, for hosts without ccache.
+
+With `backend_object_cache=true` the Ninja backend runs C and C++ compiles
+through `meson --internal objcache COMPILER ARGS...`. The cache works like
+the depend mode of ccache: it never runs the preprocessor itself, but
+looks at the header dependencies the compiler writes anyway.
+
+A compile is identified by the compiler executable, its arguments, the
+environment variables that influence it and the contents of the source
+file. For each such key a manifest records the headers the source included
+and their contents, along with the result those inputs produced. When all
+headers of an entry are unchanged, the object file, the depfile and the
+diagnostics are restored from the cache instead of compiling.
+
+Results are stored in 16 buckets, each with its own size counter and lock,
+and the least recently used entries of a bucket are evicted when it grows
+over its share of MESON_OBJECT_CACHE_MAX_SIZE.
+"""
+
+from __future__ import annotations
+
+import contextlib
+import hashlib
+import json
+import os
+import shlex
+import shutil
+import struct
+import subprocess
+import sys
+import tempfile
+import typing as T
+
+from .. import depfile as depfile_parser
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+ENV_DIR = 'MESON_OBJECT_CACHE_DIR'
+ENV_MAX_SIZE = 'MESON_OBJECT_CACHE_MAX_SIZE'
+
+DEFAULT_MAX_SIZE = 5 * 1024 ** 3
+BUCKETS = '0123456789abcdef'
+# Evict down to this fraction of the limit, so that not every store evicts
+PRUNE_TARGET = 0.9
+MANIFEST_ENTRIES = 8
+STATS_FNAME = os.path.join('meson-private', 'objcache-stats.log')
+
+# Bump when the key or the format of the entries changes
+_VERSION = b'meson-objcache-1'
+_MAGIC = b'MOC1'
+_SIZE = struct.Struct('<Q')
+_SIZE_SUFFIXES = {'k': 1024, 'm': 1024 ** 2, 'g': 1024 ** 3, 't': 1024 ** 4}
+
+# These make the compiler read or write files that the depfile does not
+# list, so their results cannot be cached.
+_UNCACHEABLE_ARGS = {
+    '--coverage', '-ftest-coverage', '-fprofile-arcs', '-fprofile-use',
+    '-fauto-profile', '-save-temps', '-gsplit-dwarf', '-ftime-trace',
+    '-include-pch', '-fpch-preprocess', '-fmodules', '-E', '-S', '-M', '-MM',
+}
+_UNCACHEABLE_PREFIXES = ('-fprofile-use=', '-fprofile-instr-use', '-fauto-profile=',
+                         '-save-temps=', '-fdump-', '-fmodule-', '-fmodules-')
+_ENV_VARS = ('CPATH', 'C_INCLUDE_PATH', 'CPLUS_INCLUDE_PATH', 'OBJC_INCLUDE_PATH',
+             'COMPILER_PATH', 'GCC_EXEC_PREFIX', 'SOURCE_DATE_EPOCH', 'LANG', 'LC_ALL',
+             'LC_MESSAGES')
+# Results depending on these are never stored
+_VOLATILE_MACROS = (b'__DATE__', b'__TIME__', b'__TIMESTAMP__')
+
+
+def default_dir() -> str:
+    if sys.platform == 'win32':
+        base = os.environ.get('LOCALAPPDATA') or os.path.expanduser(os.path.join('~', 'AppData', 'Local'))
+    else:
+        base = os.environ.get('XDG_CACHE_HOME') or os.path.expanduser(os.path.join('~', '.cache'))
+    return os.path.join(base, 'meson', 'objcache')
+
+
+def parse_size(value: str) -> int:
+    v = value.strip().lower().rstrip('b')
+    multiplier = 1
+    if v and v[-1] in _SIZE_SUFFIXES:
+        multiplier = _SIZE_SUFFIXES[v[-1]]
+        v = v[:-1]
+    try:
+        return int(float(v) * multiplier)
+    except ValueError:
+        raise ValueError(f'Invalid {ENV_MAX_SIZE} value {value!r}, expected a size like "10G"')
+
+
+class Compile:
+
+    '''What the cache needs to know about a compile command.'''
+
+    def __init__(self, command: T.List[str]) -> None:
+        self.command = command
+        self.args = self._expand_rspfiles(command[1:])
+        self.output: T.Optional[str] = None
+        self.depfile: T.Optional[str] = None
+        self.source: T.Optional[str] = None
+        self.cacheable = True
+        self.debug = False
+        compile_only = False
+        args = iter(self.args)
+        for a in args:
+            if a == '-o':
+                self.output = next(args, None)
+            elif a == '-MF':
+                self.depfile = next(args, None)
+            elif a == '-c':
+                compile_only = True
+            elif a in _UNCACHEABLE_ARGS or a.startswith(_UNCACHEABLE_PREFIXES):
+                self.cacheable = False
+            elif a.startswith('-g') and a != '-g0':
+                self.debug = True
+        # The compile rule puts the source last
+        if self.args and not self.args[-1].startswith('-'):
+            self.source = self.args[-1]
+        if not (compile_only and self.output and self.depfile and self.source):
+            self.cacheable = False
+
+    @staticmethod
+    def _expand_rspfiles(args: T.List[str]) -> T.List[str]:
+        result: T.List[str] = []
+        for a in args:
+            if a.startswith('@') and os.path.isfile(a[1:]):
+                with open(a[1:], encoding='utf-8') as f:
+                    result += shlex.split(f.read())
+            else:
+                result.append(a)
+        return result
+
+    def key(self) -> str:
+        '''The key of the manifest, which covers everything but the headers.'''
+        assert self.source is not None
+        h = hashlib.sha256(_VERSION)
+        compiler = shutil.which(self.command[0]) or self.command[0]
+        st = os.stat(compiler)
+        h.update(f'{os.path.abspath(compiler)}\0{st.st_size}\0{st.st_mtime_ns}\0'.encode())
+        for a in self.args:
+            h.update(a.encode('utf-8', errors='surrogateescape') + b'\0')
+        for var in _ENV_VARS:
+            h.update(f'{var}={os.environ.get(var)}\0'.encode('utf-8', errors='surrogateescape'))
+        if self.debug:
+            # The working directory ends up in the debug information
+            h.update(os.getcwd().encode('utf-8', errors='surrogateescape'))
+        with open(self.source, 'rb') as f:
+            h.update(f.read())
+        return h.hexdigest()
+
+
+class ObjectCache:
+
+    def __init__(self, root: str, max_size: int = DEFAULT_MAX_SIZE) -> None:
+        self.root = root
+        self.max_size = max_size
+        self._file_hashes: T.Dict[str, T.Optional[str]] = {}
+
+    @classmethod
+    def from_env(cls) -> T.Optional[ObjectCache]:
+        '''The cache as configured by the environment.
+
+        Setting MESON_OBJECT_CACHE_DIR to an empty string disables it.
+        '''
+        root = os.environ.get(ENV_DIR)
+        if root is None:
+            root = default_dir()
+        elif not root:
+            return None
+        max_size = DEFAULT_MAX_SIZE
+        if os.environ.get(ENV_MAX_SIZE):
+            max_size = parse_size(os.environ[ENV_MAX_SIZE])
+        return cls(os.path.abspath(root), max_size)
+
+    def _path(self, key: str, suffix: str) -> str:
+        return os.path.join(self.root, key[0], key[1:3], key + suffix)
+
+    def hash_file(self, path: str) -> T.Optional[str]:
+        '''The hash of the contents of @path, or None if it cannot be read
+        or uses a macro that changes from one compile to the next.
+        '''
+        if path not in self._file_hashes:
+            try:
+                with open(path, 'rb') as f:
+                    data = f.read()
+            except OSError:
+                self._file_hashes[path] = None
+            else:
+                volatile = any(m in data for m in _VOLATILE_MACROS)
+                self._file_hashes[path] = None if volatile else hashlib.sha256(data).hexdigest()
+        return self._file_hashes[path]
+
+    def lookup(self, key: str) -> T.Optional[T.Tuple[bytes, bytes, bytes]]:
+        try:
+            with open(self._path(key, '.manifest'), encoding='utf-8') as f:
+                manifest = json.load(f)
+        except (OSError, ValueError):
+            return None
+        for entry in manifest:
+            if all(self.hash_file(p) == h for p, h in entry['files'].items()):
+                path = self._path(entry['result'], '.result')
+                try:
+                    with open(path, 'rb') as f:
+                        data = f.read()
+                    os.utime(path)
+                except OSError:
+                    continue
+                result = self._unpack(data)
+                if result is not None:
+                    return result
+        return None
+
+    @staticmethod
+    def _unpack(data: bytes) -> T.Optional[T.Tuple[bytes, bytes, bytes]]:
+        if not data.startswith(_MAGIC):
+            return None
+        blobs: T.List[bytes] = []
+        offset = len(_MAGIC)
+        for _ in range(3):
+            if offset + _SIZE.size > len(data):
+                return None
+            size, = _SIZE.unpack_from(data, offset)
+            offset += _SIZE.size
+            blobs.append(data[offset:offset + size])
+            offset += size
+        return blobs[0], blobs[1], blobs[2]
+
+    def _write(self, path: str, data: bytes) -> int:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(data)
+            os.replace(tmp, path)
+        except BaseException:
+            with contextlib.suppress(OSError):
+                os.unlink(tmp)
+            raise
+        return len(data)
+
+    def store(self, key: str, files: T.Dict[str, str], obj: bytes, depfile: bytes, stderr: bytes) -> None:
+        rh = hashlib.sha256(key.encode())
+        for p in sorted(files):
+            rh.update(f'{p}\0{files[p]}\0'.encode('utf-8', errors='surrogateescape'))
+        result = rh.hexdigest()
+        data = _MAGIC + b''.join(_SIZE.pack(len(b)) + b for b in (obj, depfile, stderr))
+        self._account(result[0], self._write(self._path(result, '.result'), data))
+
+        manifest_path = self._path(key, '.manifest')
+        try:
+            with open(manifest_path, encoding='utf-8') as f:
+                manifest = [e for e in json.load(f) if e['files'] != files]
+            old_size = os.stat(manifest_path).st_size
+        except (OSError, ValueError):
+            manifest, old_size = [], 0
+        manifest = [{'files': files, 'result': result}] + manifest[:MANIFEST_ENTRIES - 1]
+        self._account(key[0], self._write(manifest_path, json.dumps(manifest).encode('utf-8')) - old_size)
+
+    @contextlib.contextmanager
+    def _locked(self, bucket: str) -> T.Iterator[None]:
+        '''Lock @bucket. Without fcntl (i.e. on Windows) there is no
+        locking, and the size counters can drift.
+        '''
+        if fcntl is None:
+            yield
+            return
+        os.makedirs(os.path.join(self.root, bucket), exist_ok=True)
+        with open(os.path.join(self.root, bucket, 'lock'), 'a', encoding='utf-8') as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+    def _account(self, bucket: str, added: int) -> None:
+        limit = self.max_size // len(BUCKETS)
+        size_file = os.path.join(self.root, bucket, 'size')
+        with self._locked(bucket):
+            try:
+                with open(size_file, encoding='utf-8') as f:
+                    size = int(f.read())
+            except (OSError, ValueError):
+                size = self._bucket_size(bucket)
+                added = 0
+            size += added
+            if size > limit:
+                size = self._prune(bucket, int(limit * PRUNE_TARGET))
+            with open(size_file, 'w', encoding='utf-8') as f:
+                f.write(str(size))
+
+    def _entries(self, bucket: str) -> T.List[T.Tuple[float, int, str]]:
+        entries: T.List[T.Tuple[float, int, str]] = []
+        top = os.path.join(self.root, bucket)
+        for d in os.listdir(top):
+            subdir = os.path.join(top, d)
+            if not os.path.isdir(subdir):
+                continue
+            for f in os.listdir(subdir):
+                with contextlib.suppress(OSError):
+                    st = os.stat(os.path.join(subdir, f))
+                    entries.append((st.st_mtime, st.st_size, os.path.join(subdir, f)))
+        return entries
+
+    def _bucket_size(self, bucket: str) -> int:
+        return sum(size for _, size, _ in self._entries(bucket))
+
+    def _prune(self, bucket: str, target: int) -> int:
+        '''Evict the least recently used entries of @bucket until it is no
+        larger than @target, returning its new size.
+        '''
+        entries = sorted(self._entries(bucket))
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in entries:
+            if total <= target:
+                break
+            with contextlib.suppress(OSError):
+                os.unlink(path)
+                total -= size
+        return total
+
+
+def record(event: str) -> None:
+    '''Count a cache event for `meson compile --stats`. Compiles run in the
+    build directory, and short appends are atomic.
+    '''
+    with contextlib.suppress(OSError):
+        fd = os.open(STATS_FNAME, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        try:
+            os.write(fd, event.encode() + b'\n')
+        finally:
+            os.close(fd)
+
+
+def read_stats(build_dir: str) -> T.Dict[str, int]:
+    stats: T.Dict[str, int] = {}
+    with contextlib.suppress(OSError):
+        with open(os.path.join(build_dir, STATS_FNAME), encoding='utf-8') as f:
+            for line in f:
+                event = line.strip()
+                if event:
+                    stats[event] = stats.get(event, 0) + 1
+    return stats
+
+
+def _restore(cmd: Compile, result: T.Tuple[bytes, bytes, bytes]) -> None:
+    assert cmd.output is not None and cmd.depfile is not None
+    obj, depfile, stderr = result
+    for path, data in ((cmd.output, obj), (cmd.depfile, depfile)):
+        tmp = path + '.tmp'
+        with open(tmp, 'wb') as f:
+            f.write(data)
+        os.replace(tmp, path)
+    if stderr:
+        sys.stderr.buffer.write(stderr)
+        sys.stderr.flush()
+
+
+def run(args: T.List[str]) -> int:
+    if args and args[0] == '--':
+        args = args[1:]
+    cmd = Compile(args)
+    cache: T.Optional[ObjectCache] = None
+    key: T.Optional[str] = None
+    if cmd.cacheable:
+        try:
+            cache = ObjectCache.from_env()
+            key = cmd.key() if cache is not None else None
+        except (ValueError, OSError) as e:
+            print(f'objcache: {e}', file=sys.stderr)
+    if cache is None or key is None:
+        record('uncacheable')
+        return subprocess.call(args)
+
+    result = cache.lookup(key)
+    if result is not None:
+        try:
+            _restore(cmd, result)
+        except OSError:
+            pass
+        else:
+            record('hit')
+            return 0
+
+    p = subprocess.run(args, stderr=subprocess.PIPE)
+    if p.stderr:
+        sys.stderr.buffer.write(p.stderr)
+        sys.stderr.flush()
+    if p.returncode != 0:
+        record('miss')
+        return p.returncode
+
+    assert cmd.output is not None and cmd.depfile is not None
+    try:
+        with open(cmd.depfile, 'rb') as f:
+            depfile = f.read()
+        files: T.Dict[str, str] = {}
+        lines = depfile.decode('utf-8', errors='surrogateescape').splitlines(keepends=True)
+        for dep in (d for _, deps in depfile_parser.parse(lines) for d in deps):
+            h = cache.hash_file(dep)
+            if h is None:
+                record('uncacheable')
+                return 0
+            files[dep] = h
+        with open(cmd.output, 'rb') as f:
+            obj = f.read()
+        cache.store(key, files, obj, depfile, p.stderr)
+    except OSError:
+        # A read-only or full cache must not break the build
+        pass
+    record('miss')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(run(sys.argv[1:]))
@@ -12,9 +12,13 @@ from __future__ import annotations
 
 import typing as T
 import os, sys
+import locale
+import mmap
+import struct
 from .. import mesonlib
 from .. import mlog
 from ..mesonlib import Popen_safe
+from .depfixer import DataSizes, SectionHeader
 import argparse
 
 parser = argparse.ArgumentParser()
@@ -86,7 +90,230 @@ def call_tool_nowarn(tool: T.List[str], **kwargs: T.Any) -> T.Tuple[str, str]:
         return None, e
     return output, None
 
+SHT_DYNAMIC = 6
+SHT_NOBITS = 8
+SHT_DYNSYM = 11
+SHT_GNU_VERDEF = 0x6ffffffd
+SHT_GNU_VERSYM = 0x6fffffff
+SHF_WRITE = 0x1
+SHF_ALLOC = 0x2
+SHF_EXECINSTR = 0x4
+SHN_UNDEF = 0
+SHN_LORESERVE = 0xff00
+SHN_ABS = 0xfff1
+STB_GLOBAL = 1
+STB_WEAK = 2
+STB_GNU_UNIQUE = 10
+STT_OBJECT = 1
+STT_FUNC = 2
+STT_SECTION = 3
+STT_FILE = 4
+STT_GNU_IFUNC = 10
+DT_NULL = 0
+DT_SONAME = 14
+VER_FLG_BASE = 0x1
+VERSYM_HIDDEN = 0x8000
+VERSYM_VERSION = 0x7fff
+
+# Sections that nm classifies differently from their ELF flags: small data
+# sections on some architectures and PE sections.
+SPECIAL_SECTIONS = (b'.sdata', b'.sbss', b'.srodata', b'.lit4', b'.lit8', b'.scommon',
+                    b'.drectve', b'.edata', b'.idata', b'.pdata')
+
+class UnsupportedElf(Exception):
+    pass
+
+class ElfSymbolReader:
+    '''Reads the SONAME and the exported symbols of an ELF shared library.
+
+    The result is what gnu_syms() extracts from the output of GNU `readelf -d`
+    and `nm --dynamic --extern-only --defined-only --format=posix`, so that
+    switching between the two does not cause spurious relinks. Anything that
+    binutils might print differently raises UnsupportedElf.
+    '''
+
+    def __init__(self, data: T.Union[bytes, mmap.mmap]):
+        self.data = data
+        if data[:4] != b'\x7fELF' or data[4] not in {1, 2} or data[5] not in {1, 2}:
+            raise UnsupportedElf('not an ELF file')
+        self.is_64 = data[4] == 2
+        p = '<' if data[5] == 1 else '>'
+        self.ds = DataSizes(64 if self.is_64 else 32, data[5] == 1)
+        if self.is_64:
+            self.Sym = struct.Struct(p + 'IBBHQQ')
+        else:
+            self.Sym = struct.Struct(p + 'IIIBBH')
+        self.Verdef = struct.Struct(p + 'HHHHIII')
+        self.Verdaux = struct.Struct(p + 'II')
+        self.Half = struct.Struct(p + 'H')
+        header = self.ds.Header.unpack_from(data, 16)
+        e_shoff, e_shnum, e_shstrndx = header[5], header[11], header[12]
+        if e_shoff == 0 or e_shnum == 0 or e_shstrndx >= e_shnum:
+            raise UnsupportedElf('no section headers')
+        size = self.ds.SectionHeader.size
+        self.sections = [SectionHeader(data, e_shoff + i * size, self.ds) for i in range(e_shnum)]
+        shstrtab = self.sections[e_shstrndx]
+        self.section_names = [self.read_str(shstrtab, s.sh_name) for s in self.sections]
+
+    def read_str(self, strtab: SectionHeader, offset: int) -> bytes:
+        if offset >= strtab.sh_size:
+            raise UnsupportedElf('string offset out of bounds')
+        start = strtab.sh_offset + offset
+        end = self.data.find(b'\0', start, strtab.sh_offset + strtab.sh_size)
+        if end == -1:
+            raise UnsupportedElf('unterminated string')
+        return self.data[start:end]
+
+    def find_section(self, sh_type: int) -> T.Optional[SectionHeader]:
+        for s in self.sections:
+            if s.sh_type == sh_type:
+                return s
+        return None
+
+    def soname_line(self) -> T.Optional[str]:
+        dynamic = self.find_section(SHT_DYNAMIC)
+        if dynamic is None:
+            return None
+        strtab = self.sections[dynamic.sh_link]
+        size = self.ds.DynamicEntry.size
+        for offset in range(dynamic.sh_offset, dynamic.sh_offset + dynamic.sh_size, size):
+            d_tag, val = self.ds.DynamicEntry.unpack_from(self.data, offset)
+            if d_tag == DT_NULL:
+                break
+            if d_tag == DT_SONAME:
+                # Same layout as readelf
+                name = self.read_str(strtab, val).decode()
+                if self.is_64:
+                    return f' 0x{d_tag:016x} (SONAME){" " * 13}Library soname: [{name}]'
+                return f' 0x{d_tag:08x} (SONAME){" " * 21}Library soname: [{name}]'
+        return None
+
+    def version_names(self) -> T.Tuple[T.Dict[int, T.Tuple[int, bytes]], int]:
+        verdef = self.find_section(SHT_GNU_VERDEF)
+        if verdef is None:
+            return {}, 0
+        strtab = self.sections[verdef.sh_link]
+        result: T.Dict[int, T.Tuple[int, bytes]] = {}
+        offset = verdef.sh_offset
+        while True:
+            _, vd_flags, vd_ndx, vd_cnt, _, vd_aux, vd_next = self.Verdef.unpack_from(self.data, offset)
+            if vd_cnt:
+                vda_name, _ = self.Verdaux.unpack_from(self.data, offset + vd_aux)
+                result[vd_ndx & VERSYM_VERSION] = (vd_flags, self.read_str(strtab, vda_name))
+            if vd_next == 0:
+                break
+            offset += vd_next
+        return result, max(result, default=0)
+
+    def symbol_type(self, info: int, shndx: int) -> str:
+        bind, typ = info >> 4, info & 0xf
+        if typ == STT_GNU_IFUNC:
+            return 'i'
+        if bind == STB_WEAK:
+            return 'V' if typ == STT_OBJECT else 'W'
+        if bind == STB_GNU_UNIQUE:
+            return 'u'
+        if shndx == SHN_ABS:
+            return 'A'
+        if shndx >= SHN_LORESERVE or shndx >= len(self.sections):
+            raise UnsupportedElf('special section index')
+        sec = self.sections[shndx]
+        if self.section_names[shndx].startswith(SPECIAL_SECTIONS):
+            raise UnsupportedElf('section with a special symbol class')
+        if sec.sh_flags & SHF_EXECINSTR:
+            return 'T'
+        if sec.sh_type == SHT_NOBITS:
+            return 'B'
+        if not sec.sh_flags & SHF_ALLOC:
+            if sec.sh_flags & SHF_WRITE:
+                raise UnsupportedElf('symbol in a writable non-allocated section')
+            return 'N'
+        return 'D' if sec.sh_flags & SHF_WRITE else 'R'
+
+    def exports(self) -> T.List[str]:
+        dynsym = self.find_section(SHT_DYNSYM)
+        if dynsym is None:
+            return []
+        strtab = self.sections[dynsym.sh_link]
+        strings = self.data[strtab.sh_offset:strtab.sh_offset + strtab.sh_size]
+        count = dynsym.sh_size // self.Sym.size
+        syms = self.Sym.iter_unpack(self.data[dynsym.sh_offset:dynsym.sh_offset + count * self.Sym.size])
+        versym = self.find_section(SHT_GNU_VERSYM)
+        versions: T.Sequence[int] = ()
+        if versym is not None:
+            versions = struct.unpack_from(f'{self.Half.format[0]}{count}H', self.data, versym.sh_offset)
+        verdefs, max_verdef = self.version_names()
+        types: T.Dict[T.Tuple[int, int], str] = {}
+        symbols: T.List[T.Tuple[str, str]] = []
+        for i, fields in enumerate(syms):
+            if self.is_64:
+                st_name, st_info, _, st_shndx, _, st_size = fields
+            else:
+                st_name, _, st_size, st_info, _, st_shndx = fields
+            bind, typ = st_info >> 4, st_info & 0xf
+            if i == 0 or bind not in {STB_GLOBAL, STB_WEAK, STB_GNU_UNIQUE} or st_shndx == SHN_UNDEF:
+                continue
+            if typ in {STT_SECTION, STT_FILE}:
+                continue
+            base_name = strings[st_name:strings.index(b'\0', st_name)].decode('ascii')
+            name = base_name
+            if versions:
+                vs = versions[i]
+                vernum = vs & VERSYM_VERSION
+                if vernum == 0 or (vernum == 1 and (max_verdef == 0 or verdefs[1][0] & VER_FLG_BASE)):
+                    pass
+                elif vernum in verdefs:
+                    nodename = verdefs[vernum][1].decode('ascii')
+                    if nodename != name:
+                        name += ('@' if vs & VERSYM_HIDDEN else '@@') + nodename
+                else:
+                    raise UnsupportedElf('defined symbol with a needed version')
+            symtype = types.get((st_info, st_shndx))
+            if symtype is None:
+                symtype = types[(st_info, st_shndx)] = self.symbol_type(st_info, st_shndx)
+            # See gnu_syms()
+            if symtype in {'B', 'D'} and st_size:
+                symbols.append((base_name, f'{name} {symtype} {st_size:x}'))
+            else:
+                symbols.append((base_name, f'{name} {symtype}'))
+        # nm sorts by name, without the version, according to the collation
+        # of the locale. Its sort is stable, so versions of the same symbol
+        # stay in symbol table order.
+        try:
+            collation = locale.setlocale(locale.LC_COLLATE, '')
+        except locale.Error:
+            collation = locale.setlocale(locale.LC_COLLATE)
+        if collation in {'C', 'POSIX'}:
+            symbols.sort(key=lambda s: s[0])
+        else:
+            symbols.sort(key=lambda s: locale.strxfrm(s[0]))
+        return [s[1] for s in symbols]
+
+def elf_syms(libfilename: str) -> T.Optional[T.List[str]]:
+    '''The lines gnu_syms() would write, an empty list if it would use
+    dummy_syms(), or None if the library has to be inspected with the tools.'''
+    try:
+        with open(libfilename, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            reader = ElfSymbolReader(data)
+            soname = reader.soname_line()
+            exports = reader.exports()
+            if not exports:
+                # nm fails when there are no symbols
+                return []
+            return ([soname] if soname else []) + exports
+    except (OSError, ValueError, KeyError, IndexError, UnicodeError, struct.error, UnsupportedElf):
+        return None
+
 def gnu_syms(libfilename: str, outfilename: str) -> None:
+    # Read the library directly unless other tools were requested
+    if 'READELF' not in os.environ and 'NM' not in os.environ:
+        result = elf_syms(libfilename)
+        if result == []:
+            dummy_syms(outfilename)
+            return
+        elif result is not None:
+            write_if_changed('\n'.join(result) + '\n', outfilename)
+            return
     # Get the name of the library
     output = call_tool('readelf', ['-d', libfilename])
     if not output:
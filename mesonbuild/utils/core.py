@@ -13,6 +13,7 @@ from __future__ import annotations
 from dataclasses import dataclass
 import os
 import abc
+import stat
 import typing as T
 
 if T.TYPE_CHECKING:
@@ -150,6 +151,51 @@ class EnvironmentVariables(HoldableObject):
         return env
 
 
+_JOBSERVER_FLAGS = ('--jobserver-auth=', '--jobserver-fds=')
+
+def find_jobserver(env: EnvironOrDict) -> T.Optional[str]:
+    '''Return the GNU make jobserver passed down in MAKEFLAGS, if any.
+
+    This is the value of --jobserver-auth, either a pair of file
+    descriptors "R,W", a fifo "fifo:PATH" or a semaphore name on Windows.
+    None is returned when there is no jobserver, or when its file descriptors
+    were not inherited by this process because make did not consider the
+    command a recursive make invocation.
+    '''
+    auth: T.Optional[str] = None
+    for flag in env.get('MAKEFLAGS', '').split():
+        for prefix in _JOBSERVER_FLAGS:
+            if flag.startswith(prefix):
+                # make appends the current jobserver, the last one wins
+                auth = flag[len(prefix):]
+    if auth is None:
+        return None
+    if auth.startswith('fifo:'):
+        return auth if os.path.exists(auth[len('fifo:'):]) else None
+    try:
+        fds = [int(fd) for fd in auth.split(',')]
+    except ValueError:
+        return auth
+    for fd in fds:
+        try:
+            if not stat.S_ISFIFO(os.fstat(fd).st_mode):
+                return None
+        except OSError:
+            return None
+    return auth
+
+def remove_jobserver(env: T.Dict[str, str]) -> None:
+    '''Remove the jobserver, and the job count that goes with it, from
+    MAKEFLAGS so that a child make neither warns about it nor starts
+    parallel jobs of its own.
+    '''
+    if not any(f.startswith(_JOBSERVER_FLAGS) for f in env.get('MAKEFLAGS', '').split()):
+        return
+    flags = [f for f in env['MAKEFLAGS'].split(' ')
+             if not f.startswith(_JOBSERVER_FLAGS) and not (f == '-j' or f.startswith('-j') and f[2:].isdigit())]
+    env['MAKEFLAGS'] = ' '.join(flags)
+
+
 @dataclass(eq=False)
 class ExecutableSerialisation:
 
@@ -163,6 +209,7 @@ class ExecutableSerialisation:
     tag: T.Optional[str] = None
     verbose: bool = False
     installdir_map: T.Optional[T.Dict[str, str]] = None
+    jobserver: bool = False
 
     def __post_init__(self) -> None:
         self.pickled = False
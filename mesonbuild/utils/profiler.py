@@ -0,0 +1,155 @@
+# SPDX-License-Identifier: Apache-2.0
+# Copyright 2024 The Meson development team
+
+"""Wall clock profiling of `meson setup`.
+
+Spans are recorded for build files, interpreter functions and methods,
+spawned processes and backend phases. At the end of configure they are
+written out as a Chrome trace (loadable in chrome://tracing or Perfetto)
+and as a plain text summary sorted by self time.
+"""
+
+from __future__ import annotations
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+import json
+import os
+import threading
+import time
+import typing as T
+
+TRACE_FNAME = 'profile-configure.json'
+SUMMARY_FNAME = 'profile-configure.txt'
+
+
+@dataclass
+class _Span:
+
+    category: str
+    name: str
+    start: float
+    end: float = 0.0
+    child_time: float = 0.0
+    args: T.Dict[str, str] = field(default_factory=dict)
+    tid: int = 0
+
+
+@dataclass
+class _Stats:
+
+    count: int = 0
+    total: float = 0.0
+    self_time: float = 0.0
+
+
+class _Profiler:
+
+    def __init__(self) -> None:
+        self.enabled = False
+        self.start_time = 0.0
+        self.spans: T.List[_Span] = []
+        self._local = threading.local()
+        self._lock = threading.Lock()
+
+    def enable(self) -> None:
+        self.enabled = True
+        self.start_time = time.perf_counter()
+        self.spans = []
+
+    def _stack(self) -> T.List[_Span]:
+        try:
+            return self._local.stack
+        except AttributeError:
+            self._local.stack = []
+            return self._local.stack
+
+    @contextmanager
+    def _record(self, category: str, name: str, args: T.Dict[str, str]) -> T.Iterator[None]:
+        stack = self._stack()
+        span = _Span(category, name, time.perf_counter(), args=args, tid=threading.get_ident())
+        stack.append(span)
+        try:
+            yield
+        finally:
+            span.end = time.perf_counter()
+            stack.pop()
+            if stack:
+                stack[-1].child_time += span.end - span.start
+            with self._lock:
+                self.spans.append(span)
+
+    def span(self, category: str, name: str, **args: str) -> T.ContextManager[None]:
+        if not self.enabled:
+            return _NULL_CONTEXT
+        return self._record(category, name, args)
+
+    def stats(self) -> T.Dict[T.Tuple[str, str], _Stats]:
+        result: T.Dict[T.Tuple[str, str], _Stats] = {}
+        for s in self.spans:
+            st = result.setdefault((s.category, s.name), _Stats())
+            st.count += 1
+            st.total += s.end - s.start
+            st.self_time += s.end - s.start - s.child_time
+        return result
+
+    def write_trace(self, fname: str) -> None:
+        pid = os.getpid()
+        events: T.List[T.Dict[str, T.Any]] = []
+        for s in sorted(self.spans, key=lambda s: (s.start, -s.end)):
+            event: T.Dict[str, T.Any] = {
+                'name': s.name,
+                'cat': s.category,
+                'ph': 'X',
+                'ts': round((s.start - self.start_time) * 1e6, 3),
+                'dur': round((s.end - s.start) * 1e6, 3),
+                'pid': pid,
+                'tid': s.tid,
+            }
+            if s.args:
+                event['args'] = s.args
+            events.append(event)
+        with open(fname, 'w', encoding='utf-8') as f:
+            json.dump({'traceEvents': events, 'displayTimeUnit': 'ms'}, f)
+
+    def write_summary(self, fname: str) -> None:
+        stats = self.stats()
+        wall = time.perf_counter() - self.start_time
+        with open(fname, 'w', encoding='utf-8') as f:
+            f.write(f'Total configure time: {wall:.3f}s\n\n')
+            categories = sorted({c for c, _ in stats})
+            for cat in categories:
+                entries = sorted(((n, s) for (c, n), s in stats.items() if c == cat),
+                                 key=lambda x: (-x[1].self_time, x[0]))
+                f.write(f'{cat}:\n')
+                f.write(f'  {"self (s)":>10} {"total (s)":>10} {"calls":>7}  name\n')
+                for name, s in entries:
+                    f.write(f'  {s.self_time:10.3f} {s.total:10.3f} {s.count:7}  {name}\n')
+                f.write('\n')
+
+    def write(self, log_dir: str) -> T.Tuple[str, str]:
+        trace = os.path.join(log_dir, TRACE_FNAME)
+        summary = os.path.join(log_dir, SUMMARY_FNAME)
+        self.write_trace(trace)
+        self.write_summary(summary)
+        return trace, summary
+
+
+class _NullContext:
+
+    def __enter__(self) -> None:
+        return None
+
+    def __exit__(self, *args: object) -> None:
+        return None
+
+
+_NULL_CONTEXT = _NullContext()
+
+_profiler = _Profiler()
+enable = _profiler.enable
+span = _profiler.span
+write = _profiler.write
+
+
+def is_enabled() -> bool:
+    return _profiler.enabled
@@ -22,9 +22,11 @@ import typing as T
 import textwrap
 import pickle
 import errno
+import hashlib
 import json
 
 from mesonbuild import mlog
+from . import profiler
 from .core import MesonException, HoldableObject
 
 if T.TYPE_CHECKING:
@@ -79,6 +81,7 @@ __all__ = [
     'Version',
     'check_direntry_issues',
     'classify_unity_sources',
+    'copy_file_data',
     'current_vs_supports_modules',
     'darwin_get_object_archs',
     'default_libdir',
@@ -101,9 +104,11 @@ __all__ = [
     'first',
     'generate_list',
     'get_compiler_for_source',
+    'get_available_memory',
     'get_filenames_templates_dict',
     'get_variable_regex',
     'get_wine_shortpath',
+    'hash_file',
     'git',
     'has_path_sep',
     'is_aix',
@@ -747,6 +752,47 @@ def windows_detect_native_arch() -> str:
             raise EnvironmentException('Unable to detect native OS architecture')
     return arch
 
+def get_available_memory() -> T.Optional[int]:
+    """
+    The memory in bytes that is available to new processes without
+    swapping, or None if it cannot be determined.
+    """
+    if sys.platform == 'win32':
+        try:
+            import ctypes
+
+            class MEMORYSTATUSEX(ctypes.Structure):
+                _fields_ = [('dwLength', ctypes.c_ulong),
+                            ('dwMemoryLoad', ctypes.c_ulong),
+                            ('ullTotalPhys', ctypes.c_ulonglong),
+                            ('ullAvailPhys', ctypes.c_ulonglong),
+                            ('ullTotalPageFile', ctypes.c_ulonglong),
+                            ('ullAvailPageFile', ctypes.c_ulonglong),
+                            ('ullTotalVirtual', ctypes.c_ulonglong),
+                            ('ullAvailVirtual', ctypes.c_ulonglong),
+                            ('ullAvailExtendedVirtual', ctypes.c_ulonglong)]
+            status = MEMORYSTATUSEX()
+            status.dwLength = ctypes.sizeof(MEMORYSTATUSEX)
+            if ctypes.windll.kernel32.GlobalMemoryStatusEx(ctypes.byref(status)):
+                return status.ullAvailPhys
+        except (OSError, AttributeError):
+            pass
+        return None
+    try:
+        # Unlike MemFree this includes the page cache that can be dropped
+        with open('/proc/meminfo', encoding='ascii') as f:
+            for line in f:
+                if line.startswith('MemAvailable:'):
+                    return int(line.split()[1]) * 1024
+    except (OSError, ValueError, IndexError):
+        pass
+    for pages in ('SC_AVPHYS_PAGES', 'SC_PHYS_PAGES'):
+        try:
+            return os.sysconf(pages) * os.sysconf('SC_PAGE_SIZE')
+        except (OSError, ValueError):
+            pass
+    return None
+
 def detect_vcs(source_dir: T.Union[str, Path]) -> T.Optional[T.Dict[str, str]]:
     vcs_systems = [
         {
@@ -1534,12 +1580,13 @@ def Popen_safe(args: T.List[str], write: T.Optional[str] = None,
         stdin = subprocess.PIPE
 
     try:
-        if not sys.stdout.encoding or encoding.upper() != 'UTF-8':
-            p, o, e = Popen_safe_legacy(args, write=write, stdin=stdin, stdout=stdout, stderr=stderr, **kwargs)
-        else:
-            p = subprocess.Popen(args, universal_newlines=True, encoding=encoding, close_fds=False,
-                                 stdin=stdin, stdout=stdout, stderr=stderr, **kwargs)
-            o, e = p.communicate(write)
+        with profiler.span('subprocess', os.path.basename(str(args[0]))):
+            if not sys.stdout.encoding or encoding.upper() != 'UTF-8':
+                p, o, e = Popen_safe_legacy(args, write=write, stdin=stdin, stdout=stdout, stderr=stderr, **kwargs)
+            else:
+                p = subprocess.Popen(args, universal_newlines=True, encoding=encoding, close_fds=False,
+                                     stdin=stdin, stdout=stdout, stderr=stderr, **kwargs)
+                o, e = p.communicate(write)
     except OSError as oserr:
         if oserr.errno == errno.ENOEXEC:
             raise MesonException(f'Failed running {args[0]!r}, binary or interpreter not executable.\n'
@@ -1830,6 +1877,56 @@ def windows_proof_rm(fpath: T.Union[str, Path]) -> None:
     os.unlink(fpath)
 
 
+# From linux/fs.h
+FICLONE = 0x40049409
+
+def copy_file_data(src: str, dst: str) -> T.Tuple[str, int]:
+    '''Copy the contents of @src to @dst without going through userspace
+    where possible.
+
+    On Linux the data is first cloned with FICLONE, which shares the extents
+    on filesystems like btrfs and XFS, and then copied in the kernel with
+    copy_file_range(). Elsewhere, or if neither works, shutil.copyfile() is
+    used, which itself uses sendfile() or fcopyfile() when it can.
+
+    Returns whether the data was "cloned" or "copied", and the number of
+    bytes that were copied.
+    '''
+    if sys.platform == 'linux':
+        import fcntl
+        with open(src, 'rb') as fsrc, open(dst, 'wb') as fdst:
+            try:
+                fcntl.ioctl(fdst.fileno(), FICLONE, fsrc.fileno())
+                return 'cloned', 0
+            except OSError:
+                pass
+            if hasattr(os, 'copy_file_range'):
+                copied = 0
+                try:
+                    while True:
+                        n = os.copy_file_range(fsrc.fileno(), fdst.fileno(), 1 << 30)
+                        if n == 0:
+                            return 'copied', copied
+                        copied += n
+                except OSError as e:
+                    # Not supported for this pair of files, fall back to a
+                    # regular copy unless we're already halfway through.
+                    if copied or e.errno not in {errno.EXDEV, errno.ENOSYS, errno.EINVAL,
+                                                 errno.EOPNOTSUPP, errno.EPERM}:
+                        raise
+    shutil.copyfile(src, dst)
+    return 'copied', os.path.getsize(dst)
+
+
+def hash_file(path: str) -> str:
+    '''The sha256 of a file, read in large chunks to keep memory bounded.'''
+    h = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            h.update(chunk)
+    return h.hexdigest()
+
+
 class TemporaryDirectoryWinProof(TemporaryDirectory):
     """
     Like TemporaryDirectory, but cleans things up using
@@ -2022,6 +2119,8 @@ _BUILTIN_NAMES = {
     'warning_level',
     'werror',
     'wrap_mode',
+    'wrap_cache',
+    'wrap_prefetch',
     'force_fallback_for',
     'pkg_config_path',
     'cmake_prefix_path',
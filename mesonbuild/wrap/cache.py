@@ -0,0 +1,313 @@
+# SPDX-License-Identifier: Apache-2.0
+# Copyright 2024 The Meson development team
+
+"""A wrap package cache shared by all projects of a user.
+
+Archives of `[wrap-file]` subprojects are stored under their sha256, which
+the wrap file already pins with `source_hash` and `patch_hash`, so a
+tarball downloaded for one checkout is reused by every other checkout and
+CI workspace on the same machine. Archives are always copied in and out of
+the cache, so that the least recently used bookkeeping, which uses the
+modification time of the entries, never touches a project's files.
+Optionally the extracted and patched source trees are cached too, and new
+checkouts get a copy of the cached tree (reflinked where the filesystem
+supports it) or hardlinks to it instead of unpacking the archives again.
+
+Entries are only ever published with an atomic rename. Readers hold a
+shared lock while they link or copy an entry out of the cache; pruning
+takes the lock exclusively and evicts the least recently used entries
+until the cache fits into its size limit.
+"""
+
+from __future__ import annotations
+
+import contextlib
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import time
+import typing as T
+
+from ..mesonlib import MesonException, copy_file_data, is_windows
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+if T.TYPE_CHECKING:
+    from .wrap import PackageDefinition
+
+ENV_DIR = 'MESON_WRAP_CACHE_DIR'
+ENV_MAX_SIZE = 'MESON_WRAP_CACHE_MAX_SIZE'
+ENV_TREES = 'MESON_WRAP_CACHE_TREES'
+
+DEFAULT_MAX_SIZE = 5 * 1024 ** 3
+TREE_MODES = {'copy', 'hardlink'}
+
+# Staging directories of processes that died are removed after this long.
+STALE_TMP_AGE = 24 * 60 * 60
+
+_SIZE_SUFFIXES = {'k': 1024, 'm': 1024 ** 2, 'g': 1024 ** 3, 't': 1024 ** 4}
+
+
+def default_dir() -> str:
+    if is_windows():
+        base = os.environ.get('LOCALAPPDATA') or os.path.expanduser(os.path.join('~', 'AppData', 'Local'))
+    else:
+        base = os.environ.get('XDG_CACHE_HOME') or os.path.expanduser(os.path.join('~', '.cache'))
+    return os.path.join(base, 'meson', 'wrapcache')
+
+
+def parse_size(value: str) -> int:
+    v = value.strip().lower().rstrip('b')
+    multiplier = 1
+    if v and v[-1] in _SIZE_SUFFIXES:
+        multiplier = _SIZE_SUFFIXES[v[-1]]
+        v = v[:-1]
+    try:
+        return int(float(v) * multiplier)
+    except ValueError:
+        raise MesonException(f'Invalid {ENV_MAX_SIZE} value {value!r}, expected a size like "10G"')
+
+
+def _tree_size(path: str) -> int:
+    total = 0
+    for root, _, files in os.walk(path):
+        for f in files:
+            try:
+                total += os.lstat(os.path.join(root, f)).st_size
+            except OSError:
+                pass
+    return total
+
+
+def _link_or_copy(src: str, dst: str) -> None:
+    try:
+        os.link(src, dst)
+    except OSError:
+        copy_file_data(src, dst)
+        shutil.copystat(src, dst)
+
+
+def _copy_file(src: str, dst: str) -> None:
+    copy_file_data(src, dst)
+    shutil.copystat(src, dst)
+
+
+class SharedCache:
+
+    def __init__(self, root: str, max_size: int = DEFAULT_MAX_SIZE, trees: T.Optional[str] = None) -> None:
+        self.root = root
+        self.max_size = max_size
+        self.trees = trees
+        self.files_dir = os.path.join(root, 'files')
+        self.trees_dir = os.path.join(root, 'trees')
+        self.tmp_dir = os.path.join(root, 'tmp')
+        self.lockfile = os.path.join(root, 'lock')
+
+    @classmethod
+    def from_env(cls) -> T.Optional[SharedCache]:
+        '''The shared cache as configured by the environment.
+
+        Setting MESON_WRAP_CACHE_DIR to an empty string disables it.
+        '''
+        root = os.environ.get(ENV_DIR)
+        if root is None:
+            root = default_dir()
+        elif not root:
+            return None
+        max_size = DEFAULT_MAX_SIZE
+        if os.environ.get(ENV_MAX_SIZE):
+            max_size = parse_size(os.environ[ENV_MAX_SIZE])
+        trees: T.Optional[str] = os.environ.get(ENV_TREES, '').lower() or None
+        if trees in {'0', 'false', 'no'}:
+            trees = None
+        elif trees in {'1', 'true', 'yes'}:
+            trees = 'copy'
+        elif trees is not None and trees not in TREE_MODES:
+            raise MesonException(f'Invalid {ENV_TREES} value {trees!r}, must be one of: copy, hardlink')
+        return cls(os.path.abspath(root), max_size, trees)
+
+    @contextlib.contextmanager
+    def _locked(self, exclusive: bool) -> T.Iterator[bool]:
+        '''Lock the cache, yielding False if an exclusive lock is held by
+        someone else.
+
+        Without fcntl (i.e. on Windows) there is no locking. Publishing is
+        still atomic, and files in use cannot be removed there anyway.
+        '''
+        if fcntl is None:
+            yield True
+            return
+        os.makedirs(self.root, exist_ok=True)
+        with open(self.lockfile, 'a', encoding='utf-8') as f:
+            try:
+                fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB if exclusive else fcntl.LOCK_SH)
+            except BlockingIOError:
+                yield False
+                return
+            try:
+                yield True
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+    def _staging_dir(self) -> str:
+        os.makedirs(self.tmp_dir, exist_ok=True)
+        return tempfile.mkdtemp(dir=self.tmp_dir)
+
+    def _file_path(self, sha256: str) -> str:
+        return os.path.join(self.files_dir, sha256[:2], sha256)
+
+    def get_file(self, sha256: str, dst: str) -> bool:
+        '''Copy the archive with the given hash to @dst.'''
+        path = self._file_path(sha256)
+        with self._locked(exclusive=False):
+            if not os.path.isfile(path):
+                return False
+            tmp = dst + '.tmp'
+            try:
+                _copy_file(path, tmp)
+                os.replace(tmp, dst)
+            except OSError:
+                with contextlib.suppress(OSError):
+                    os.unlink(tmp)
+                return False
+            with contextlib.suppress(OSError):
+                os.utime(path)
+        return True
+
+    def add_file(self, sha256: str, src: str) -> None:
+        '''Publish @src, whose hash has been verified by the caller.'''
+        path = self._file_path(sha256)
+        if os.path.isfile(path):
+            with contextlib.suppress(OSError):
+                os.utime(path)
+            return
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            staging = self._staging_dir()
+            try:
+                tmp = os.path.join(staging, sha256)
+                _copy_file(src, tmp)
+                os.replace(tmp, path)
+            finally:
+                shutil.rmtree(staging, ignore_errors=True)
+        except OSError:
+            # A read-only or full cache must not break the configure.
+            return
+        self.prune()
+
+    def remove_file(self, sha256: str) -> None:
+        with contextlib.suppress(OSError):
+            os.unlink(self._file_path(sha256))
+
+    def tree_key(self, wrap: PackageDefinition) -> str:
+        '''The key of the tree extracted from the archives of @wrap.'''
+        values = wrap.values
+        desc = [values.get('source_hash', '').lower(), values.get('patch_hash', '').lower(),
+                wrap.directory, 'lead_directory_missing' in values]
+        return hashlib.sha256(json.dumps(desc).encode('utf-8')).hexdigest()
+
+    def get_tree(self, key: str, dst: str, allow_hardlink: bool = True) -> bool:
+        '''Populate the new directory @dst with the cached tree @key.'''
+        entry = os.path.join(self.trees_dir, key)
+        hardlink = allow_hardlink and self.trees == 'hardlink'
+        with self._locked(exclusive=False):
+            names = [n for n in os.listdir(entry) if n != 'size'] if os.path.isdir(entry) else []
+            if len(names) != 1:
+                return False
+            src = os.path.join(entry, names[0])
+            try:
+                shutil.copytree(src, dst, symlinks=True,
+                                copy_function=_link_or_copy if hardlink else _copy_file)
+            except (OSError, shutil.Error):
+                shutil.rmtree(dst, ignore_errors=True)
+                return False
+            with contextlib.suppress(OSError):
+                os.utime(entry)
+        return True
+
+    def add_tree(self, key: str, build: T.Callable[[str], T.Optional[str]]) -> None:
+        '''Publish the tree that @build creates in the directory it is given.
+
+        @build returns the name of the tree's top level directory, or None if
+        the result cannot be cached.
+        '''
+        if os.path.isdir(os.path.join(self.trees_dir, key)):
+            return
+        try:
+            staging = self._staging_dir()
+        except OSError:
+            return
+        try:
+            name = build(staging)
+            if name is None or os.listdir(staging) != [name]:
+                return
+            with open(os.path.join(staging, 'size'), 'w', encoding='utf-8') as f:
+                f.write(str(_tree_size(staging)))
+            os.makedirs(self.trees_dir, exist_ok=True)
+            try:
+                os.rename(staging, os.path.join(self.trees_dir, key))
+            except OSError:
+                # Someone else published it first.
+                return
+        finally:
+            shutil.rmtree(staging, ignore_errors=True)
+        self.prune()
+
+    def _entries(self) -> T.List[T.Tuple[float, int, str]]:
+        entries: T.List[T.Tuple[float, int, str]] = []
+        if os.path.isdir(self.files_dir):
+            for d in os.listdir(self.files_dir):
+                subdir = os.path.join(self.files_dir, d)
+                for f in os.listdir(subdir):
+                    st = os.stat(os.path.join(subdir, f))
+                    entries.append((st.st_mtime, st.st_size, os.path.join(subdir, f)))
+        if os.path.isdir(self.trees_dir):
+            for key in os.listdir(self.trees_dir):
+                entry = os.path.join(self.trees_dir, key)
+                try:
+                    with open(os.path.join(entry, 'size'), encoding='utf-8') as sizefile:
+                        size = int(sizefile.read())
+                except (OSError, ValueError):
+                    size = _tree_size(entry)
+                entries.append((os.stat(entry).st_mtime, size, entry))
+        return entries
+
+    def prune(self) -> None:
+        '''Evict least recently used entries until the cache fits into its
+        size limit. Does nothing while other processes read from the cache.
+        '''
+        with self._locked(exclusive=True) as locked:
+            if not locked:
+                return
+            try:
+                entries = sorted(self._entries())
+                if os.path.isdir(self.tmp_dir):
+                    now = time.time()
+                    for d in os.listdir(self.tmp_dir):
+                        path = os.path.join(self.tmp_dir, d)
+                        if now - os.stat(path).st_mtime > STALE_TMP_AGE:
+                            shutil.rmtree(path, ignore_errors=True)
+            except OSError:
+                return
+            total = sum(size for _, size, _ in entries)
+            for _, size, path in entries:
+                if total <= self.max_size:
+                    break
+                if os.path.isdir(path):
+                    # Never leave a half removed tree behind
+                    try:
+                        doomed = os.path.join(self._staging_dir(), 'doomed')
+                        os.rename(path, doomed)
+                    except OSError:
+                        continue
+                    shutil.rmtree(os.path.dirname(doomed), ignore_errors=True)
+                else:
+                    with contextlib.suppress(OSError):
+                        os.unlink(path)
+                        os.rmdir(os.path.dirname(path))
+                total -= size
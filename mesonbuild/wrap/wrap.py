@@ -17,6 +17,7 @@ import stat
 import subprocess
 import sys
 import configparser
+import copy
 import time
 import typing as T
 import textwrap
@@ -29,7 +30,7 @@ from functools import lru_cache
 
 from . import WrapMode
 from .. import coredata
-from ..mesonlib import quiet_git, GIT, ProgressBar, MesonException, windows_proof_rmtree, Popen_safe
+from ..mesonlib import quiet_git, GIT, ProgressBar, MesonException, windows_proof_rmtree, Popen_safe, hash_file
 from ..interpreterbase import FeatureNew
 from ..interpreterbase import SubProject
 from .. import mesonlib
@@ -38,6 +39,8 @@ if T.TYPE_CHECKING:
     import http.client
     from typing_extensions import Literal
 
+    from .cache import SharedCache
+
     Method = Literal['meson', 'cmake', 'cargo']
 
 try:
@@ -49,12 +52,48 @@ except ImportError:
     has_ssl = False
 
 REQ_TIMEOUT = 30.0
+# Number of subprojects fetched concurrently by Resolver.prefetch()
+PREFETCH_JOBS = 8
 WHITELIST_SUBDOMAIN = 'wrapdb.mesonbuild.com'
 
 ALL_TYPES = ['file', 'git', 'hg', 'svn', 'redirect']
 
 PATCH = shutil.which('patch')
 
+# Suffix of the files remembering the hashes of archives in the package cache
+HASH_SIDECAR_SUFFIX = '.meson-hash'
+
+def get_hash_sidecar(path: str) -> str:
+    return path + HASH_SIDECAR_SUFFIX
+
+def _file_key(path: str) -> str:
+    st = os.stat(path)
+    return f'{st.st_size} {st.st_mtime_ns}'
+
+def remember_hash(path: str, hashvalue: str) -> None:
+    '''Record the hash of @path, valid as long as its size and mtime are.'''
+    try:
+        with open(get_hash_sidecar(path), 'w', encoding='utf-8') as f:
+            f.write(f'{_file_key(path)} {hashvalue}\n')
+    except OSError:
+        # e.g. a read-only MESON_PACKAGE_CACHE_DIR
+        pass
+
+def cached_hash(path: str) -> str:
+    '''The sha256 of @path, using the hash remembered by remember_hash() if
+    the file has not changed since.
+    '''
+    try:
+        with open(get_hash_sidecar(path), encoding='utf-8') as f:
+            key, _, hashvalue = f.read().strip().rpartition(' ')
+        if key == _file_key(path):
+            return hashvalue
+    except OSError:
+        pass
+    hashvalue = hash_file(path)
+    remember_hash(path, hashvalue)
+    return hashvalue
+
 def whitelist_wrapdb(urlstr: str) -> urllib.parse.ParseResult:
     """ raises WrapException if not whitelisted subdomain """
     url = urllib.parse.urlparse(urlstr)
@@ -300,6 +339,7 @@ class Resolver:
     wrap_frontend: bool = False
     allow_insecure: bool = False
     silent: bool = False
+    use_shared_cache: bool = False
 
     def __post_init__(self) -> None:
         self.subdir_root = os.path.join(self.source_dir, self.subdir)
@@ -311,10 +351,21 @@ class Resolver:
         self.wrapdb: T.Dict[str, T.Any] = {}
         self.wrapdb_provided_deps: T.Dict[str, str] = {}
         self.wrapdb_provided_programs: T.Dict[str, str] = {}
+        self._shared_cache: T.Optional[SharedCache] = None
+        self._shared_cache_loaded = False
         self.load_wraps()
         self.load_netrc()
         self.load_wrapdb()
 
+    def get_shared_cache(self) -> T.Optional[SharedCache]:
+        # Only needed when something has to be downloaded or extracted
+        if not self._shared_cache_loaded:
+            if self.use_shared_cache:
+                from .cache import SharedCache
+                self._shared_cache = SharedCache.from_env()
+            self._shared_cache_loaded = True
+        return self._shared_cache
+
     def load_netrc(self) -> None:
         try:
             self.netrc = netrc()
@@ -495,10 +546,11 @@ class Resolver:
             # repository. In that case, we could do something smarter than
             # copy_tree() here.
             cached_directory = os.path.join(self.cachedir, self.directory)
+            patched = False
             if os.path.isdir(cached_directory):
                 self.copy_tree(cached_directory, self.dirname)
             elif self.wrap.type == 'file':
-                self._get_file(packagename)
+                patched = self._get_file(packagename)
             else:
                 self.check_can_download()
                 if self.wrap.type == 'git':
@@ -510,7 +562,7 @@ class Resolver:
                 else:
                     raise WrapException(f'Unknown wrap type {self.wrap.type!r}')
             try:
-                self.apply_patch(packagename)
+                self.apply_patch(packagename, skip_archive=patched)
                 self.apply_diff_files()
             except Exception:
                 windows_proof_rmtree(self.dirname)
@@ -525,6 +577,43 @@ class Resolver:
         self.wrap.update_hash_cache(self.dirname)
         return rel_path, method
 
+    def prefetch(self) -> T.List[T.Tuple[str, str]]:
+        '''Download and extract all wraps that are not yet, concurrently.
+
+        Failures are not fatal, the subproject is fetched again when it is
+        actually used and fails the way it always did. Returns the names of
+        the wraps that could not be fetched, with the reason.
+        '''
+        wraps = [w for w in self.wraps.values()
+                 if w.type in {'file', 'git', 'hg', 'svn'} and w.subprojects_dir == self.subdir_root
+                 and not os.path.exists(os.path.join(self.subdir_root, w.directory))]
+        if not wraps:
+            return []
+
+        def fetch(wrap: PackageDefinition) -> T.Optional[str]:
+            # resolve() keeps its state in the Resolver, use one per thread
+            r = copy.copy(self)
+            r.silent = True
+            try:
+                r.resolve(wrap.name)
+            except (MesonException, OSError, subprocess.CalledProcessError) as e:
+                return str(e)
+            return None
+
+        from concurrent.futures import ThreadPoolExecutor
+        mlog.log('Prefetching', mlog.bold(str(len(wraps))), 'subprojects')
+        start = time.monotonic()
+        # Concurrent downloads would interleave their output, only the
+        # summary below is shown.
+        with mlog.no_logging(), ThreadPoolExecutor(min(PREFETCH_JOBS, len(wraps))) as executor:
+            errors = list(executor.map(fetch, wraps))
+        failures = [(w.name, e) for w, e in zip(wraps, errors) if e is not None]
+        mlog.log('Prefetched', mlog.bold(str(len(wraps) - len(failures))), 'subprojects in',
+                 f'{time.monotonic() - start:.2f}s')
+        for name, e in failures:
+            mlog.warning(f'Could not prefetch subproject {name}: {e}', fatal=False)
+        return failures
+
     def check_can_download(self) -> None:
         # Don't download subproject data based on wrap file if requested.
         # Git submodules are ok (see above)!
@@ -572,19 +661,49 @@ class Resolver:
             return False
         raise WrapException(f'Unknown git submodule output: {out!r}')
 
-    def _get_file(self, packagename: str) -> None:
-        path = self._get_file_internal('source', packagename)
-        extract_dir = self.subdir_root
+    def _get_file(self, packagename: str) -> bool:
+        '''Extract the source archive, returns True if the patch archive has
+        been applied as well.
+        '''
+        cache = self.get_shared_cache()
+        if cache and cache.trees and 'source_hash' in self.wrap.values:
+            key = cache.tree_key(self.wrap)
+            # Diff files may be applied in place, never let them write
+            # through hardlinks into the cache.
+            allow_hardlink = not self.wrap.diff_files
+            if cache.get_tree(key, self.dirname, allow_hardlink):
+                mlog.log('Using', mlog.bold(packagename), 'source tree from the shared cache.')
+                return True
+            path = self._get_file_internal('source', packagename)
+            cache.add_tree(key, lambda root: self._unpack_archives(path, root, packagename))
+            if cache.get_tree(key, self.dirname, allow_hardlink):
+                return True
+        else:
+            path = self._get_file_internal('source', packagename)
+        self._unpack_source(path, self.subdir_root, self.dirname)
+        return False
+
+    def _unpack_source(self, path: str, root: str, dirname: str) -> None:
+        extract_dir = root
         # Some upstreams ship packages that do not have a leading directory.
         # Create one for them.
         if 'lead_directory_missing' in self.wrap.values:
-            os.mkdir(self.dirname)
-            extract_dir = self.dirname
+            os.mkdir(dirname)
+            extract_dir = dirname
         try:
             shutil.unpack_archive(path, extract_dir)
         except OSError as e:
             raise WrapException(f'failed to unpack archive with error: {str(e)}') from e
 
+    def _unpack_archives(self, path: str, root: str, packagename: str) -> T.Optional[str]:
+        '''Extract the source and patch archives into an empty @root, for
+        the shared cache.
+        '''
+        self._unpack_source(path, root, os.path.join(root, self.directory))
+        if 'patch_filename' in self.wrap.values and 'patch_directory' not in self.wrap.values:
+            self._unpack_patch(self._get_file_internal('patch', packagename), root)
+        return self.directory
+
     def _get_git(self, packagename: str) -> None:
         if not GIT:
             raise WrapException(f'Git program not found, cannot download {packagename}.wrap via git.')
@@ -678,7 +797,7 @@ class Resolver:
         return login, password
 
     def get_data(self, urlstring: str) -> T.Tuple[str, str]:
-        blocksize = 10 * 1024
+        blocksize = 1024 * 1024
         h = hashlib.sha256()
         tmpfile = tempfile.NamedTemporaryFile(mode='wb', dir=self.cachedir, delete=False)
         url = urllib.parse.urlparse(urlstring)
@@ -737,14 +856,11 @@ class Resolver:
             hashvalue = h.hexdigest()
         return hashvalue, tmpfile.name
 
-    def check_hash(self, what: str, path: str, hash_required: bool = True) -> None:
+    def check_hash(self, what: str, path: str, hash_required: bool = True, cached: bool = False) -> None:
         if what + '_hash' not in self.wrap.values and not hash_required:
             return
         expected = self.wrap.get(what + '_hash').lower()
-        h = hashlib.sha256()
-        with open(path, 'rb') as f:
-            h.update(f.read())
-        dhash = h.hexdigest()
+        dhash = cached_hash(path) if cached else hash_file(path)
         if dhash != expected:
             raise WrapException(f'Incorrect hash for {what}:\n {expected} expected\n {dhash} actual.')
 
@@ -776,6 +892,7 @@ class Resolver:
                          mlog.bold(what + '_fallback_url'), 'key in the wrap file')
             raise
         os.rename(tmpfile, ofname)
+        remember_hash(ofname, dhash)
 
     def _get_file_internal(self, what: str, packagename: str) -> str:
         filename = self.wrap.get(what + '_filename')
@@ -783,12 +900,27 @@ class Resolver:
             cache_path = os.path.join(self.cachedir, filename)
 
             if os.path.exists(cache_path):
-                self.check_hash(what, cache_path)
+                self.check_hash(what, cache_path, cached=True)
                 mlog.log('Using', mlog.bold(packagename), what, 'from cache.')
                 return cache_path
 
             os.makedirs(self.cachedir, exist_ok=True)
+            expected = self.wrap.get(what + '_hash').lower()
+            shared_cache = self.get_shared_cache()
+            if shared_cache and shared_cache.get_file(expected, cache_path):
+                try:
+                    self.check_hash(what, cache_path, cached=True)
+                except WrapException as e:
+                    mlog.warning(f'Removing corrupted {what} of {packagename} from the shared cache: {e}', fatal=False)
+                    os.unlink(cache_path)
+                    shared_cache.remove_file(expected)
+                else:
+                    mlog.log('Using', mlog.bold(packagename), what, 'from the shared cache.')
+                    return cache_path
+
             self._download(what, cache_path, packagename)
+            if shared_cache:
+                shared_cache.add_file(expected, cache_path)
             return cache_path
         else:
             path = Path(self.wrap.filesdir) / filename
@@ -799,18 +931,21 @@ class Resolver:
 
             return path.as_posix()
 
-    def apply_patch(self, packagename: str) -> None:
+    def _unpack_patch(self, path: str, root: str) -> None:
+        try:
+            shutil.unpack_archive(path, root)
+        except Exception:
+            with tempfile.TemporaryDirectory() as workdir:
+                shutil.unpack_archive(path, workdir)
+                self.copy_tree(workdir, root)
+
+    def apply_patch(self, packagename: str, skip_archive: bool = False) -> None:
         if 'patch_filename' in self.wrap.values and 'patch_directory' in self.wrap.values:
             m = f'Wrap file {self.wrap.name!r} must not have both "patch_filename" and "patch_directory"'
             raise WrapException(m)
         if 'patch_filename' in self.wrap.values:
-            path = self._get_file_internal('patch', packagename)
-            try:
-                shutil.unpack_archive(path, self.subdir_root)
-            except Exception:
-                with tempfile.TemporaryDirectory() as workdir:
-                    shutil.unpack_archive(path, workdir)
-                    self.copy_tree(workdir, self.subdir_root)
+            if not skip_archive:
+                self._unpack_patch(self._get_file_internal('patch', packagename), self.subdir_root)
         elif 'patch_directory' in self.wrap.values:
             patch_dir = self.wrap.values['patch_directory']
             src_dir = os.path.join(self.wrap.filesdir, patch_dir)
@@ -0,0 +1 @@
+#define LOCAL_VALUE 0
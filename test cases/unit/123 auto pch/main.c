@@ -0,0 +1,14 @@
+#include <stdio.h>
+#define _GNU_SOURCE
+#include <stdlib.h>
+#include <string.h>
+
+int func_a(void);
+int func_b(void);
+int func_c(void);
+int func_d(void);
+
+int main(void) {
+    printf("%d\n", func_a() + func_b() + func_c() + func_d());
+    return (int)strlen("") + (getenv("AUTO_PCH_UNSET") != NULL);
+}
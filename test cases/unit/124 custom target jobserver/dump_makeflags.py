@@ -0,0 +1,7 @@
+#!/usr/bin/env python3
+
+import os
+import sys
+
+with open(sys.argv[1], 'w', encoding='utf-8') as f:
+    f.write(os.environ.get('MAKEFLAGS', ''))
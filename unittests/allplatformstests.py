@@ -12,6 +12,8 @@ import platform
 import pickle
 import zipfile, tarfile
 import sys
+import hashlib
+import stat
 from unittest import mock, SkipTest, skipIf, skipUnless
 from contextlib import contextmanager
 from glob import glob
@@ -608,6 +610,76 @@ class AllPlatformTests(BasePlatformTests):
         self._run(self.meson_command + ['install', '--dry-run', '--destdir', rel_installpath, '-C', self.builddir])
         self.assertEqual(logged, self.read_install_logs())
 
+    def test_install_parallel(self):
+        '''
+        Tests that installing with several jobs installs the same files and
+        writes the same log as a sequential install.
+        '''
+        testdir = os.path.join(self.common_test_dir, '59 install subdir')
+        self.init(testdir)
+        self.install()
+        logged = self.read_install_logs()
+        installpath = Path(self.installdir)
+        expected = sorted(p.relative_to(installpath) for p in installpath.rglob('*'))
+
+        windows_proof_rmtree(self.installdir)
+        self._run(self.meson_command + ['install', '-j', '4', '--destdir', self.installdir], workdir=self.builddir)
+        self.assertEqual(logged, self.read_install_logs())
+        self.assertEqual(expected, sorted(p.relative_to(installpath) for p in installpath.rglob('*')))
+
+    def test_install_only_changed(self):
+        testdir = os.path.join(self.common_test_dir, '8 install')
+        self.init(testdir)
+        self.build()
+        install_cmd = self.meson_command + ['install', '--only-changed', '--no-rebuild', '--destdir', self.installdir]
+        self._run(install_cmd, workdir=self.builddir)
+        prefix = os.path.join(self.installdir, self.prefix.lstrip('/'))
+        prog = os.path.join(prefix, 'bin', 'prog' + exe_suffix)
+        datafile = os.path.join(prefix, 'share', 'dir', 'file.txt')
+        prog_mtime = os.stat(prog).st_mtime_ns
+
+        # A rebuild that produces the same binary does not reinstall it
+        built_prog = os.path.join(self.builddir, 'prog' + exe_suffix)
+        os.utime(built_prog, ns=(prog_mtime + 10**10, prog_mtime + 10**10))
+        with open(os.path.join(self.builddir, 'dir', 'file.txt'), 'w', encoding='utf-8') as f:
+            f.write('changed')
+        self._run(install_cmd, workdir=self.builddir)
+        self.assertEqual(os.stat(prog).st_mtime_ns, prog_mtime)
+        with open(os.path.join(self.builddir, 'meson-logs', 'install-log.txt'), encoding='utf-8') as f:
+            self.assertIn(f'# Preserving old file {prog}', f.read())
+        with open(datafile, encoding='utf-8') as f:
+            self.assertEqual(f.read(), 'changed')
+
+    def test_install_hardlink(self):
+        testdir = os.path.join(self.common_test_dir, '8 install')
+        self.init(testdir)
+        self.build()
+        builtfile = os.path.join(self.builddir, 'dir', 'file.txt')
+        datafile = os.path.join(self.installdir, self.prefix.lstrip('/'), 'share', 'dir', 'file.txt')
+
+        if not is_windows():
+            # Installing with the default umask would change the mode of the
+            # file in the build directory through the link, it is copied
+            os.chmod(builtfile, 0o600)
+            self._run(self.meson_command + ['install', '--hardlink', '--destdir', self.installdir],
+                      workdir=self.builddir)
+            self.assertFalse(os.path.samefile(datafile, builtfile))
+            self.assertEqual(stat.S_IMODE(os.stat(builtfile).st_mode), 0o600)
+            windows_proof_rmtree(self.installdir)
+            os.chmod(builtfile, 0o644)
+
+        out = self._run(self.meson_command + ['install', '--hardlink', '--verbose', '--destdir', self.installdir],
+                        workdir=self.builddir)
+        self.assertRegex(out, r'Installed \d+ files: .*1 hardlinked')
+        # The custom target output is installed as is, the executable may be
+        # stripped or have its rpath changed and must be copied.
+        self.assertTrue(os.path.samefile(datafile, builtfile))
+
+        # Without a DESTDIR files would be linked straight into the system
+        with self.assertRaises(subprocess.CalledProcessError) as cm:
+            self._run(self.meson_command + ['install', '--hardlink', '--no-rebuild'], workdir=self.builddir)
+        self.assertIn('--hardlink can only be used', cm.exception.output)
+
     def test_uninstall(self):
         exename = os.path.join(self.installdir, 'usr/bin/prog' + exe_suffix)
         dirname = os.path.join(self.installdir, 'usr/share/dir')
@@ -1246,6 +1318,206 @@ class AllPlatformTests(BasePlatformTests):
             m = re.search('build c-asm.*: c_LINKER', contents)
         self.assertIsNotNone(m, msg=contents)
 
+    def test_backend_shared_args(self):
+        '''
+        Test that writing the common compile arguments of a target once does
+        not change any compile command, and does not cause a rebuild.
+        '''
+        testdir = os.path.join(self.common_test_dir, '13 pch')
+        self.init(testdir)
+        expected = {c['file']: c['command'] for c in self.get_compdb()}
+        self.build()
+        self.setconf('-Dbackend_shared_args=true')
+        self.assertBuildIsNoop()
+        self.assertEqual({c['file']: c['command'] for c in self.get_compdb()}, expected)
+        build_ninja = os.path.join(self.builddir, 'build.ninja')
+        with open(build_ninja, encoding='utf-8') as f:
+            contents = f.read()
+        self.assertRegex(contents, r'\n ARGS = \$\w+_c_ARGS\n')
+
+    def test_backend_header_phony(self):
+        '''
+        Test that compile statements are ordered after the generated headers
+        of linked libraries through one phony statement per target.
+        '''
+        if self.backend is not Backend.ninja:
+            raise SkipTest('Ninja backend only')
+        testdir = os.path.join(self.common_test_dir, '170 generator link whole')
+        self.init(testdir, extra_args=['-Dbackend_header_phony=true'])
+        with open(os.path.join(self.builddir, 'build.ninja'), encoding='utf-8') as f:
+            contents = f.read()
+        self.assertRegex(contents, r'build exe2\.p/meson-generated-headers: phony \S*shlib2\S*/meson-generated-headers\n')
+        self.assertRegex(contents, r'build exe2\.p/main\.c\.o: .* \|\| exe2\.p/meson-generated-headers\n')
+        self.build()
+        self.assertBuildIsNoop()
+
+    def test_backend_max_links_auto(self):
+        '''
+        Test that backend_max_links=auto limits the number of concurrent
+        links, and separately the number of LTO links.
+        '''
+        if self.backend is not Backend.ninja:
+            raise SkipTest('Ninja backend only')
+        testdir = os.path.join(self.common_test_dir, '1 trivial')
+        build_ninja = os.path.join(self.builddir, 'build.ninja')
+        self.init(testdir, extra_args=['-Dbackend_max_links=auto'])
+        with open(build_ninja, encoding='utf-8') as f:
+            contents = f.read()
+        self.assertRegex(contents, r'\npool link_pool\n  depth = [1-9][0-9]*\n')
+        self.assertNotIn('lto_link_pool', contents)
+        self.build()
+        self.setconf('-Db_lto=true')
+        self.build()
+        with open(build_ninja, encoding='utf-8') as f:
+            contents = f.read()
+        self.assertRegex(contents, r'\npool lto_link_pool\n  depth = [1-9][0-9]*\n')
+        self.assertIn('\n pool = lto_link_pool\n', contents)
+
+    def test_compdb_only_written_on_change(self):
+        testdir = os.path.join(self.common_test_dir, '13 pch')
+        self.init(testdir)
+        compdb = os.path.join(self.builddir, 'compile_commands.json')
+        mtime = os.stat(compdb).st_mtime_ns
+        self.init(testdir, extra_args=['--reconfigure'])
+        self.assertEqual(os.stat(compdb).st_mtime_ns, mtime)
+        self.init(testdir, extra_args=['--reconfigure', '-Doptimization=2'])
+        self.assertNotEqual(os.stat(compdb).st_mtime_ns, mtime)
+        self.assertTrue(all('-O2' in c['command'] for c in self.get_compdb()))
+
+    def test_compdb_incremental(self):
+        '''
+        Test that the entries reused from the previous configuration are
+        the same ones a fresh configuration writes.
+        '''
+        if self.backend is not Backend.ninja:
+            raise SkipTest('Ninja backend only')
+        testdir = os.path.join(self.common_test_dir, '13 pch')
+        compdb = os.path.join(self.builddir, 'compile_commands.json')
+        self.init(testdir)
+        self.assertTrue(os.path.isfile(os.path.join(self.privatedir, 'compdb.dat')))
+        self.setconf('-Dc_args=-DCOMPDB_TEST')
+        self.build()
+        commands = [c['command'] for c in self.get_compdb()]
+        self.assertTrue(any('-DCOMPDB_TEST' in c for c in commands))
+        self.assertTrue(any('-DCOMPDB_TEST' not in c for c in commands))
+        with open(compdb, encoding='utf-8') as f:
+            incremental = f.read()
+        self.wipe()
+        self.init(testdir, extra_args=['-Dc_args=-DCOMPDB_TEST'])
+        with open(compdb, encoding='utf-8') as f:
+            self.assertEqual(f.read(), incremental)
+
+    def test_backend_auto_pch(self):
+        '''
+        Test that the system headers most sources include are precompiled
+        once a build has recorded them, and that the synthesized header is
+        not rewritten when they stay the same.
+        '''
+        if self.backend is not Backend.ninja:
+            raise SkipTest('Ninja backend only')
+        testdir = os.path.join(self.unit_test_dir, '123 auto pch')
+        env = get_fake_env(testdir, self.builddir, self.prefix)
+        cc = detect_c_compiler(env, MachineChoice.HOST)
+        if cc.get_id() not in {'gcc', 'clang'}:
+            raise SkipTest('Automatic precompiled headers need GCC or Clang')
+        self.init(testdir, extra_args=['-Dbackend_auto_pch=true'])
+        header = os.path.join(self.builddir, 'prog.p', 'meson_auto_pch-c.h')
+        self.assertPathDoesNotExist(header)
+        self.build()
+        self.init(testdir, extra_args=['--reconfigure'])
+        with open(header, encoding='utf-8') as f:
+            includes = [l for l in f.read().splitlines() if l.startswith('#include')]
+        # string.h is only included by one source, local.h is part of the
+        # project, and main.c includes stdlib.h after defining a macro
+        self.assertEqual(includes, ['#include <stdio.h>'])
+        for c in self.get_compdb():
+            if c['file'].endswith('.c'):
+                self.assertIn('meson_auto_pch-c.h', c['command'])
+        self.build()
+        self.assertPathExists(header + '.' + cc.get_pch_suffix())
+        mtime = os.stat(header).st_mtime_ns
+        self.init(testdir, extra_args=['--reconfigure'])
+        self.assertEqual(os.stat(header).st_mtime_ns, mtime)
+        self.assertBuildIsNoop()
+
+    def test_backend_object_cache(self):
+        '''
+        Test that objects compiled through the built-in object cache are
+        restored after a clean, and that a header change is not.
+        '''
+        if self.backend is not Backend.ninja:
+            raise SkipTest('Ninja backend only')
+        testdir = os.path.join(self.unit_test_dir, '123 auto pch')
+        env = get_fake_env(testdir, self.builddir, self.prefix)
+        cc = detect_c_compiler(env, MachineChoice.HOST)
+        if cc.get_argument_syntax() != 'gcc' or cc.get_exelist() != cc.get_exelist(ccache=False):
+            raise SkipTest('The object cache needs a GCC-like compiler without ccache')
+        srcdir = os.path.join(self.builddir, 'srctree')
+        shutil.copytree(testdir, srcdir)
+        self.change_builddir(os.path.join(srcdir, '_build'))
+        cachedir = os.path.join(srcdir, 'cache')
+        envvars = {'MESON_OBJECT_CACHE_DIR': cachedir}
+        self.init(srcdir, extra_args=['-Dbackend_object_cache=true'])
+        for c in self.get_compdb():
+            self.assertNotIn('objcache', c['command'])
+        compile_cmd = [*self.meson_command, 'compile', '-C', self.builddir, '--stats']
+
+        out = self._run(compile_cmd, override_envvars=envvars)
+        self.assertIn('Object cache: 0 hits, 5 misses, 0 uncacheable', out)
+        self.assertPathExists(cachedir)
+        self.clean()
+        out = self._run(compile_cmd, override_envvars=envvars)
+        self.assertIn('Object cache: 5 hits, 0 misses, 0 uncacheable', out)
+        self._run([os.path.join(self.builddir, 'prog')])
+        self.assertBuildIsNoop()
+
+        with open(os.path.join(srcdir, 'local.h'), 'a', encoding='utf-8') as f:
+            f.write('\n#define LOCAL_CHANGED 1\n')
+        out = self._run(compile_cmd, override_envvars=envvars)
+        self.assertIn('Object cache: 0 hits, 4 misses, 0 uncacheable', out)
+
+    def test_custom_target_jobserver(self):
+        '''
+        Test that custom and run targets with jobserver: true keep the make
+        jobserver passed down to the build, and drop it when its file
+        descriptors are not available.
+        '''
+        if self.backend is not Backend.ninja:
+            raise SkipTest('Ninja backend only')
+        if is_windows():
+            raise SkipTest('GNU make jobservers on Windows use semaphores')
+        testdir = os.path.join(self.unit_test_dir, '124 custom target jobserver')
+        self.init(testdir)
+        names = ['with_jobserver', 'without_jobserver', 'run_with_jobserver', 'run_without_jobserver']
+        outputs = [os.path.join(self.builddir, f'{n}.txt') for n in names]
+
+        def build(makeflags: str) -> T.List[str]:
+            for o in outputs:
+                if os.path.exists(o):
+                    os.unlink(o)
+            self.build(extra_args=['all', 'run_with_jobserver', 'run_without_jobserver'],
+                       override_envvars={'MAKEFLAGS': makeflags})
+            result = []
+            for o in outputs:
+                with open(o, encoding='utf-8') as f:
+                    result.append(f.read())
+            return result
+
+        with tempfile.TemporaryDirectory() as tmpdir:
+            fifo = os.path.join(tmpdir, 'jobserver')
+            os.mkfifo(fifo)
+            fd = os.open(fifo, os.O_RDWR)
+            try:
+                os.write(fd, b'++')
+                makeflags = f' -j3 --jobserver-auth=fifo:{fifo}'
+                self.assertEqual(build(makeflags), [makeflags] * 4)
+            finally:
+                os.close(fd)
+
+        # File descriptors that the build did not inherit
+        makeflags = ' -j3 --jobserver-auth=97,98'
+        self.assertEqual(build(makeflags), ['', makeflags, '', makeflags])
+
     def test_preprocessor_checks_CPPFLAGS(self):
         '''
         Test that preprocessor compiler checks read CPPFLAGS and also CFLAGS/CXXFLAGS but
@@ -1479,6 +1751,30 @@ class AllPlatformTests(BasePlatformTests):
             # fails sometimes.
             pass
 
+    def test_dist_reuse_cache(self):
+        if not shutil.which('git'):
+            raise SkipTest('Git not found')
+        if self.backend is not Backend.ninja:
+            raise SkipTest('Dist is only supported with Ninja')
+
+        with tempfile.TemporaryDirectory() as project_dir:
+            with open(os.path.join(project_dir, 'meson.build'), 'w', encoding='utf-8') as ofile:
+                ofile.write(textwrap.dedent('''\
+                    project('disttest', 'c', version : '1.0')
+                    cc = meson.get_compiler('c')
+                    assert(cc.has_header('stdio.h'))
+                    test('bad', find_program('false'))
+                    '''))
+            git_init(project_dir)
+            self.init(project_dir)
+            out = self._run(self.meson_command + ['dist', '--reuse-cache', '--skip-tests', '-j', '2'],
+                            workdir=self.builddir)
+            self.assertRegex(out, r'Has header "stdio.h" ?: YES \(cached\)')
+            self.assertPathExists(os.path.join(self.distdir, 'disttest-1.0.tar.xz'))
+            # The failing test must not have run
+            with self.assertRaises(subprocess.CalledProcessError):
+                self._run(self.meson_command + ['dist', '--reuse-cache'], workdir=self.builddir)
+
     def create_dummy_subproject(self, project_dir, name):
         path = os.path.join(project_dir, 'subprojects', name)
         os.makedirs(path)
@@ -1566,6 +1862,17 @@ class AllPlatformTests(BasePlatformTests):
             self.assertPathExists(gz_checksumfile)
             self.assertPathExists(zip_distfile)
             self.assertPathExists(zip_checksumfile)
+            # All formats are written in a single pass, with the checksums
+            # computed on the fly
+            for f in (xz_distfile, bz_distfile, gz_distfile, zip_distfile):
+                with open(f, 'rb') as a, open(f + '.sha256sum', encoding='utf-8') as c:
+                    self.assertEqual(c.read(), f'{hashlib.sha256(a.read()).hexdigest()} *{os.path.basename(f)}\n')
+            members = []
+            for f in (xz_distfile, bz_distfile, gz_distfile):
+                with tarfile.open(f) as tar:  # [ignore encoding]
+                    members.append(sorted((i.name, i.size) for i in tar))
+            self.assertEqual(members[0], members[1])
+            self.assertEqual(members[0], members[2])
 
             if include_subprojects:
                 # Verify that without --include-subprojects we have files from
@@ -3523,6 +3830,37 @@ class AllPlatformTests(BasePlatformTests):
 
         self.assertListEqual(res1, res2)
 
+    def test_introspect_rebuild_impact(self):
+        if self.backend is not Backend.ninja:
+            raise SkipTest(f'{self.backend.name!r} backend can\'t introspect the rebuild impact')
+        testdir = os.path.join(self.unit_test_dir, '56 introspection')
+        self.init(testdir)
+        self.build()
+        header = os.path.join(testdir, 'staticlib', 'static.h')
+        res = self.introspect(['--rebuild-impact', header])
+        self.assertTrue(res['header_dependencies'])
+        self.assertFalse(res['regenerate'])
+        self.assertEqual(res['unknown_files'], [])
+        ids = {t['name'] for t in res['targets']}
+        self.assertEqual(ids, {'staticTestLib', 'test2', 'test3', 'custom target test 3'})
+        self.assertEqual(sorted(res['tests']), ['test case 2'])
+        self.assertEqual(res['benchmarks'], ['benchmark 1'])
+        self.assertEqual(res['unknown_durations'], 0)
+        self.assertGreater(res['estimated_time']['serial'], 0)
+        self.assertLessEqual(res['estimated_time']['critical_path'], res['estimated_time']['serial'])
+        self.assertEqual(res['critical_path'][-1], 'file4')
+
+        # The cached graph is used as long as nothing changed
+        cache = os.path.join(self.privatedir, 'ninja-graph.dat')
+        mtime = os.stat(cache).st_mtime_ns
+        self.assertEqual(self.introspect(['--rebuild-impact', header]), res)
+        self.assertEqual(os.stat(cache).st_mtime_ns, mtime)
+
+        res = self.introspect(['--rebuild-impact', os.path.join(testdir, 'meson.build'),
+                               '--rebuild-impact', 'nonexistent.c'])
+        self.assertTrue(res['regenerate'])
+        self.assertEqual(res['unknown_files'], ['nonexistent.c'])
+
     def test_introspect_targets_from_source(self):
         testdir = os.path.join(self.unit_test_dir, '56 introspection')
         testfile = os.path.join(testdir, 'meson.build')
@@ -3853,6 +4191,52 @@ class AllPlatformTests(BasePlatformTests):
             self._run([*self.meson_command, 'compile', '-C', self.builddir, '--vs-args=-t:{}:Clean'.format(re.sub(r'[\%\$\@\;\.\(\)\']', '_', get_exe_name('trivialprog')))])
             self.assertPathDoesNotExist(os.path.join(self.builddir, get_exe_name('trivialprog')))
 
+    def test_meson_compile_stats(self):
+        if self.backend is not Backend.ninja:
+            raise SkipTest(f'{self.backend.name!r} backend can\'t report build statistics')
+        testdir = os.path.join(self.common_test_dir, '6 linkshared')
+        srcdir = os.path.join(self.builddir, 'srctree')
+        shutil.copytree(testdir, srcdir)
+        with open(os.path.join(srcdir, 'slow.in'), 'w', encoding='utf-8'):
+            pass
+        with open(os.path.join(srcdir, 'meson.build'), 'a', encoding='utf-8') as f:
+            f.write(textwrap.dedent('''
+                custom_target('slow', input : 'slow.in', output : 'slow.out', build_by_default : true,
+                              command : [find_program('python3'), '-c',
+                                         'import shutil, sys, time; time.sleep(1); shutil.copy(sys.argv[1], sys.argv[2])',
+                                         '@INPUT@', '@OUTPUT@'])
+                '''))
+        self.change_builddir(os.path.join(srcdir, '_build'))
+        self.init(srcdir)
+        out = self._run([*self.meson_command, 'compile', '-C', self.builddir, '--stats'])
+        for section in ['Build time:', 'Parallelism over time:', 'Targets:', 'Rules:', 'Critical path',
+                        'Slowest translation units:']:
+            self.assertIn(section, out)
+        self.assertRegex(out, r'\n +[0-9.]+ +[0-9.]+ +[0-9]+  mylib\n')
+        self.assertRegex(out, r'\n +[0-9.]+  \.\./.*libfile\.c \(mylib\)\n')
+        self.assertPathExists(os.path.join(self.logdir, 'build-stats.txt'))
+
+        with open(os.path.join(self.logdir, 'build-trace.json'), encoding='utf-8') as f:
+            events = json.load(f)['traceEvents']
+        jobs = [e for e in events if e['ph'] == 'X']
+        self.assertEqual({e['name'] for e in jobs}, {'mylib', 'prog', 'mycpplib', 'cppprog', 'slow'})
+        self.assertEqual({e['cat'] for e in jobs if e['args']['output'].endswith(('.o', '.obj'))},
+                         {'c_COMPILER', 'cpp_COMPILER'})
+        self.assertEqual([e for e in events if e['ph'] == 'C'][-1]['args']['jobs'], 0)
+
+        out = self._run([*self.meson_command, 'compile', '-C', self.builddir, '--stats'])
+        self.assertIn('No build statistics, nothing was built', out)
+
+        # Only the jobs of the last build are reported, even when all of them
+        # finish later than the previous build did.
+        self.utime(os.path.join(srcdir, 'main.c'))
+        self._run([*self.meson_command, 'compile', '-C', self.builddir])
+        self.utime(os.path.join(srcdir, 'slow.in'))
+        self._run([*self.meson_command, 'compile', '-C', self.builddir, '--stats'])
+        with open(os.path.join(self.logdir, 'build-trace.json'), encoding='utf-8') as f:
+            events = json.load(f)['traceEvents']
+        self.assertEqual({e['name'] for e in events if e['ph'] == 'X'}, {'slow'})
+
     def test_spurious_reconfigure_built_dep_file(self):
         testdir = os.path.join(self.unit_test_dir, '73 dep files')
 
@@ -13,6 +13,7 @@ import pickle
 import stat
 import subprocess
 import tempfile
+import textwrap
 import typing as T
 import unittest
 
@@ -1715,3 +1716,79 @@ class InternalTests(unittest.TestCase):
         for raw, expected in cases:
             with self.subTest(raw):
                 self.assertEqual(OptionKey.from_string(raw), expected)
+
+    def test_parser_drop_whitespace(self) -> None:
+        from mesonbuild import mparser
+        from mesonbuild.ast import AstJSONPrinter
+
+        code = textwrap.dedent('''\
+            # leading comment
+            project('foo', 'c')  # trailing comment
+
+            x = ['a',  # item
+                 'b'] + [not true ? 1 : 2]
+            if x not in ['c']
+              foo(x, kw : {'a' : 1})
+            endif
+            ''')
+
+        def dump(ast: mparser.CodeBlockNode) -> T.Dict[str, T.Any]:
+            printer = AstJSONPrinter()
+            ast.accept(printer)
+            return printer.result
+
+        full = mparser.Parser(code, 'meson.build').parse()
+        slim = mparser.Parser(code, 'meson.build', keep_whitespace=False).parse()
+        self.assertEqual(dump(full), dump(slim))
+        self.assertIsNotNone(full.pre_whitespaces)
+        self.assertIsNone(slim.pre_whitespaces)
+        self.assertTrue(all(n.whitespaces is None for n in slim.lines))
+
+    def test_wrap_cached_hash(self) -> None:
+        from mesonbuild.wrap import wrap
+
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path = os.path.join(tmpdir, 'foo.tar.gz')
+            with open(path, 'wb') as f:
+                f.write(b'x' * 3000000)
+            expected = mesonbuild.mesonlib.hash_file(path)
+            self.assertEqual(wrap.cached_hash(path), expected)
+            self.assertTrue(os.path.isfile(wrap.get_hash_sidecar(path)))
+
+            # An unchanged file is not read again
+            with mock.patch.object(wrap, 'hash_file', side_effect=AssertionError):
+                self.assertEqual(wrap.cached_hash(path), expected)
+
+            # A changed one is
+            with open(path, 'ab') as f:
+                f.write(b'y')
+            self.assertNotEqual(wrap.cached_hash(path), expected)
+            self.assertEqual(wrap.cached_hash(path), mesonbuild.mesonlib.hash_file(path))
+
+    def test_compdb_abort(self) -> None:
+        from mesonbuild.backend import ninjabackend
+
+        with tempfile.TemporaryDirectory() as tmpdir:
+            fname = os.path.join(tmpdir, 'compile_commands.json')
+            cachefile = os.path.join(tmpdir, 'compdb.dat')
+            with open(fname, 'w', encoding='utf-8') as f:
+                f.write('previous')
+
+            # Failing to write build.ninja keeps the previous database
+            compdb = ninjabackend.NinjaCompdb(fname, cachefile, set(), tmpdir)
+            compdb.abort()
+            self.assertEqual(os.listdir(tmpdir), ['compile_commands.json'])
+
+            # So does failing to replace it
+            compdb = ninjabackend.NinjaCompdb(fname, cachefile, set(), tmpdir)
+            with mock.patch.object(ninjabackend.os, 'replace', side_effect=OSError):
+                with self.assertRaises(OSError):
+                    compdb.close()
+            self.assertEqual(os.listdir(tmpdir), ['compile_commands.json'])
+            with open(fname, encoding='utf-8') as f:
+                self.assertEqual(f.read(), 'previous')
+
+            compdb = ninjabackend.NinjaCompdb(fname, cachefile, set(), tmpdir)
+            compdb.close()
+            with open(fname, encoding='utf-8') as f:
+                self.assertEqual(json.load(f), [])
@@ -6,6 +6,7 @@ import subprocess
 import re
 import tempfile
 import textwrap
+import time
 import os
 import shutil
 import hashlib
@@ -1023,6 +1024,30 @@ class LinuxlikeTests(BasePlatformTests):
         self.init(testdir, extra_args=['-Db_coverage=true'], default_args=False)
         self.build('reconfigure')
 
+    def test_configure_daemon(self):
+        testdir = os.path.join(self.common_test_dir, '1 trivial')
+        self.init(testdir)
+        env = {'MESON_CONFIGURE_DAEMON': '1'}
+        sock = os.path.join(self.privatedir, 'configure-daemon.sock')
+        log = os.path.join(self.logdir, 'configure-daemon.log')
+        # The first regeneration runs as usual and starts the server
+        self.build('reconfigure', override_envvars=env)
+        for _ in range(100):
+            if os.path.exists(sock):
+                break
+            time.sleep(0.1)
+        else:
+            self.fail('configure daemon did not start')
+        try:
+            out = self.build('reconfigure', override_envvars=env)
+            self.assertIn('Build targets in project: 1', out)
+            with open(log, encoding='utf-8') as f:
+                self.assertIn('Serving regeneration in process', f.read())
+            self.build()
+        finally:
+            # The server exits once its socket is gone
+            os.unlink(sock)
+
     def test_vala_generated_source_buildir_inside_source_tree(self):
         '''
         Test that valac outputs generated C files in the expected location when
@@ -1644,6 +1669,103 @@ class LinuxlikeTests(BasePlatformTests):
         windows_proof_rmtree(os.path.join(testdir, 'subprojects', 'foo'))
         os.unlink(wrap_filename)
 
+    def test_wrap_shared_cache(self):
+        testdir = os.path.join(self.unit_test_dir, '72 wrap file url')
+        source_filename = os.path.join(testdir, 'subprojects', 'foo.tar.xz')
+        patch_filename = os.path.join(testdir, 'subprojects', 'foo-patch.tar.xz')
+        source_hash = self.compute_sha256(source_filename)
+        patch_hash = self.compute_sha256(patch_filename)
+        wrap = textwrap.dedent(f'''\
+            [wrap-file]
+            directory = foo
+
+            source_url = {{}}
+            source_filename = foo.tar.xz
+            source_hash = {source_hash}
+
+            patch_url = {{}}
+            patch_filename = foo-patch.tar.xz
+            patch_hash = {patch_hash}
+            ''')
+        with tempfile.TemporaryDirectory() as tmpdir:
+            env = {'MESON_WRAP_CACHE_DIR': os.path.join(tmpdir, 'cache'),
+                   'MESON_WRAP_CACHE_TREES': 'copy'}
+            # The first checkout downloads and fills the shared cache
+            srcdir = os.path.join(tmpdir, 'src1')
+            shutil.copytree(testdir, srcdir)
+            with open(os.path.join(srcdir, 'subprojects', 'foo.wrap'), 'w', encoding='utf-8') as f:
+                f.write(wrap.format(Path(source_filename).as_uri(), Path(patch_filename).as_uri()))
+            self.init(srcdir, extra_args=['-Dwrap_cache=true'], override_envvars=env)
+            for h in (source_hash, patch_hash):
+                self.assertPathExists(os.path.join(tmpdir, 'cache', 'files', h[:2], h))
+            self.assertEqual(len(os.listdir(os.path.join(tmpdir, 'cache', 'trees'))), 1)
+            self.wipe()
+
+            # A second checkout gets the patched tree without any download
+            srcdir = os.path.join(tmpdir, 'src2')
+            shutil.copytree(testdir, srcdir)
+            with open(os.path.join(srcdir, 'subprojects', 'foo.wrap'), 'w', encoding='utf-8') as f:
+                f.write(wrap.format('http://server.invalid/foo', 'http://server.invalid/foo'))
+            out = self.init(srcdir, extra_args=['--wrap-mode=nodownload', '-Dwrap_cache=true'], override_envvars=env)
+            self.assertIn('source tree from the shared cache', out)
+            self.build()
+            self.run_tests()
+            self.wipe()
+
+            # Only the archives are needed without tree caching
+            srcdir = os.path.join(tmpdir, 'src3')
+            shutil.copytree(testdir, srcdir)
+            with open(os.path.join(srcdir, 'subprojects', 'foo.wrap'), 'w', encoding='utf-8') as f:
+                f.write(wrap.format('http://server.invalid/foo', 'http://server.invalid/foo'))
+            del env['MESON_WRAP_CACHE_TREES']
+            out = self.init(srcdir, extra_args=['--wrap-mode=nodownload', '-Dwrap_cache=true'], override_envvars=env)
+            self.assertIn('source from the shared cache', out)
+            # Copied, the cache's bookkeeping must not touch the project's file
+            self.assertEqual(os.stat(os.path.join(srcdir, 'subprojects', 'packagecache', 'foo-patch.tar.xz')).st_nlink, 1)
+            self.build()
+            self.wipe()
+
+            # The shared cache is opt-in
+            srcdir = os.path.join(tmpdir, 'src4')
+            shutil.copytree(testdir, srcdir)
+            with open(os.path.join(srcdir, 'subprojects', 'foo.wrap'), 'w', encoding='utf-8') as f:
+                f.write(wrap.format('http://server.invalid/foo', 'http://server.invalid/foo'))
+            with self.assertRaises(subprocess.CalledProcessError):
+                self.init(srcdir, extra_args=['--wrap-mode=nodownload'], override_envvars=env)
+
+    def test_wrap_prefetch(self):
+        testdir = os.path.join(self.unit_test_dir, '72 wrap file url')
+        srcdir = os.path.join(self.builddir, 'srctree')
+        shutil.copytree(testdir, srcdir)
+        self.change_builddir(os.path.join(srcdir, '_build'))
+        source_filename = os.path.join(testdir, 'subprojects', 'foo.tar.xz')
+        patch_filename = os.path.join(testdir, 'subprojects', 'foo-patch.tar.xz')
+        with open(os.path.join(srcdir, 'subprojects', 'foo.wrap'), 'w', encoding='utf-8') as f:
+            f.write(textwrap.dedent(f'''\
+                [wrap-file]
+                directory = foo
+                source_url = {Path(source_filename).as_uri()}
+                source_filename = foo.tar.xz
+                source_hash = {self.compute_sha256(source_filename)}
+                patch_url = {Path(patch_filename).as_uri()}
+                patch_filename = foo-patch.tar.xz
+                patch_hash = {self.compute_sha256(patch_filename)}
+                '''))
+        # Never used, failing to fetch it must not fail the configure
+        with open(os.path.join(srcdir, 'subprojects', 'unused.wrap'), 'w', encoding='utf-8') as f:
+            f.write(textwrap.dedent('''\
+                [wrap-file]
+                source_filename = unused.tar.gz
+                '''))
+        out = self.init(srcdir, extra_args=['-Dwrap_prefetch=true'])
+        self.assertIn('Prefetching 2 subprojects', out)
+        self.assertIn('Prefetched 1 subprojects', out)
+        self.assertIn('Could not prefetch subproject unused', out)
+        self.assertLess(out.index('Prefetched'), out.index('Executing subproject foo'))
+        self.assertPathExists(os.path.join(srcdir, 'subprojects', 'foo', 'meson.build'))
+        self.assertPathDoesNotExist(os.path.join(srcdir, 'subprojects', 'unused'))
+        self.build()
+
     def test_no_rpath_for_static(self):
         testdir = os.path.join(self.common_test_dir, '5 linkstatic')
         self.init(testdir)
@@ -1792,6 +1914,32 @@ class LinuxlikeTests(BasePlatformTests):
             self.run_tests()
         self.assertNotIn('Traceback', e.exception.output)
 
+    @skipUnless(is_linux(), "Symbol extraction differs on different platforms")
+    def test_symbolextractor_in_process(self):
+        '''
+        Test that the .symbols files written without readelf and nm have the
+        same content as the ones written with them.
+        '''
+        from mesonbuild.scripts import symbolextractor
+        if not shutil.which('nm') or not shutil.which('readelf'):
+            raise SkipTest('nm or readelf not found')
+        testdir = os.path.join(self.linuxlike_test_dir, '3 linker script')
+        self.init(testdir)
+        self.build()
+        symfiles = glob(os.path.join(self.builddir, '**', '*.symbols'), recursive=True)
+        self.assertTrue(symfiles)
+        for symfile in symfiles:
+            libfile = os.path.join(os.path.dirname(os.path.dirname(symfile)), os.path.basename(symfile)[:-len('.symbols')])
+            with open(symfile, encoding='utf-8') as f:
+                in_process = f.read()
+            self.assertIn('Library soname: [', in_process)
+            tool_file = os.path.join(self.builddir, 'tool.symbols')
+            with mock.patch.dict(os.environ, {'NM': 'nm'}), \
+                    mock.patch.object(symbolextractor, 'TOOL_WARNING_FILE', os.path.join(self.builddir, 'warning')):
+                symbolextractor.gnu_syms(libfile, tool_file)
+            with open(tool_file, encoding='utf-8') as f:
+                self.assertEqual(in_process, f.read())
+
     @skipUnless(is_linux(), "Ninja file differs on different platforms")
     def test_complex_link_cases(self):
         testdir = os.path.join(self.unit_test_dir, '114 complex link cases')
@@ -279,6 +279,35 @@ class PlatformAgnosticTests(BasePlatformTests):
         self.assertEqual(data['modules'], expected)
         self.assertEqual(data['count'], 70)
 
+    def test_command_import_budget(self):
+        '''
+        Light commands must not import the interpreter, the backends or the
+        compilers just to parse their arguments. Run them with
+        `python -X importtime` and check which Meson modules got imported.
+
+        Raising a budget needs a clear rationale, every module here is paid
+        for on each invocation, e.g. by IDEs polling `meson introspect`.
+        '''
+        heavy = {'mesonbuild.interpreter', 'mesonbuild.backend.ninjabackend', 'mesonbuild.ast.interpreter'}
+        budgets = [
+            (['--version'], 16, heavy | {'mesonbuild.build', 'mesonbuild.environment'}),
+            (['format', '--help'], 18, heavy | {'mesonbuild.build', 'mesonbuild.environment'}),
+            (['compile', '--help'], 39, heavy),
+            (['install', '--help'], 44, heavy),
+            (['introspect', '--help'], 45, heavy),
+            (['test', '--help'], 46, heavy),
+        ]
+        for args, budget, forbidden in budgets:
+            with self.subTest(' '.join(args)):
+                cmd = python_command + ['-X', 'importtime'] + self.meson_command[len(python_command):] + args
+                p = subprocess.run(cmd, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE,
+                                   universal_newlines=True, check=True)
+                modules = {l.rsplit('|', 1)[-1].strip() for l in p.stderr.splitlines()
+                           if l.startswith('import time:')}
+                meson_modules = {m for m in modules if m.split('.')[0] == 'mesonbuild'}
+                self.assertEqual(sorted(meson_modules & forbidden), [])
+                self.assertLessEqual(len(meson_modules), budget, sorted(meson_modules))
+
     def test_meson_package_cache_dir(self):
         # Copy testdir into temporary directory to not pollute meson source tree.
         testdir = os.path.join(self.unit_test_dir, '118 meson package cache dir')
@@ -475,3 +504,24 @@ class PlatformAgnosticTests(BasePlatformTests):
             f.write("option('new_option', type : 'boolean', value : false)")
         self.setconf('-Dsubproject:new_option=true')
         self.assertEqual(self.getconf('subproject:new_option'), True)
+
+    def test_profile_configure(self) -> None:
+        testdir = os.path.join(self.common_test_dir, '8 install')
+        self.init(testdir, extra_args=['--profile-configure'])
+        logdir = os.path.join(self.builddir, 'meson-logs')
+
+        with open(os.path.join(logdir, 'profile-configure.json'), encoding='utf-8') as f:
+            events = json.load(f)['traceEvents']
+        spans = {(e['cat'], e['name']) for e in events}
+        self.assertIn(('buildfile', 'meson.build'), spans)
+        self.assertIn(('function', 'project'), spans)
+        self.assertIn(('function', 'executable'), spans)
+        self.assertIn(('setup', 'backend'), spans)
+        self.assertIn(('backend', 'generate targets'), spans)
+        self.assertTrue(any(c == 'subprocess' for c, _ in spans))
+        self.assertTrue(all(e['ph'] == 'X' and e['dur'] >= 0 for e in events))
+
+        with open(os.path.join(logdir, 'profile-configure.txt'), encoding='utf-8') as f:
+            summary = f.read()
+        self.assertIn('Total configure time:', summary)
+        self.assertIn('buildfile:', summary)